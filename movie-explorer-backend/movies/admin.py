@@ -27,11 +27,12 @@ class ActorAdmin(admin.ModelAdmin):
 
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
-    list_display = ['title', 'release_year', 'director', 'rating', 'duration', 'average_rating', 'review_count', 'created_at']
+    list_display = ['title', 'release_year', 'director', 'rating', 'duration', 'avg_review_rating', 'review_count', 'created_at']
     search_fields = ['title', 'director__name']
     list_filter = ['release_year', 'genres', 'director', 'created_at']
     filter_horizontal = ['actors', 'genres']
     date_hierarchy = 'created_at'
+    readonly_fields = ['avg_review_rating', 'review_count']
     
     fieldsets = (
         ('Basic Information', {
@@ -43,6 +44,9 @@ class MovieAdmin(admin.ModelAdmin):
         ('Relationships', {
             'fields': ('director', 'actors', 'genres')
         }),
+        ('Reviews', {
+            'fields': ('avg_review_rating', 'review_count')
+        }),
     )
 
 
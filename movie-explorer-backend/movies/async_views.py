@@ -0,0 +1,289 @@
+"""
+Async (ASGI) versions of the hot read endpoints, under /api/async/.
+
+Each view is a plain Django async view reading through the async ORM, and
+starts every load that does not depend on another one together with
+asyncio.gather: a movie detail reads the movie, its director, cast, genres
+and review preview at once; a list page reads its rows and its count at
+once and then the genre and actor names of the page. The responses are
+rendered with the same serializers (row serializers for movie lists) and
+fieldsets as the DRF views, so the JSON matches theirs byte for byte apart
+from the pagination links, which point back at the async routes.
+
+Django's async ORM still runs each query through sync_to_async on the
+request's own thread and connection, so the queries of one request are not
+executed in parallel. What changes is that waiting for them no longer holds
+a worker: under an ASGI server (`uvicorn movies_explorer.asgi:application`)
+one process interleaves many requests, and relation loads are queued back
+to back without Python work in between. `manage.py benchmark_asgi` compares
+the throughput of these routes with the WSGI views at a given concurrency.
+
+The response cache, conditional requests, keyset cursors and the filter
+index stay on the DRF views; the async routes always read the database.
+"""
+import asyncio
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db.models import Subquery
+from django.http import HttpResponse
+from django.views import View
+from django_filters.utils import translate_validation
+from rest_framework.exceptions import APIException, NotFound, ParseError
+from rest_framework.request import Request
+
+from .fieldsets import Fieldset
+from .filters import GenreFilter, MovieFilter
+from .models import Actor, Director, Genre, LeaderboardEntry, Movie, Review
+from .pagination import CountingPaginator, CustomPageNumberPagination, KeysetPagination
+from .renderers import FastJSONRenderer
+from .rowserializers import GenreRowSerializer, MovieListRowSerializer
+from .serializers import (
+    ActorDetailSerializer, DirectorDetailSerializer, MovieDetailSerializer, MovieListSerializer, TopRatedMovieSerializer,
+)
+from .views import top_rated_board
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def fetch_all(queryset):
+    """The results of `queryset` as a list, read through the async ORM"""
+    return [item async for item in queryset]
+
+
+def set_prefetched(instance, relation, objects):
+    """Attach separately loaded related objects as if prefetch_related() had loaded them"""
+    manager = getattr(instance, relation)
+    queryset = manager.all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance.__dict__.setdefault('_prefetched_objects_cache', {})[manager.prefetch_cache_name] = queryset
+
+
+class AsyncReadView(View):
+    """
+    Base async view: errors raised as DRF exceptions are rendered the way
+    DRF's exception handler renders them
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return json_response(data, status=exc.status_code)
+
+    @staticmethod
+    def get_serializer(serializer_class, request, **kwargs):
+        """A serializer rendering the fields picked by the request's sparse fieldset"""
+        context = {'request': request, 'fieldset': Fieldset.from_params(request.query_params)}
+        return serializer_class(context=context, **kwargs)
+
+
+class AsyncListView(AsyncReadView):
+    """
+    A filtered, page-number paginated list rendered from .values() rows,
+    with CustomPageNumberPagination's counting and response format
+    """
+    filterset_class = None
+    row_serializer_class = None
+    pagination_class = CustomPageNumberPagination
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    async def get(self, request):
+        request = Request(request)
+        if KeysetPagination.cursor_query_param in request.query_params:
+            raise ParseError({'error': 'Keyset cursors are only supported on the synchronous routes'})
+        row_serializer = self.row_serializer_class(
+            self.get_serializer(self.row_serializer_class.serializer_class, request).fields
+        )
+        filterset = self.filterset_class(
+            request.query_params, queryset=row_serializer.get_queryset(self.get_queryset()), request=request
+        )
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        queryset = filterset.qs
+
+        pagination = self.pagination_class()
+        pagination.request = request
+        page_size = pagination.get_page_size(request)
+        count = sync_to_async(pagination.get_count)(queryset)
+        number = request.query_params.get(pagination.page_query_param) or 1
+        try:
+            number = int(number)
+        except ValueError:
+            pass
+        if isinstance(number, int) and number > 0:
+            # The page's rows do not depend on the count, so both are read at once, with one more
+            # row in case the count is an estimate and that row decides whether a next page exists
+            offset = (number - 1) * page_size
+            (count, count_is_exact), rows = await asyncio.gather(
+                count, fetch_all(queryset[offset:offset + page_size + 1])
+            )
+        else:
+            (count, count_is_exact), rows = await count, None
+
+        paginator = CountingPaginator(queryset, page_size, lambda object_list: (count, count_is_exact))
+        if number in pagination.last_page_strings:
+            number = paginator.num_pages
+        try:
+            if count_is_exact:
+                pagination.page = paginator.page(number)
+            else:
+                number = paginator.validate_number(number)
+                if rows is None:
+                    offset = (number - 1) * page_size
+                    rows = await fetch_all(queryset[offset:offset + page_size + 1])
+                pagination.page = paginator.estimated_page(number, rows)
+        except InvalidPage as exc:
+            raise NotFound(pagination.invalid_page_message.format(page_number=number, message=str(exc)))
+        if rows is None:
+            rows = await fetch_all(pagination.page.object_list)
+
+        return json_response(OrderedDict([
+            ('count', count),
+            ('count_is_exact', count_is_exact),
+            ('next', pagination.get_next_link()),
+            ('previous', pagination.get_previous_link()),
+            ('results', await row_serializer.ato_representation(rows[:page_size])),
+        ]))
+
+
+class AsyncMovieListView(AsyncListView):
+    """GET /api/async/movies/: the movie list with the MovieFilter filters"""
+    filterset_class = MovieFilter
+    row_serializer_class = MovieListRowSerializer
+
+    def get_queryset(self):
+        return Movie.objects.all()
+
+
+class AsyncGenreListView(AsyncListView):
+    """GET /api/async/genres/: the genre list with their movie counts"""
+    filterset_class = GenreFilter
+    row_serializer_class = GenreRowSerializer
+
+    def get_queryset(self):
+        return Genre.objects.with_movies_count().order_by('name')
+
+
+class AsyncMovieDetailView(AsyncReadView):
+    """GET /api/async/movies/{id}/: a movie with its director, cast, genres and review preview"""
+
+    async def get(self, request, pk):
+        request = Request(request)
+        serializer = self.get_serializer(MovieDetailSerializer, request)
+        fields = serializer.fields
+        loads = {'movie': Movie.objects.filter(pk=pk).afirst()}
+        if 'director' in fields:
+            director = Director.objects.filter(pk=Subquery(Movie.objects.filter(pk=pk).values('director_id')))
+            if 'movies_count' in fields['director'].fields:
+                director = director.with_movies_count()
+            loads['director'] = director.afirst()
+        for relation, model in (('actors', Actor), ('genres', Genre)):
+            if relation in fields:
+                related = model.objects.filter(movies=pk)
+                if 'movies_count' in fields[relation].child.fields:
+                    related = related.with_movies_count(subquery=True)
+                loads[relation] = fetch_all(related)
+        if 'reviews' in fields:
+            loads['reviews'] = fetch_all(
+                Review.objects.filter(movie_id=pk).order_by('-created_at', '-id')[:Movie.REVIEW_PREVIEW_SIZE]
+            )
+        loaded = dict(zip(loads, await asyncio.gather(*loads.values())))
+
+        movie = loaded['movie']
+        if movie is None:
+            raise NotFound('No Movie matches the given query.')
+        if 'director' in loaded:
+            movie.director = loaded['director']
+        for relation in ('actors', 'genres'):
+            if relation in loaded:
+                set_prefetched(movie, relation, loaded[relation])
+        if 'reviews' in loaded:
+            movie.prefetched_review_preview = loaded['reviews']
+        serializer.instance = movie
+        return json_response(serializer.data)
+
+
+class AsyncPersonDetailView(AsyncReadView):
+    """An actor or director with their movies, read together"""
+    model = None
+    serializer_class = None
+    # Movie lookup selecting the person's movies
+    movies_lookup = None
+
+    async def get(self, request, pk):
+        request = Request(request)
+        serializer = self.get_serializer(self.serializer_class, request)
+        fields = serializer.fields
+        person = self.model.objects.filter(pk=pk)
+        if 'movies_count' in fields:
+            person = person.with_movies_count()
+        loads = [person.afirst()]
+        if 'movies' in fields:
+            movie_serializer = MovieListRowSerializer(fields['movies'].child.fields)
+            loads.append(fetch_all(movie_serializer.get_queryset(Movie.objects.filter(**{self.movies_lookup: pk}))))
+        person, *movies = await asyncio.gather(*loads)
+        if person is None:
+            raise NotFound(f'No {self.model._meta.object_name} matches the given query.')
+
+        if not movies:
+            serializer.instance = person
+            return json_response(serializer.data)
+        # The movies render from rows; they are the serializer's last field
+        del fields['movies']
+        data = serializer.to_representation(person)
+        data['movies'] = await movie_serializer.ato_representation(movies[0])
+        return json_response(data)
+
+
+class AsyncActorDetailView(AsyncPersonDetailView):
+    """GET /api/async/actors/{id}/"""
+    model = Actor
+    serializer_class = ActorDetailSerializer
+    movies_lookup = 'actors'
+
+
+class AsyncDirectorDetailView(AsyncPersonDetailView):
+    """GET /api/async/directors/{id}/"""
+    model = Director
+    serializer_class = DirectorDetailSerializer
+    movies_lookup = 'director'
+
+
+class AsyncTopRatedView(AsyncReadView):
+    """GET /api/async/movies/top_rated/: the best movies of a leaderboard"""
+
+    async def get(self, request):
+        request = Request(request)
+        try:
+            scope, scope_key, limit = top_rated_board(request.query_params)
+        except ValueError as exc:
+            return json_response({'error': str(exc)}, status=400)
+        fields = self.get_serializer(TopRatedMovieSerializer, request).fields
+        row_serializer = MovieListRowSerializer(
+            {name: field for name, field in fields.items() if name in MovieListSerializer.Meta.fields}
+        )
+        scores = dict(await fetch_all(
+            LeaderboardEntry.objects.filter(scope=scope, scope_key=scope_key)
+            .order_by('-score', 'movie_id').values_list('movie_id', 'score')[:limit]
+        ))
+        # The movies and their genre and actor names only need the ids
+        rows, related = await asyncio.gather(
+            fetch_all(row_serializer.get_queryset(Movie.objects.filter(pk__in=list(scores)).order_by())),
+            row_serializer.aget_related(list(scores)),
+        )
+        positions = {movie_id: position for position, movie_id in enumerate(scores)}
+        rows.sort(key=lambda row: positions[row['id']])
+        data = row_serializer.render(rows, related)
+        if 'score' in fields:
+            for row, item in zip(rows, data):
+                item['score'] = fields['score'].to_representation(scores[row['id']])
+        return json_response(data)
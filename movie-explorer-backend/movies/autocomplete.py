@@ -0,0 +1,312 @@
+"""
+In-process prefix index for autocompleting movie titles and actor, director
+and genre names.
+
+Names are normalized (accents stripped, casefolded, whitespace collapsed) and
+stored once per word start, so "han" finds both "Hannah Moore" and "Tom
+Hanks", in one sorted list searched with bisect. Each name carries a
+popularity weight: the review count for movies and the number of movies for
+people and genres. The index is loaded with a single UNION ALL query, kept
+current from model signals, and fully reloaded after MAX_AGE seconds to pick
+up writes made by other processes; lookups never touch the database. A
+reload is built without holding the lock: lookups keep using the old index
+meanwhile, and the writes applied during the reload are replayed on the new
+one. Prefixes matching many keys (short ones, mostly) keep their most
+popular names per type, which writes update in place, so their lookups do
+not scan every match.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import CharField, F, Value
+
+from .models import Actor, Director, Genre, Movie
+
+DEFAULT_AUTOCOMPLETE = {
+    # Seconds before the next lookup reloads the index from the database (None never reloads)
+    'MAX_AGE': 600,
+}
+
+# Word starts indexed per name; later words of very long titles are not indexed
+MAX_KEYS_PER_NAME = 8
+
+# Prefixes matching more keys than this keep their TOP_LIMIT most popular names per type
+TOP_MIN_RANGE = 256
+# Largest limit answered from those; larger limits scan the matching keys
+TOP_LIMIT = 25
+
+# model -> (type, label field)
+INDEXED_MODELS = {
+    Movie: ('movie', 'title'),
+    Actor: ('actor', 'name'),
+    Director: ('director', 'name'),
+    Genre: ('genre', 'name'),
+}
+
+AUTOCOMPLETE_TYPES = tuple(kind for kind, _ in INDEXED_MODELS.values())
+
+
+def get_autocomplete_settings():
+    return {**DEFAULT_AUTOCOMPLETE, **getattr(settings, 'AUTOCOMPLETE', {})}
+
+
+def normalize(text):
+    """Lower-case, accent-free form of text with single spaces between words"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def name_keys(label):
+    """Every suffix of the normalized name that starts at a word boundary"""
+    words = normalize(label).split(' ')
+    return sorted({' '.join(words[i:]) for i in range(min(len(words), MAX_KEYS_PER_NAME))} - {''})
+
+
+def load_rows():
+    """(type, id, label, weight) for every indexed name, read in one query"""
+    def rows(queryset, kind, label, weight):
+        return queryset.order_by().annotate(
+            kind=Value(kind, output_field=CharField()),
+            label=F(label),
+            weight=weight,
+        ).values_list('kind', 'id', 'label', 'weight')
+
+    movies = rows(Movie.objects.all(), 'movie', 'title', F('review_count'))
+    return list(movies.union(
+        rows(Actor.objects.with_movies_count(), 'actor', 'name', F('movies_count')),
+        rows(Director.objects.with_movies_count(), 'director', 'name', F('movies_count')),
+        rows(Genre.objects.with_movies_count(), 'genre', 'name', F('movies_count')),
+        all=True,
+    ))
+
+
+class PrefixIndex:
+    """
+    Sorted keys with a parallel list of (type, id) references, plus the label
+    and weight of every reference. All access goes through one lock; each
+    operation is a bisect plus a list slice or insert. Loads take a second
+    lock so only one thread reloads at a time.
+
+    Wide prefixes get a bucket in `_tops`: per type, the sort keys of the
+    TOP_LIMIT best matching names in order (all of them if there are fewer).
+    Writes move the names they change within those lists; a bucket is only
+    dropped, to be rebuilt by its next lookup, when a write pushes out a
+    name whose successor is unknown.
+    """
+
+    def __init__(self, loader=load_rows):
+        self.loader = loader
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._changes = None
+        self.clear()
+
+    def clear(self):
+        """Drop everything; the next lookup reloads from the database"""
+        with self._lock:
+            self._keys = []
+            self._refs = []
+            self._entries = {}
+            self._tops = {}
+            # A load in progress read its rows before the clear, so it is discarded
+            self._changes = None
+            self.loaded_at = None
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    @property
+    def is_tracking(self):
+        """Whether writes must be applied: the index is loaded, or loading and recording them"""
+        return self.is_loaded or self._changes is not None
+
+    def load(self, rows=None):
+        """Replace the index contents with `rows` of (type, id, label, weight)"""
+        with self._lock:
+            changes = self._changes = []
+        try:
+            rows = self.loader() if rows is None else rows
+            entries, pairs = {}, []
+            for kind, pk, label, weight in rows:
+                keys = name_keys(label)
+                entries[(kind, pk)] = [label, weight or 0, keys]
+                pairs += [(key, (kind, pk)) for key in keys]
+            pairs.sort()
+        except BaseException:
+            # Stop recording writes for a load that will not happen
+            with self._lock:
+                if self._changes is changes:
+                    self._changes = None
+            raise
+        with self._lock:
+            if self._changes is not changes:
+                return
+            self._changes = None
+            self._keys = [key for key, _ in pairs]
+            self._refs = [ref for _, ref in pairs]
+            self._entries = entries
+            self._tops = {}
+            self.loaded_at = time.monotonic()
+            # Writes committed while the rows were read; the rows may already include them
+            for method, args in changes:
+                getattr(self, method)(*args)
+
+    def is_stale(self):
+        max_age = get_autocomplete_settings()['MAX_AGE']
+        loaded_at = self.loaded_at
+        return loaded_at is None or (max_age is not None and time.monotonic() - loaded_at > max_age)
+
+    def ensure_loaded(self):
+        """
+        Load the index if it is missing or older than MAX_AGE. An expired index
+        keeps serving lookups while one thread reloads it.
+        """
+        if not self.is_stale():
+            return
+        if self.is_loaded:
+            if not self._load_lock.acquire(blocking=False):
+                return
+        else:
+            self._load_lock.acquire()
+        try:
+            if self.is_stale():
+                self.load()
+        finally:
+            self._load_lock.release()
+
+    def warm(self):
+        """Load at process start; if the database is not ready yet the first lookup loads instead"""
+        try:
+            self.ensure_loaded()
+        except DatabaseError:
+            self.clear()
+
+    def lookup(self, prefix, types=None, limit=10):
+        """
+        Up to `limit` names with a word starting with `prefix`, most popular first,
+        as dicts with type, id and label
+        """
+        prefix = normalize(prefix)
+        types = tuple(sorted(set(AUTOCOMPLETE_TYPES if types is None else types) & set(AUTOCOMPLETE_TYPES)))
+        if not prefix or not types:
+            return []
+        self.ensure_loaded()
+
+        with self._lock:
+            tops = self._tops.get(prefix) if limit <= TOP_LIMIT else None
+            if tops is None:
+                start = bisect_left(self._keys, prefix)
+                end = bisect_right(self._keys, prefix + '\U0010ffff', lo=start)
+                if limit <= TOP_LIMIT and end - start > TOP_MIN_RANGE:
+                    tops = self._tops[prefix] = self._build_tops(start, end)
+            if tops is not None:
+                best = heapq.nsmallest(limit, heapq.merge(*(tops[kind] for kind in types)))
+            else:
+                refs = {ref for ref in self._refs[start:end] if ref[0] in types}
+                best = heapq.nsmallest(limit, map(self._sort_key, refs))
+            return [{'type': kind, 'id': pk, 'label': label} for _, label, (kind, pk) in best]
+
+    def _sort_key(self, ref):
+        """Most popular first, then by label"""
+        label, weight, _ = self._entries[ref]
+        return (-weight, label, ref)
+
+    def _build_tops(self, start, end):
+        refs = set(self._refs[start:end])
+        return {
+            kind: heapq.nsmallest(TOP_LIMIT, (self._sort_key(ref) for ref in refs if ref[0] == kind))
+            for kind in AUTOCOMPLETE_TYPES
+        }
+
+    def upsert(self, kind, pk, label, weight=None):
+        """Add or rename a name, keeping its weight unless one is given"""
+        with self._lock:
+            self._record('upsert', kind, pk, label, weight)
+            if not self.is_loaded:
+                return
+            ref = (kind, pk)
+            current = self._entries.get(ref)
+            if weight is None:
+                weight = current[1] if current else 0
+            if current and current[0] == label:
+                self._set_weight(ref, weight)
+                return
+            if current:
+                self._remove_keys(ref, current[2])
+            keys = name_keys(label)
+            self._entries[ref] = [label, weight, keys]
+            for key in keys:
+                position = bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._refs.insert(position, ref)
+            self._update_tops(ref, current and (current[2], (-current[1], current[0], ref)))
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._record('remove', kind, pk)
+            entry = self._entries.pop((kind, pk), None)
+            if entry:
+                self._remove_keys((kind, pk), entry[2])
+                self._update_tops((kind, pk), (entry[2], (-entry[1], entry[0], (kind, pk))))
+
+    def adjust_weight(self, kind, pk, delta):
+        with self._lock:
+            self._record('adjust_weight', kind, pk, delta)
+            entry = self._entries.get((kind, pk))
+            if entry:
+                self._set_weight((kind, pk), max(entry[1] + delta, 0))
+
+    def _record(self, method, *args):
+        """Remember a write made during a load, to be replayed on the loaded index"""
+        if self._changes is not None:
+            self._changes.append((method, args))
+
+    def _set_weight(self, ref, weight):
+        entry = self._entries[ref]
+        if entry[1] != weight:
+            previous = (entry[2], self._sort_key(ref))
+            entry[1] = weight
+            self._update_tops(ref, previous)
+
+    def _remove_keys(self, ref, keys):
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            while self._refs[position] != ref:
+                position += 1
+            del self._keys[position]
+            del self._refs[position]
+
+    def _update_tops(self, ref, previous):
+        """
+        Move `ref` within the buckets of every prefix of its keys, given its
+        (keys, sort key) before the write, or None if it is new
+        """
+        old_keys, old_sort = previous or ((), None)
+        entry = self._entries.get(ref)
+        new_keys, new_sort = (entry[2], self._sort_key(ref)) if entry else ((), None)
+        prefixes = {key[:length] for key in (*old_keys, *new_keys) for length in range(1, len(key) + 1)}
+        for prefix in prefixes & self._tops.keys():
+            tops = self._tops[prefix][ref[0]]
+            # Names ranked below a full list are unknown, so any name after its last one does not fit
+            bound = tops[-1] if len(tops) == TOP_LIMIT else None
+            if old_sort is not None:
+                position = bisect_left(tops, old_sort)
+                if position < len(tops) and tops[position] == old_sort:
+                    del tops[position]
+            matches = any(key.startswith(prefix) for key in new_keys)
+            if matches and (bound is None or new_sort < bound):
+                insort(tops, new_sort)
+                del tops[TOP_LIMIT:]
+            elif bound is not None and len(tops) < TOP_LIMIT:
+                # A name left the full list and its successor is unknown
+                del self._tops[prefix]
+
+
+index = PrefixIndex()
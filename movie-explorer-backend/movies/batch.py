@@ -0,0 +1,72 @@
+"""
+Batch retrieval: GET /api/<resource>/batch/?ids=3,1,2 returns the detail
+representation of every requested object, in request order, with the ids
+that do not exist listed under `missing`. Objects are loaded with one query
+plus the view's prefetches, however many ids are requested.
+"""
+from django.conf import settings
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+DEFAULT_BATCH_RETRIEVE = {
+    # Most ids one request may ask for
+    'MAX_IDS': 100,
+}
+
+
+def get_batch_retrieve_settings():
+    return {**DEFAULT_BATCH_RETRIEVE, **getattr(settings, 'BATCH_RETRIEVE', {})}
+
+
+def parse_ids(value):
+    """Distinct integer ids from a comma-separated string, in order; raises ValueError"""
+    ids = []
+    for part in value.split(','):
+        if part.strip():
+            ids.append(int(part))
+    return list(dict.fromkeys(ids))
+
+
+class BatchRetrieveMixin:
+    """
+    Add a `batch` list action serving several objects by id. Views render it
+    with their detail serializer and load it through get_queryset(), which
+    must not query per object.
+    """
+
+    @extend_schema(
+        description="Get several objects by id, in the requested order, and the ids that were not found",
+        parameters=[
+            OpenApiParameter('ids', str, required=True, description='Comma-separated ids (at most BATCH_RETRIEVE MAX_IDS)'),
+        ],
+    )
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def batch(self, request):
+        """Get objects by id"""
+        try:
+            ids = parse_ids(request.query_params.get('ids', ''))
+        except ValueError:
+            return Response(
+                {'error': 'ids must be a comma-separated list of integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ids:
+            return Response(
+                {'error': 'ids parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_ids = get_batch_retrieve_settings()['MAX_IDS']
+        if len(ids) > max_ids:
+            return Response(
+                {'error': f'At most {max_ids} ids can be requested at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        found = {obj.pk: obj for obj in self.get_queryset().filter(pk__in=ids)}
+        serializer = self.get_serializer([found[pk] for pk in ids if pk in found], many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in found],
+        })
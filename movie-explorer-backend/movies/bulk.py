@@ -0,0 +1,368 @@
+"""
+Bulk writes: POST an array of items to /api/<resource>/bulk/ to create them,
+or PUT it to create or update them by natural key (title, release_year and
+director for movies; movie and reviewer_name for reviews).
+
+Items are validated up front without touching the database. Then, in one
+transaction, every referenced id is checked with one query per model, and
+existing rows are matched and locked with one more. If any item is invalid
+nothing is written, and the response lists each item's errors (an empty dict
+for valid ones). Otherwise rows are written with bulk_create / bulk_update,
+and M2M links with one insert and one delete per through table. The response
+lists each item's id and whether it was created or updated, in request order.
+If a concurrent request stores one of the new natural keys or deletes a
+referenced row first, nothing is written and the response is a 409 naming
+the conflicting items.
+
+bulk_create and bulk_update send no model signals. The effects the signals
+apply row by row (review aggregates, leaderboard entries, similar movies,
+cache versions and the autocomplete index) are applied once per batch instead.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema, inline_serializer
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import autocomplete, filter_index, leaderboard, similarity
+from .models import Actor, Director, Genre, Movie, Review
+from .serializers import BulkWriteResultSerializer, MovieBulkItemSerializer, ReviewBulkItemSerializer
+from .signals import on_commit_if_indexed, on_commit_if_loaded
+from .versions import bump_versions
+
+DEFAULT_BULK_WRITE = {
+    # Most items one request may write
+    'MAX_ITEMS': 1000,
+}
+
+
+def get_bulk_write_settings():
+    return {**DEFAULT_BULK_WRITE, **getattr(settings, 'BULK_WRITE', {})}
+
+
+def add_error(errors, field, message):
+    errors.setdefault(field, []).append(message)
+
+
+class BulkWriteConflict(Exception):
+    """A concurrent write conflicted with the batch; `errors` names the conflicting items"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class BulkWriter:
+    """
+    Validates and writes one batch of items. Subclasses name the item
+    serializer, the natural key, the written fields and the models whose
+    cache versions to bump, and apply the batch's side effects in after_write().
+    """
+    model = None
+    serializer_class = None
+    key_fields = ()
+    write_fields = ()
+    versioned_models = ()
+
+    def __init__(self, upsert=False):
+        self.upsert = upsert
+        # Natural keys of the stored rows the last write matched
+        self.matched_keys = set()
+
+    def save(self, items):
+        """
+        Validate and write `items`; returns (results, None), or (None, per-item
+        errors) if any is invalid. Raises BulkWriteConflict if a concurrent
+        write made the batch violate a constraint.
+        """
+        rows, errors = self.validate(items)
+        try:
+            return self.write(rows, errors)
+        except IntegrityError as exc:
+            conflicts = self.find_conflicts(rows)
+            if not any(conflicts):
+                raise
+            raise BulkWriteConflict(conflicts) from exc
+
+    def write(self, rows, errors):
+        """Check the references of validated `rows` and write them, in one transaction"""
+        now = timezone.now()
+        with transaction.atomic():
+            self.check_references(rows, errors)
+            stored = self.match_stored(rows, errors)
+            self.matched_keys = set(stored)
+            if any(errors):
+                return None, errors
+
+            objs, created, updated = [], [], []
+            for row in rows:
+                obj = stored.get(self.key(row))
+                if obj is None:
+                    obj = self.model()
+                    created.append(obj)
+                else:
+                    obj.updated_at = now
+                    updated.append(obj)
+                for field in self.write_fields:
+                    if field in row:
+                        setattr(obj, field, row[field])
+                objs.append(obj)
+
+            self.model.objects.bulk_create(created)
+            if any(obj.pk is None for obj in created):
+                # Backends that cannot return ids from a bulk insert
+                ids = {key: obj.pk for key, obj in self.lookup([self.key(obj.__dict__) for obj in created]).items()}
+                for obj in created:
+                    obj.pk = ids[self.key(obj.__dict__)]
+            if updated:
+                self.model.objects.bulk_update(updated, [*self.write_fields, 'updated_at'])
+            self.after_write(rows, objs, created)
+            bump_versions(*self.versioned_models)
+
+        created_ids = {obj.pk for obj in created}
+        return [{'id': obj.pk, 'status': 'created' if obj.pk in created_ids else 'updated'} for obj in objs], None
+
+    def validate(self, items):
+        """Validated rows (None for invalid items) and per-item error dicts"""
+        child = self.serializer_class()
+        rows, errors = [], []
+        for item in items:
+            try:
+                rows.append(child.run_validation(item))
+                errors.append({})
+            except ValidationError as exc:
+                rows.append(None)
+                errors.append(exc.detail)
+        return rows, errors
+
+    def check_references(self, rows, errors):
+        """Report ids of other models that do not exist, with one query per model"""
+
+    def check_ids(self, rows, errors, field, model):
+        """Report the ids in `field`, one id or a list of them, that have no `model` row"""
+        def ids(row):
+            value = row.get(field)
+            return value if isinstance(value, list) else [] if value is None else [value]
+
+        wanted = {pk for row in rows if row is not None for pk in ids(row)}
+        found = set(model._base_manager.filter(pk__in=wanted).order_by().values_list('pk', flat=True)) if wanted else set()
+        for row, row_errors in zip(rows, errors):
+            if row is not None:
+                for pk in ids(row):
+                    if pk not in found:
+                        add_error(row_errors, field, f'Invalid pk "{pk}" - object does not exist.')
+
+    def key(self, row):
+        return tuple(row[field] for field in self.key_fields)
+
+    def lookup(self, keys):
+        """
+        Stored rows with the given natural keys, by key, read with one query
+        and locked until the end of the transaction
+        """
+        if not keys:
+            return {}
+        filters = {f'{field}__in': {key[i] for key in keys} for i, field in enumerate(self.key_fields)}
+        wanted = set(keys)
+        rows = self.model._base_manager.filter(**filters).order_by().only(*self.key_fields, *self.write_fields)
+        return {
+            self.key(obj.__dict__): obj
+            for obj in rows.select_for_update()
+            if self.key(obj.__dict__) in wanted
+        }
+
+    def match_stored(self, rows, errors):
+        """
+        The stored rows the items would update, by natural key. Flags items
+        repeating an earlier item's key and, unless upserting, items whose
+        key is taken.
+        """
+        stored = self.lookup([self.key(row) for row in rows if row is not None])
+        first = {}
+        for index, (row, row_errors) in enumerate(zip(rows, errors)):
+            if row is None:
+                continue
+            key = self.key(row)
+            if key in first:
+                add_error(row_errors, 'non_field_errors', f'Same {", ".join(self.key_fields)} as item {first[key]}.')
+            elif key in stored and not self.upsert:
+                add_error(row_errors, 'non_field_errors',
+                          f'The fields {", ".join(self.key_fields)} must make a unique set.')
+            first.setdefault(key, index)
+        return stored
+
+    def find_conflicts(self, rows):
+        """
+        Per-item errors for a batch rolled back by a constraint violation: items
+        whose references are gone, or whose natural key was stored meanwhile
+        """
+        errors = [{} for _ in rows]
+        with transaction.atomic():
+            self.check_references(rows, errors)
+            stored = self.lookup([self.key(row) for row in rows])
+        for row, row_errors in zip(rows, errors):
+            key = self.key(row)
+            if key in self.matched_keys or key not in stored:
+                continue
+            if not self.upsert:
+                add_error(row_errors, 'non_field_errors',
+                          f'The fields {", ".join(self.key_fields)} must make a unique set.')
+            else:
+                add_error(row_errors, 'non_field_errors',
+                          f'A concurrent request stored the same {", ".join(self.key_fields)}; retry to update it.')
+        return errors
+
+    def after_write(self, rows, objs, created):
+        """Apply the side effects of writing `objs` (in item order); `created` were inserted"""
+
+
+class MovieBulkWriter(BulkWriter):
+    model = Movie
+    serializer_class = MovieBulkItemSerializer
+    key_fields = ('title', 'release_year', 'director_id')
+    write_fields = ('title', 'release_year', 'duration', 'plot', 'poster_url', 'backdrop_url', 'rating', 'director_id')
+    versioned_models = (Movie, Actor, Genre)
+
+    def check_references(self, rows, errors):
+        self.check_ids(rows, errors, 'director_id', Director)
+        self.check_ids(rows, errors, 'actor_ids', Actor)
+        self.check_ids(rows, errors, 'genre_ids', Genre)
+
+    def after_write(self, rows, objs, created):
+        created_ids = {obj.pk for obj in created}
+        changes = {}
+        for kind, relation, field in (('actor', Movie.actors, 'actor_ids'), ('genre', Movie.genres, 'genre_ids')):
+            wanted = {obj.pk: set(row[field]) for row, obj in zip(rows, objs) if field in row}
+            changes[kind] = self.set_links(relation.through, relation.field.m2m_reverse_name(), wanted, created_ids)
+        # Moves updated movies between decade and genre boards; new movies have no reviews yet
+        leaderboard.refresh_movies([obj.pk for obj in objs if obj.pk not in created_ids])
+        similarity.refresh_on_commit([obj.pk for obj in objs])
+
+        def reindex():
+            for obj in objs:
+                autocomplete.index.upsert('movie', obj.pk, obj.title)
+            for obj in created:
+                autocomplete.index.adjust_weight('director', obj.director_id, 1)
+            for kind, (added, removed) in changes.items():
+                for _, pk in added:
+                    autocomplete.index.adjust_weight(kind, pk, 1)
+                for _, pk in removed:
+                    autocomplete.index.adjust_weight(kind, pk, -1)
+
+        on_commit_if_loaded(reindex)
+
+        def refilter():
+            index = filter_index.index
+            for obj in objs:
+                # Updated rows keep their stored creation time
+                index.upsert_movie(
+                    obj.pk, obj.release_year, obj.rating, obj.director_id,
+                    obj.created_at if obj.pk in created_ids else None,
+                )
+            for kind, (added, removed) in changes.items():
+                index.add_links(kind, added)
+                index.remove_links(kind, removed)
+
+        on_commit_if_indexed(refilter)
+
+    @staticmethod
+    def set_links(through, column, wanted, created_ids):
+        """
+        Make the links of each movie in `wanted` (movie id -> set of ids) exactly
+        those ids; returns the added and removed (movie id, id) pairs
+        """
+        current, stale = set(), []
+        existing_ids = wanted.keys() - created_ids
+        if existing_ids:
+            for pk, movie_id, other_id in through.objects.filter(movie_id__in=existing_ids).values_list(
+                'pk', 'movie_id', column
+            ):
+                if other_id in wanted[movie_id]:
+                    current.add((movie_id, other_id))
+                else:
+                    stale.append((pk, (movie_id, other_id)))
+        added = [(movie_id, other_id) for movie_id, ids in wanted.items() for other_id in sorted(ids)
+                 if (movie_id, other_id) not in current]
+        if stale:
+            through.objects.filter(pk__in=[pk for pk, _ in stale]).delete()
+        through.objects.bulk_create([through(**{'movie_id': movie_id, column: other_id}) for movie_id, other_id in added])
+        return added, [pair for _, pair in stale]
+
+
+class ReviewBulkWriter(BulkWriter):
+    model = Review
+    serializer_class = ReviewBulkItemSerializer
+    key_fields = ('movie_id', 'reviewer_name')
+    write_fields = ('movie_id', 'reviewer_name', 'rating', 'comment', 'is_featured')
+    versioned_models = (Review,)
+
+    def check_references(self, rows, errors):
+        self.check_ids(rows, errors, 'movie_id', Movie)
+
+    def after_write(self, rows, objs, created):
+        movie_ids = {obj.movie_id for obj in objs}
+        Movie.objects.filter(pk__in=movie_ids).rebuild_review_aggregates()
+        leaderboard.refresh_movies(movie_ids)
+
+        def reweight():
+            for obj in created:
+                autocomplete.index.adjust_weight('movie', obj.movie_id, 1)
+
+        on_commit_if_loaded(reweight)
+
+
+class BulkWriteMixin:
+    """
+    Add a `bulk` list action writing an array of items in one transaction:
+    POST creates them, PUT creates or updates them. Views set `bulk_writer_class`
+    and document the request body (a list of its serializer_class items).
+    """
+    bulk_writer_class = None
+
+    @extend_schema(
+        description="Create (POST) or create and update by natural key (PUT) a list of items in one transaction; "
+                    "if any item is invalid nothing is written and the per-item errors are returned",
+        responses={
+            (200, 'application/json'): inline_serializer('BulkWriteResponse', {
+                'results': BulkWriteResultSerializer(many=True),
+            }),
+        },
+    )
+    @action(detail=False, methods=['post', 'put'])
+    def bulk(self, request):
+        """Write a list of items"""
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Expected a non-empty list of items'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_items = get_bulk_write_settings()['MAX_ITEMS']
+        if len(items) > max_items:
+            return Response(
+                {'error': f'At most {max_items} items can be written at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            results, errors = self.bulk_writer_class(upsert=request.method == 'PUT').save(items)
+        except BulkWriteConflict as exc:
+            conflicting = sum(1 for item_errors in exc.errors if item_errors)
+            return Response(
+                {'error': f'{conflicting} of {len(items)} items conflict with concurrent writes; nothing was written',
+                 'errors': exc.errors},
+                status=status.HTTP_409_CONFLICT
+            )
+        if errors is not None:
+            invalid = sum(1 for item_errors in errors if item_errors)
+            return Response(
+                {'error': f'{invalid} of {len(items)} items are invalid; nothing was written', 'errors': errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {'results': results},
+            status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK
+        )
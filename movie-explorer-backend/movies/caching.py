@@ -0,0 +1,130 @@
+"""
+Whole-response caching and conditional GET support for read-only API endpoints.
+
+GET responses are stored rendered, keyed by scheme, host, path, query
+parameters, Accept header and the data versions (see versions.py) of every model the view's
+output depends on. Any write to one of those models bumps its version, so a
+stale entry can no longer be looked up and simply expires. The same
+fingerprint is sent as the ETag, and the newest version as Last-Modified, so
+revalidating clients get a 304 before the view touches the database.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .versions import get_request_versions
+
+DEFAULT_RESPONSE_CACHE = {
+    'ENABLED': True,
+    # Cache alias holding the responses; point it at a shared backend to share them between processes
+    'CACHE_ALIAS': 'default',
+    # Seconds a response is kept for; writes invalidate it earlier
+    'TIMEOUT': 300,
+    # Add an X-Cache: HIT/MISS header
+    'HEADER': True,
+}
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+
+def get_response_cache_settings():
+    return {**DEFAULT_RESPONSE_CACHE, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def response_fingerprint(request, models):
+    """Hash of everything a read response depends on: the request and the data versions of the given models"""
+    params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    versions = sorted(get_request_versions(request, models).items())
+    # Pagination and review links are absolute URLs built from the scheme and host
+    raw = json.dumps([
+        request.scheme, request.get_host(), request.path, params, request.META.get('HTTP_ACCEPT', ''), versions,
+    ])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def response_cache_key(request, models):
+    """Cache key for a request whose response depends on the given models"""
+    return 'movies:response:' + response_fingerprint(request, models)
+
+
+class CachedResponseMixin:
+    """
+    Serve a viewset's successful JSON GET responses from the cache.
+
+    Views declare `cache_models`: every model whose rows appear in any of their
+    read responses, including nested and aggregated ones. Hits skip DRF's
+    request handling entirely, so only use this on public endpoints.
+    """
+    cache_models = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        config = get_response_cache_settings()
+        if not config['ENABLED'] or request.method not in CACHEABLE_METHODS or not self.cache_models:
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = caches[config['CACHE_ALIAS']]
+        key = response_cache_key(request, self.cache_models)
+        cached = cache.get(key)
+        if cached is not None:
+            content, status, headers = cached
+            response = HttpResponse(content, status=status)
+            for header, value in headers:
+                response[header] = value
+            if config['HEADER']:
+                response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        # Browsable API pages embed per-user CSRF tokens, so only JSON is shared
+        if response.status_code == 200 and renderer is not None and renderer.format == 'json':
+            response.render()
+            cache.set(key, (response.content, response.status_code, list(response.items())), config['TIMEOUT'])
+            if config['HEADER']:
+                response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalResponseMixin:
+    """
+    Add ETag and Last-Modified headers to a viewset's successful GET responses,
+    and answer matching If-None-Match / If-Modified-Since requests with a 304
+    without running the view.
+
+    Both validators come from the data versions of the view's `cache_models`
+    (see CachedResponseMixin), so they change whenever any row the response
+    could show is written, including deletes, by any process: the versions
+    are read from the database, not from a process-local cache.
+    """
+    cache_models = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in CACHEABLE_METHODS or not self.cache_models:
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = '"%s"' % response_fingerprint(request, self.cache_models)[:32]
+        last_modified = max(get_request_versions(request, self.cache_models).values()) // 10 ** 9
+        # HTTP dates have one-second resolution: until the newest write's second has passed,
+        # another write could land in it unseen, so only the ETag is offered
+        if time.time() < last_modified + 1:
+            last_modified = None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            response = not_modified
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        if not response.has_header('Vary'):
+            response['Vary'] = 'Accept'
+        return response
@@ -0,0 +1,346 @@
+"""
+Bulk catalog import from CSV or JSONL dumps.
+
+Records are streamed from the file and written in batches, one transaction
+per batch. Genre, director and actor names are resolved to ids through
+in-memory dictionaries loaded once up front, and only unseen names are
+inserted. Movies, reviews and the Movie.actors / Movie.genres through tables
+are upserted: with PostgreSQL COPY into a staging table plus one
+INSERT ... ON CONFLICT per table, or with bulk_create(update_conflicts /
+ignore_conflicts) on other databases. Like bulk_create, neither path sends
+model signals, so review aggregates and cache versions are updated per
+committed batch, and leaderboards, similar movies and recommendation
+neighbours are rebuilt once at the end.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import filter_index, leaderboard, pgcopy, recommendations, similarity
+from .models import Actor, Director, Genre, Movie, RatingNeighbor, Review
+from .versions import bump_versions
+
+MOVIE_FIELDS = ('title', 'release_year', 'duration', 'plot', 'rating', 'poster_url', 'backdrop_url')
+MOVIE_KEY = ('title', 'release_year', 'director_id')
+# Columns refreshed when an imported movie or review already exists
+MOVIE_UPDATE_FIELDS = ('duration', 'plot', 'rating', 'poster_url', 'backdrop_url', 'updated_at')
+REVIEW_UPDATE_FIELDS = ('rating', 'comment', 'is_featured', 'updated_at')
+
+# CSV columns holding several names
+LIST_SEPARATOR = '|'
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported"""
+
+
+def read_records(path, fmt=None):
+    """
+    Yield ("path:line", record dict) from a JSONL or CSV file. The format is
+    taken from the extension unless given. In CSV files `genres` and `actors`
+    are `|`-separated; only JSONL records can carry `reviews`.
+    """
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                for key in ('genres', 'actors'):
+                    row[key] = [name for name in (row.get(key) or '').split(LIST_SEPARATOR) if name.strip()]
+                yield f'{path}:{line}', row
+        else:
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    try:
+                        yield f'{path}:{line}', json.loads(text)
+                    except ValueError as exc:
+                        yield f'{path}:{line}', RecordError(f'invalid JSON: {exc}')
+
+
+def _optional(value, cast):
+    if value is None or value == '':
+        return None
+    return cast(value)
+
+
+def _rating(value):
+    """A movie rating as the Decimal its field stores, rounded to one place"""
+    try:
+        rating = Decimal(str(value))
+    except InvalidOperation:
+        rating = None
+    if rating is None or not rating.is_finite():
+        raise ValueError(f'{value!r} is not a number')
+    return round(rating, 1)
+
+
+def _validate(model, field, value):
+    """Raise RecordError unless `value` passes the model field's validators"""
+    try:
+        model._meta.get_field(field).run_validators(value)
+    except ValidationError as exc:
+        raise RecordError(f'{model._meta.model_name} {field}: ' + ' '.join(exc.messages))
+
+
+def clean_record(record):
+    """Validated movie fields, related names and reviews of one record"""
+    if isinstance(record, Exception):
+        raise record
+    try:
+        movie = {
+            'title': (record.get('title') or '').strip(),
+            'release_year': int(record['release_year']),
+            'duration': _optional(record.get('duration'), int),
+            'plot': record.get('plot') or '',
+            'rating': _optional(record.get('rating'), _rating),
+            'poster_url': record.get('poster_url') or None,
+            'backdrop_url': record.get('backdrop_url') or None,
+        }
+        director = (record.get('director') or '').strip()
+        reviews = [
+            {
+                'reviewer_name': review['reviewer_name'].strip(),
+                'rating': int(review['rating']),
+                'comment': review.get('comment') or '',
+                'is_featured': bool(review.get('is_featured', False)),
+            }
+            for review in record.get('reviews') or ()
+        ]
+    except (KeyError, TypeError, ValueError) as exc:
+        raise RecordError(f'invalid value: {exc}')
+
+    if not movie['title'] or not director:
+        raise RecordError('title and director are required')
+    _validate(Movie, 'release_year', movie['release_year'])
+    _validate(Movie, 'rating', movie['rating'])
+    for review in reviews:
+        _validate(Review, 'rating', review['rating'])
+    genres = [name.strip() for name in record.get('genres') or () if name.strip()]
+    actors = [name.strip() for name in record.get('actors') or () if name.strip()]
+    return movie, director, genres, actors, reviews
+
+
+class BulkWriter:
+    """Upserts rows with bulk_create; works on every database Django supports"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def upsert_movies(self, rows):
+        """Insert or update movie rows (dicts of Movie column values); return {MOVIE_KEY values: id}"""
+        objects = Movie.objects.bulk_create(
+            [Movie(**row) for row in rows],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=MOVIE_KEY,
+            update_fields=MOVIE_UPDATE_FIELDS,
+        )
+        ids = {tuple(getattr(obj, field) for field in MOVIE_KEY): obj.pk for obj in objects}
+        if None in ids.values():
+            # Backends that cannot return ids from an upsert
+            ids = self.lookup_movie_ids(ids)
+        return ids
+
+    def lookup_movie_ids(self, keys):
+        found = {}
+        for title, year, director_id, pk in Movie.objects.filter(
+            title__in={key[0] for key in keys}, director_id__in={key[2] for key in keys}
+        ).values_list(*MOVIE_KEY, 'id'):
+            found[(title, year, director_id)] = pk
+        return {key: found[key] for key in keys}
+
+    def upsert_reviews(self, rows):
+        Review.objects.bulk_create(
+            [Review(**row) for row in rows],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=('movie_id', 'reviewer_name'),
+            update_fields=REVIEW_UPDATE_FIELDS,
+        )
+
+    def link(self, through, pairs):
+        """Insert (movie_id, other_id) rows into an M2M through table, skipping existing links"""
+        movie_field, other_field = self.through_columns(through)
+        through.objects.bulk_create(
+            [through(**{movie_field: movie_id, other_field: other_id}) for movie_id, other_id in pairs],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def through_columns(through):
+        other = next(field for field in through._meta.concrete_fields
+                     if field.is_relation and field.related_model is not Movie)
+        return 'movie_id', other.attname
+
+
+class CopyWriter(BulkWriter):
+    """
+    PostgreSQL writer: rows are streamed with COPY into a temporary staging
+    table and moved into place with one INSERT ... ON CONFLICT per table
+    """
+
+    def upsert_movies(self, rows):
+        columns = MOVIE_FIELDS + ('director_id', 'created_at', 'updated_at',
+                                  'review_count', 'review_rating_sum')
+        returned = self.copy_upsert(
+            Movie, columns, [[row[column] for column in columns] for row in rows],
+            conflict=MOVIE_KEY, update=MOVIE_UPDATE_FIELDS, returning=MOVIE_KEY + ('id',),
+        )
+        return {tuple(row[:3]): row[3] for row in returned}
+
+    def upsert_reviews(self, rows):
+        columns = ('movie_id', 'reviewer_name', 'rating', 'comment', 'is_featured', 'created_at', 'updated_at')
+        self.copy_upsert(Review, columns, [[row[column] for column in columns] for row in rows],
+                         conflict=('movie_id', 'reviewer_name'), update=REVIEW_UPDATE_FIELDS)
+
+    def link(self, through, pairs):
+        self.copy_upsert(through, self.through_columns(through), pairs, conflict=None)
+
+    def copy_upsert(self, model, columns, rows, conflict, update=(), returning=()):
+        if not rows:
+            return []
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        stage = qn('import_' + model._meta.db_table)
+        column_list = ', '.join(qn(column) for column in columns)
+
+        if update:
+            on_conflict = 'ON CONFLICT (%s) DO UPDATE SET %s' % (
+                ', '.join(qn(column) for column in conflict),
+                ', '.join(f'{qn(column)} = EXCLUDED.{qn(column)}' for column in update),
+            )
+        else:
+            on_conflict = 'ON CONFLICT DO NOTHING'
+        returning_sql = ' RETURNING ' + ', '.join(qn(column) for column in returning) if returning else ''
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE {stage} AS SELECT {column_list} FROM {table} WITH NO DATA')
+            try:
+                pgcopy.copy_rows(cursor, f'COPY {stage} ({column_list}) FROM STDIN', rows)
+                cursor.execute(
+                    f'INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {stage} {on_conflict}{returning_sql}'
+                )
+                return cursor.fetchall() if returning else []
+            finally:
+                cursor.execute(f'DROP TABLE {stage}')
+
+
+class CatalogImporter:
+    """
+    Imports batches of records; `stats` counts what was read, written and skipped.
+    `progress(stats, elapsed_seconds)` is called after every committed batch.
+    """
+
+    def __init__(self, batch_size=5000, method='auto', progress=None):
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise ValueError('COPY loading needs PostgreSQL')
+        self.method = method
+        self.writer = (CopyWriter if method == 'copy' else BulkWriter)(batch_size)
+        self.batch_size = batch_size
+        self.progress = progress or (lambda stats, elapsed: None)
+        self.stats = {'records': 0, 'movies': 0, 'reviews': 0, 'cast_links': 0, 'genre_links': 0,
+                      'new_genres': 0, 'new_directors': 0, 'new_actors': 0, 'skipped': 0}
+        self.errors = []
+
+        self.genre_ids = dict(Genre.objects.values_list('name', 'id'))
+        self.director_ids = self.load_names(Director)
+        self.actor_ids = self.load_names(Actor)
+
+    @staticmethod
+    def load_names(model):
+        # Names are not unique for people; the first row with a name wins
+        ids = {}
+        for name, pk in model.objects.order_by('-id').values_list('name', 'id').iterator(chunk_size=50000):
+            ids[name] = pk
+        return ids
+
+    def run(self, records):
+        """Import (location, record) pairs and return the stats"""
+        start = time.perf_counter()
+        batch = []
+        for location, record in records:
+            self.stats['records'] += 1
+            try:
+                batch.append(clean_record(record))
+            except RecordError as exc:
+                self.stats['skipped'] += 1
+                self.errors.append((location, str(exc)))
+                continue
+            if len(batch) == self.batch_size:
+                self.write_batch(batch)
+                batch = []
+                self.progress(self.stats, time.perf_counter() - start)
+        if batch:
+            self.write_batch(batch)
+            self.progress(self.stats, time.perf_counter() - start)
+
+        leaderboard.rebuild()
+        similarity.rebuild()
+        recommendations.rebuild()
+        bump_versions(Movie, RatingNeighbor)
+        # Bulk loaded rows skip the model signals, so this process's filter index reloads on its next
+        # lookup; other processes only see them once theirs expire (FILTER_INDEX['MAX_AGE'])
+        filter_index.index.clear()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        return self.stats
+
+    def resolve(self, model, ids, names, stat):
+        """Create the names missing from `ids` and add them to it"""
+        missing = sorted(set(names) - ids.keys())
+        if not missing:
+            return
+        if model is Genre:
+            Genre.objects.bulk_create([Genre(name=name) for name in missing], ignore_conflicts=True)
+            ids.update(Genre.objects.filter(name__in=missing).values_list('name', 'id'))
+        else:
+            created = model.objects.bulk_create([model(name=name) for name in missing], batch_size=self.batch_size)
+            if any(obj.pk is None for obj in created):
+                created = model.objects.filter(name__in=missing).order_by('id')
+            ids.update((obj.name, obj.pk) for obj in created)
+        self.stats[stat] += len(missing)
+
+    def write_batch(self, batch):
+        now = timezone.now()
+        with transaction.atomic():
+            self.resolve(Genre, self.genre_ids, (name for _, _, genres, _, _ in batch for name in genres), 'new_genres')
+            self.resolve(Director, self.director_ids, (director for _, director, _, _, _ in batch), 'new_directors')
+            self.resolve(Actor, self.actor_ids, (name for _, _, _, actors, _ in batch for name in actors), 'new_actors')
+
+            # The same movie twice in one upsert is an error; the last record wins
+            movies = {}
+            for movie, director, genres, actors, reviews in batch:
+                row = {**movie, 'director_id': self.director_ids[director], 'created_at': now, 'updated_at': now,
+                       'review_count': 0, 'review_rating_sum': 0}
+                movies[tuple(row[field] for field in MOVIE_KEY)] = (row, genres, actors, reviews)
+            movie_ids = self.writer.upsert_movies([row for row, _, _, _ in movies.values()])
+
+            cast, tags, review_rows = set(), set(), {}
+            for key, (_, genres, actors, reviews) in movies.items():
+                movie_id = movie_ids[key]
+                tags.update((movie_id, self.genre_ids[name]) for name in genres)
+                cast.update((movie_id, self.actor_ids[name]) for name in actors)
+                for review in reviews:
+                    review_rows[(movie_id, review['reviewer_name'])] = {
+                        **review, 'movie_id': movie_id, 'created_at': now, 'updated_at': now,
+                    }
+            self.writer.link(Movie.genres.through, sorted(tags))
+            self.writer.link(Movie.actors.through, sorted(cast))
+            if review_rows:
+                self.writer.upsert_reviews(list(review_rows.values()))
+                Movie.objects.filter(pk__in={row['movie_id'] for row in review_rows.values()}).rebuild_review_aggregates()
+            # Cached responses must not outlive a committed batch until the whole import ends
+            bump_versions(Movie, Review, Actor, Director, Genre)
+
+        self.stats['movies'] += len(movies)
+        self.stats['genre_links'] += len(tags)
+        self.stats['cast_links'] += len(cast)
+        self.stats['reviews'] += len(review_rows)
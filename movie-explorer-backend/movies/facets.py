@@ -0,0 +1,111 @@
+"""
+Facet counts for the movie browser.
+
+For the MovieFilter params of a request, counts how many movies each genre,
+decade, whole-point rating threshold and director would match. Facets are
+disjunctive: a facet's counts apply every filter except its own, so choosing
+a genre still shows how many movies every other genre would give instead.
+Every facet is one grouped aggregate query, and the total one COUNT; facets
+whose own params are not in the request share the fully filtered queryset.
+Responses are cached per filter set by the view's response cache.
+"""
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django_filters.utils import translate_validation
+
+from .filters import MovieFilter
+from .models import Movie
+
+DEFAULT_FACETS = {
+    # Directors listed, those with the most matching movies first
+    'TOP_DIRECTORS': 20,
+}
+
+# MovieFilter params each facet ignores when counting its own values
+FACET_PARAMS = {
+    'genres': ('genre', 'genre_id'),
+    'decades': ('release_year', 'release_year_gte', 'release_year_lte'),
+    'ratings': ('rating_gte', 'rating_lte'),
+    'directors': ('director', 'director_id'),
+}
+
+# Thresholds of the ratings facet, as rating_gte values
+RATING_THRESHOLDS = range(1, 10)
+
+
+def get_facets_settings():
+    return {**DEFAULT_FACETS, **getattr(settings, 'FACETS', {})}
+
+
+def filter_movies(params, ignore=()):
+    """
+    The movies matching the MovieFilter `params` without the `ignore`d ones,
+    as a queryset of distinct movies, or None when no filter applies
+    """
+    filterset = MovieFilter({key: value for key, value in params.items() if key not in ignore},
+                            queryset=Movie.objects.all())
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    active = [
+        name for name, value in filterset.form.cleaned_data.items()
+        if name != 'ordering' and value not in (None, '')
+    ]
+    if not active:
+        return None
+    # Relation filters join the through tables, so only the matching ids are kept
+    return Movie.objects.filter(pk__in=filterset.qs.order_by().values('pk'))
+
+
+def genre_counts(movies):
+    links = Movie.genres.through.objects.all()
+    if movies is not None:
+        links = links.filter(movie_id__in=movies.values('pk'))
+    return [
+        {'id': row['genre_id'], 'name': row['genre__name'], 'count': row['count']}
+        for row in links.values('genre_id', 'genre__name').annotate(count=Count('movie_id'))
+        .order_by('-count', 'genre__name')
+    ]
+
+
+def decade_counts(movies):
+    movies = Movie.objects.all() if movies is None else movies
+    return list(
+        movies.annotate(decade=F('release_year') / 10 * 10).values('decade')
+        .annotate(count=Count('pk')).order_by('decade')
+    )
+
+
+def rating_counts(movies):
+    movies = Movie.objects.all() if movies is None else movies
+    counts = movies.aggregate(**{
+        str(threshold): Count('pk', filter=Q(rating__gte=threshold)) for threshold in RATING_THRESHOLDS
+    })
+    return [{'rating_gte': threshold, 'count': counts[str(threshold)]} for threshold in RATING_THRESHOLDS]
+
+
+def director_counts(movies, limit):
+    movies = Movie.objects.all() if movies is None else movies
+    return [
+        {'id': row['director_id'], 'name': row['director__name'], 'count': row['count']}
+        for row in movies.values('director_id', 'director__name').annotate(count=Count('pk'))
+        .order_by('-count', 'director__name', 'director_id')[:limit]
+    ]
+
+
+def facet_counts(params):
+    """The total and the facet counts of the movies matching the MovieFilter `params`"""
+    config = get_facets_settings()
+    movies = filter_movies(params)
+
+    def without(facet):
+        if not set(FACET_PARAMS[facet]) & set(params):
+            return movies
+        return filter_movies(params, ignore=FACET_PARAMS[facet])
+
+    return {
+        'count': (Movie.objects.all() if movies is None else movies).count(),
+        'genres': genre_counts(without('genres')),
+        'decades': decade_counts(without('decades')),
+        'ratings': rating_counts(without('ratings')),
+        'directors': director_counts(without('directors'), config['TOP_DIRECTORS']),
+    }
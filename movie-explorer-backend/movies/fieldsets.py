@@ -0,0 +1,124 @@
+"""
+Sparse fieldsets: ?fields=, ?include= and ?exclude= on read requests.
+
+- `fields` renders only the listed fields instead of the serializer's defaults
+- `include` adds fields, including optional ones a serializer leaves out by
+  default (Meta.optional_fields)
+- `exclude` drops fields
+
+Names are comma-separated and may be dotted to reach into nested
+serializers, e.g. `?fields=title,actors.name` or `?exclude=actors.movies_count`.
+Views read the pruned serializer fields back (get_rendered_fields) to skip
+the select_related / prefetch_related calls and annotations that omitted
+fields would need.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.serializers import ListSerializer
+
+FIELDSET_PARAMS = ('fields', 'include', 'exclude')
+READ_METHODS = ('GET', 'HEAD')
+
+
+class Fieldset:
+    """
+    The fields requested from one serializer: `only` (None keeps the
+    defaults), `include` and `exclude`, and the Fieldsets of nested
+    serializers keyed by field name
+    """
+
+    def __init__(self):
+        self.only = None
+        self.include = set()
+        self.exclude = set()
+        self.nested = {}
+
+    @classmethod
+    def from_params(cls, params):
+        root = cls()
+        for param in FIELDSET_PARAMS:
+            for path in (params.get(param) or '').split(','):
+                if not path.strip():
+                    continue
+                *parents, name = [part.strip() for part in path.split('.')]
+                node = root
+                for parent in parents:
+                    # Asking for a nested field implies its parent, unless excluding
+                    if param != 'exclude':
+                        node.add(param, parent)
+                    node = node.nested.setdefault(parent, cls())
+                node.add(param, name)
+        return root
+
+    def add(self, param, name):
+        if param == 'fields':
+            self.only = (self.only or set()) | {name}
+        else:
+            getattr(self, param).add(name)
+
+    def select(self, names, optional=()):
+        """The names, in order, of the fields to render out of `names`"""
+        unknown = ((self.only or set()) | self.include | self.exclude | self.nested.keys()) - set(names)
+        if unknown:
+            raise ParseError({'error': 'Unknown field(s): ' + ', '.join(sorted(unknown))})
+        wanted = self.only if self.only is not None else set(names) - set(optional)
+        wanted = (wanted | self.include) - self.exclude
+        return [name for name in names if name in wanted]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer mixin that renders the fields picked by the request's Fieldset
+    (the `fieldset` serializer context), or by its parent's for nested
+    serializers. Fields in Meta.optional_fields are only rendered when asked for.
+    Write-only fields are left alone.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset() or Fieldset()
+        optional = getattr(self.Meta, 'optional_fields', ())
+        readable = [name for name, field in fields.items() if not field.write_only]
+        keep = set(fieldset.select(readable, optional))
+        fields = {name: field for name, field in fields.items() if field.write_only or name in keep}
+
+        for name, nested in fieldset.nested.items():
+            if name not in fields:
+                continue
+            target = fields[name].child if isinstance(fields[name], ListSerializer) else fields[name]
+            if not isinstance(target, SparseFieldsetSerializerMixin):
+                raise ParseError({'error': f'Field {name} has no subfields'})
+            target._fieldset = nested
+        return fields
+
+    def get_fieldset(self):
+        if hasattr(self, '_fieldset'):
+            return self._fieldset
+        parent = self.parent.parent if isinstance(self.parent, ListSerializer) else self.parent
+        # Only the top-level serializer reads the request's fieldset; nested ones get theirs from it
+        return self.context.get('fieldset') if parent is None else None
+
+
+class SparseFieldsetViewMixin:
+    """
+    Pass the request's Fieldset to the serializers of read requests. Views
+    build their querysets from get_rendered_fields().
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = Fieldset.from_params(self.request.query_params)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method in READ_METHODS:
+            context['fieldset'] = self.get_fieldset()
+        return context
+
+    def get_rendered_fields(self, serializer_class=None):
+        """
+        The fields the response's serializer will render, by name; those of a
+        nested serializer are under `.fields` (or `.child.fields` for lists)
+        """
+        serializer_class = serializer_class or self.get_serializer_class()
+        return serializer_class(context=self.get_serializer_context()).fields
@@ -0,0 +1,408 @@
+"""
+Optional in-process engine for movie list filters.
+
+Keeps every movie's release year, rating, director, creation time and title
+rank in parallel NumPy columns, and the sorted row positions of the movies
+of every genre and actor. A MovieFilter combination of the indexed filters
+(INDEXED_FILTERS) becomes a boolean mask built with vectorized comparisons
+and set lookups, so joining the M2M tables and DISTINCT are never needed.
+The matches are ordered with one lexsort over the same keys the database
+would sort on. The list endpoint then hydrates only the requested page by
+primary key (see IndexFilterBackend).
+
+The index is loaded with one movie query and one query per relation. Model
+signals keep it current in this process, and like the autocomplete index it
+is reloaded after MAX_AGE seconds to pick up writes made by other
+processes, while lookups keep using the expired index. The columns keep
+spare capacity and double when full, so adding movies copies them only
+once per doubling. Title ranks follow the database collation, so a title
+change only marks them stale and the next title-ordered lookup reloads
+them, outside the lock, while other lookups keep using the old ranks.
+Enable it with FILTER_INDEX['ENABLED']; other filters (the trigram name
+searches), keyset cursors and other actions always use the database.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+
+from .models import Movie
+
+DEFAULT_FILTER_INDEX = {
+    # Serve the movie list from the in-process index instead of filtering in the database
+    'ENABLED': False,
+    # Seconds before the next lookup reloads the index from the database (None never reloads)
+    'MAX_AGE': 60,
+}
+
+# MovieFilter params the index answers; any other active filter uses the database
+INDEXED_FILTERS = {
+    'genre_id', 'actor_id', 'director_id', 'release_year', 'release_year_gte', 'release_year_lte',
+    'rating_gte', 'rating_lte',
+}
+
+# relation -> (M2M field on Movie, filter param)
+INDEXED_RELATIONS = {
+    'genre': ('genres', 'genre_id'),
+    'actor': ('actors', 'actor_id'),
+}
+
+EMPTY_ROWS = np.array([], dtype=np.int64)
+
+
+def get_filter_index_settings():
+    return {**DEFAULT_FILTER_INDEX, **getattr(settings, 'FILTER_INDEX', {})}
+
+
+def timestamp(value):
+    """created_at as an integer sort key"""
+    return int(value.timestamp() * 1_000_000) if value is not None else 0
+
+
+def title_rank():
+    """Position of each movie in title order, by the database's collation"""
+    return Window(RowNumber(), order_by=[F('title').asc(), F('pk').asc()])
+
+
+class MovieFilterIndex:
+    """
+    Columns of movie attributes by row position plus, per relation, the
+    sorted rows of each related id. Rows of deleted movies are only marked
+    dead until the next load, and rows past the last movie are spare
+    capacity, never alive. All access goes through one lock; loads and
+    title reloads take locks of their own so only one thread runs each
+    query, without holding the main lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._titles_lock = threading.Lock()
+        self._changes = None
+        self.clear()
+
+    def clear(self):
+        """Drop everything; the next lookup reloads from the database"""
+        with self._lock:
+            self._ids = EMPTY_ROWS
+            # Rows in use, dead or alive; the columns may be longer
+            self._size = 0
+            self._rows = {}
+            self._columns = {}
+            self._relations = {relation: {} for relation in INDEXED_RELATIONS}
+            self._titles_stale = False
+            # A load in progress read its rows before the clear, so it is discarded
+            self._changes = None
+            self.loaded_at = None
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    @property
+    def is_tracking(self):
+        """Whether writes must be applied: the index is loaded, or loading and recording them"""
+        return self.is_loaded or self._changes is not None
+
+    def load(self):
+        """Replace the index contents with the current database rows"""
+        with self._lock:
+            changes = self._changes = []
+        try:
+            ids, columns, relations = self._read()
+        except BaseException:
+            # Stop recording writes for a load that will not happen
+            with self._lock:
+                if self._changes is changes:
+                    self._changes = None
+            raise
+
+        with self._lock:
+            if self._changes is not changes:
+                return
+            self._changes = None
+            self._ids = ids
+            self._size = len(ids)
+            self._rows = dict(zip(ids.tolist(), range(len(ids))))
+            self._columns = columns
+            self._relations = relations
+            self._titles_stale = False
+            self.loaded_at = time.monotonic()
+            # Writes committed while the rows were read; the rows may already include them
+            for method, args in changes:
+                getattr(self, method)(*args)
+
+    def _read(self):
+        """The ids, columns and relation rows of every movie, read from the database"""
+        movies = list(
+            Movie.objects.order_by('pk').annotate(title_rank=title_rank())
+            .values_list('pk', 'release_year', 'rating', 'director_id', 'created_at', 'title_rank')
+        )
+        ids = np.array([movie[0] for movie in movies], dtype=np.int64)
+        columns = {
+            'release_year': np.array([movie[1] for movie in movies], dtype=np.int64),
+            'rating': np.array([np.nan if movie[2] is None else float(movie[2]) for movie in movies]),
+            'director_id': np.array([movie[3] for movie in movies], dtype=np.int64),
+            'created_at': np.array([timestamp(movie[4]) for movie in movies], dtype=np.int64),
+            'title': np.array([movie[5] for movie in movies], dtype=np.int64),
+            'alive': np.ones(len(movies), dtype=bool),
+        }
+        relations = {}
+        for relation, (field, _) in INDEXED_RELATIONS.items():
+            descriptor = getattr(Movie, field)
+            links = descriptor.through.objects.order_by().values_list('movie_id', descriptor.field.m2m_reverse_name())
+            links = np.array(list(links), dtype=np.int64).reshape(-1, 2)
+            # Rows grouped by related id, each group sorted
+            rows = np.searchsorted(ids, links[:, 0])
+            order = np.lexsort((rows, links[:, 1]))
+            keys, starts = np.unique(links[order, 1], return_index=True)
+            relations[relation] = dict(zip(keys.tolist(), np.split(rows[order], starts[1:]) if len(keys) else []))
+        return ids, columns, relations
+
+    def is_stale(self):
+        max_age = get_filter_index_settings()['MAX_AGE']
+        loaded_at = self.loaded_at
+        return loaded_at is None or (max_age is not None and time.monotonic() - loaded_at > max_age)
+
+    def ensure_loaded(self):
+        """
+        Load the index if it is missing or older than MAX_AGE. An expired index
+        keeps serving lookups while one thread reloads it.
+        """
+        if not self.is_stale():
+            return
+        if self.is_loaded:
+            if not self._load_lock.acquire(blocking=False):
+                return
+        else:
+            self._load_lock.acquire()
+        try:
+            if self.is_stale():
+                self.load()
+        finally:
+            self._load_lock.release()
+
+    def warm(self):
+        """Load at process start when enabled; if the database is not ready yet the first lookup loads instead"""
+        if not get_filter_index_settings()['ENABLED']:
+            return
+        try:
+            self.ensure_loaded()
+        except DatabaseError:
+            self.clear()
+
+    def select(self, filters, ordering):
+        """
+        Ids of the movies matching the cleaned MovieFilter `filters` (all in
+        INDEXED_FILTERS), sorted by the `ordering` terms and then by id
+        """
+        self.ensure_loaded()
+        if any(term.lstrip('-') == 'title' for term in ordering):
+            self.ensure_titles()
+        with self._lock:
+            columns = self._columns
+            mask = columns['alive'].copy()
+            for relation, (_, param) in INDEXED_RELATIONS.items():
+                if param in filters:
+                    member = np.zeros(len(mask), dtype=bool)
+                    member[self._relations[relation].get(int(filters[param]), EMPTY_ROWS)] = True
+                    mask &= member
+            if 'director_id' in filters:
+                mask &= columns['director_id'] == int(filters['director_id'])
+            if 'release_year' in filters:
+                mask &= columns['release_year'] == float(filters['release_year'])
+            if 'release_year_gte' in filters:
+                mask &= columns['release_year'] >= float(filters['release_year_gte'])
+            if 'release_year_lte' in filters:
+                mask &= columns['release_year'] <= float(filters['release_year_lte'])
+            # NaN (no rating) fails every comparison, like NULL in SQL
+            if 'rating_gte' in filters:
+                mask &= columns['rating'] >= float(filters['rating_gte'])
+            if 'rating_lte' in filters:
+                mask &= columns['rating'] <= float(filters['rating_lte'])
+            rows = np.flatnonzero(mask)
+            # lexsort sorts by the last key first
+            keys = [self._ids[rows]]
+            for term in reversed(ordering):
+                keys.append(self._sort_key(term, rows))
+            return self._ids[rows[np.lexsort(keys)]]
+
+    def _sort_key(self, term, rows):
+        name = term.lstrip('-')
+        values = self._columns[name][rows]
+        if name == 'rating':
+            # NULL sorts as the largest value on PostgreSQL and the smallest elsewhere
+            values = np.nan_to_num(values, nan=np.inf if connection.vendor == 'postgresql' else -np.inf)
+        return -values if term.startswith('-') else values
+
+    def ensure_titles(self):
+        """
+        Reload the title ranks if a title changed since they were read. The
+        query runs without the main lock; titles changed while it runs mark
+        the ranks stale again for the next lookup.
+        """
+        if not self._titles_stale:
+            return
+        with self._titles_lock:
+            with self._lock:
+                if not self._titles_stale:
+                    return
+                self._titles_stale = False
+                loaded_at, ids = self.loaded_at, self._ids[:self._size].copy()
+            ranks = dict(Movie.objects.order_by().annotate(title_rank=title_rank()).values_list('pk', 'title_rank'))
+            titles = np.array([ranks.get(pk, 0) for pk in ids.tolist()], dtype=np.int64)
+            with self._lock:
+                if self.loaded_at != loaded_at:
+                    # Reloaded or cleared meanwhile, with ranks of its own
+                    return
+                # Rows are only ever appended, so rows added since keep their rank until the next reload
+                self._columns['title'][:len(titles)] = titles
+
+    def _grow(self):
+        """Double the capacity of the columns; spare rows are zero, so never alive"""
+        size = len(self._ids)
+        capacity = max(2 * size, 64)
+        self._ids = np.concatenate([self._ids, np.zeros(capacity - size, dtype=np.int64)])
+        self._columns = {
+            name: np.concatenate([values, np.zeros(capacity - size, dtype=values.dtype)])
+            for name, values in self._columns.items()
+        }
+
+    def upsert_movie(self, pk, release_year, rating, director_id, created_at=None, title_changed=True):
+        """Add a movie or update its columns; a created_at of None keeps the stored one"""
+        with self._lock:
+            self._record('upsert_movie', pk, release_year, rating, director_id, created_at, title_changed)
+            if not self.is_loaded:
+                return
+            row = self._rows.get(pk)
+            if row is None:
+                row = self._size
+                if row == len(self._ids):
+                    self._grow()
+                self._size += 1
+                self._ids[row] = pk
+                self._rows[pk] = row
+            values = {
+                'release_year': release_year, 'rating': np.nan if rating is None else float(rating),
+                'director_id': director_id, 'alive': True,
+            }
+            if created_at is not None:
+                values['created_at'] = timestamp(created_at)
+            for name, value in values.items():
+                self._columns[name][row] = value
+            if title_changed:
+                self._titles_stale = True
+
+    def remove_movie(self, pk):
+        with self._lock:
+            self._record('remove_movie', pk)
+            row = self._rows.pop(pk, None)
+            if row is not None:
+                self._columns['alive'][row] = False
+
+    def add_links(self, relation, pairs):
+        """Link (movie id, related id) pairs"""
+        with self._lock:
+            self._record('add_links', relation, pairs)
+            self._change_links(relation, pairs, np.union1d)
+
+    def remove_links(self, relation, pairs):
+        with self._lock:
+            self._record('remove_links', relation, pairs)
+            self._change_links(relation, pairs, np.setdiff1d)
+
+    def _change_links(self, relation, pairs, combine):
+        with self._lock:
+            if not self.is_loaded:
+                return
+            members = self._relations[relation]
+            by_key = {}
+            for movie_id, key in pairs:
+                if movie_id in self._rows:
+                    by_key.setdefault(key, []).append(self._rows[movie_id])
+            for key, rows in by_key.items():
+                members[key] = combine(members.get(key, EMPTY_ROWS), np.array(rows, dtype=np.int64))
+
+    def clear_movie_links(self, relation, pk):
+        """Unlink one movie from every related id"""
+        with self._lock:
+            self._record('clear_movie_links', relation, pk)
+            row = self._rows.get(pk)
+            if row is None:
+                return
+            members = self._relations[relation]
+            for key, rows in members.items():
+                if row in rows:
+                    members[key] = rows[rows != row]
+
+    def remove_key(self, relation, key):
+        """Unlink every movie from a related id"""
+        with self._lock:
+            self._record('remove_key', relation, key)
+            self._relations[relation].pop(key, None)
+
+    def _record(self, method, *args):
+        """Remember a write made during a load, to be replayed on the loaded index"""
+        if self._changes is not None:
+            self._changes.append((method, args))
+
+
+index = MovieFilterIndex()
+
+
+class IndexedMovies:
+    """
+    The movies with the given ids in order, sliced like a queryset: each
+    slice is hydrated from `queryset` with one primary key lookup
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        ids = self.ids[key].tolist()
+        objects = {
+            item['id'] if isinstance(item, dict) else item.pk: item
+            for item in self.queryset.filter(pk__in=ids).order_by()
+        }
+        return [objects[pk] for pk in ids if pk in objects]
+
+
+class IndexFilterBackend(DjangoFilterBackend):
+    """
+    DjangoFilterBackend answering the `list` action from the filter index
+    when it is enabled and every active filter is indexed
+    """
+    index_actions = ('list',)
+
+    def filter_queryset(self, request, queryset, view):
+        if (
+            not get_filter_index_settings()['ENABLED'] or view.action not in self.index_actions
+            or 'cursor' in request.query_params
+        ):
+            return super().filter_queryset(request, queryset, view)
+        filterset = self.get_filterset(request, queryset, view)
+        if filterset is None:
+            return queryset
+        if not filterset.is_valid() and self.raise_exception:
+            raise translate_validation(filterset.errors)
+        filters = {name: value for name, value in filterset.form.cleaned_data.items() if value not in (None, '', [])}
+        ordering = filters.pop('ordering', None) or Movie._meta.ordering
+        if not set(filters) <= INDEXED_FILTERS:
+            return filterset.qs
+        return IndexedMovies(index.select(filters, ordering), queryset)
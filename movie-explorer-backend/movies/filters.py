@@ -2,19 +2,23 @@ import django_filters
 from .models import Movie, Actor, Director, Genre, Review
 
 
+# Text filters use the trgm_icontains lookup (movies/lookups.py) so that PostgreSQL
+# serves them from the pg_trgm GIN indexes instead of sequential scans
+
+
 class MovieFilter(django_filters.FilterSet):
     """
     Filter class for Movie model with multiple filtering options
     """
-    title = django_filters.CharFilter(lookup_expr='icontains')
+    title = django_filters.CharFilter(lookup_expr='trgm_icontains')
     release_year = django_filters.NumberFilter()
     release_year_gte = django_filters.NumberFilter(field_name='release_year', lookup_expr='gte')
     release_year_lte = django_filters.NumberFilter(field_name='release_year', lookup_expr='lte')
-    director = django_filters.CharFilter(field_name='director__name', lookup_expr='icontains')
+    director = django_filters.CharFilter(field_name='director__name', lookup_expr='trgm_icontains')
     director_id = django_filters.NumberFilter(field_name='director__id')
-    actor = django_filters.CharFilter(field_name='actors__name', lookup_expr='icontains')
+    actor = django_filters.CharFilter(field_name='actors__name', lookup_expr='trgm_icontains')
     actor_id = django_filters.NumberFilter(field_name='actors__id')
-    genre = django_filters.CharFilter(field_name='genres__name', lookup_expr='icontains')
+    genre = django_filters.CharFilter(field_name='genres__name', lookup_expr='trgm_icontains')
     genre_id = django_filters.NumberFilter(field_name='genres__id')
     rating_gte = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
     rating_lte = django_filters.NumberFilter(field_name='rating', lookup_expr='lte')
@@ -41,11 +45,11 @@ class ActorFilter(django_filters.FilterSet):
     """
     Filter class for Actor model
     """
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    nationality = django_filters.CharFilter(lookup_expr='icontains')
-    movie = django_filters.CharFilter(field_name='movies__title', lookup_expr='icontains')
+    name = django_filters.CharFilter(lookup_expr='trgm_icontains')
+    nationality = django_filters.CharFilter(lookup_expr='trgm_icontains')
+    movie = django_filters.CharFilter(field_name='movies__title', lookup_expr='trgm_icontains')
     movie_id = django_filters.NumberFilter(field_name='movies__id')
-    genre = django_filters.CharFilter(field_name='movies__genres__name', lookup_expr='icontains')
+    genre = django_filters.CharFilter(field_name='movies__genres__name', lookup_expr='trgm_icontains')
     genre_id = django_filters.NumberFilter(field_name='movies__genres__id')
 
     class Meta:
@@ -57,9 +61,9 @@ class DirectorFilter(django_filters.FilterSet):
     """
     Filter class for Director model
     """
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    nationality = django_filters.CharFilter(lookup_expr='icontains')
-    movie = django_filters.CharFilter(field_name='movies__title', lookup_expr='icontains')
+    name = django_filters.CharFilter(lookup_expr='trgm_icontains')
+    nationality = django_filters.CharFilter(lookup_expr='trgm_icontains')
+    movie = django_filters.CharFilter(field_name='movies__title', lookup_expr='trgm_icontains')
     movie_id = django_filters.NumberFilter(field_name='movies__id')
 
     class Meta:
@@ -71,7 +75,7 @@ class GenreFilter(django_filters.FilterSet):
     """
     Filter class for Genre model
     """
-    name = django_filters.CharFilter(lookup_expr='icontains')
+    name = django_filters.CharFilter(lookup_expr='trgm_icontains')
 
     class Meta:
         model = Genre
@@ -82,9 +86,9 @@ class ReviewFilter(django_filters.FilterSet):
     """
     Filter class for Review model
     """
-    movie = django_filters.CharFilter(field_name='movie__title', lookup_expr='icontains')
+    movie = django_filters.CharFilter(field_name='movie__title', lookup_expr='trgm_icontains')
     movie_id = django_filters.NumberFilter(field_name='movie__id')
-    reviewer_name = django_filters.CharFilter(lookup_expr='icontains')
+    reviewer_name = django_filters.CharFilter(lookup_expr='trgm_icontains')
     rating = django_filters.NumberFilter()
     rating_gte = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
     rating_lte = django_filters.NumberFilter(field_name='rating', lookup_expr='lte')
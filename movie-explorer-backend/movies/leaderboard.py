@@ -0,0 +1,173 @@
+"""
+Precomputed top-rated leaderboards.
+
+Every movie with at least MIN_VOTES reviews has one LeaderboardEntry per
+board it belongs to: the overall board, one per genre and one for its release
+decade. The score is a Bayesian average over the stored review aggregates,
+
+    (review_rating_sum + PRIOR_VOTES * prior_mean) / (review_count + PRIOR_VOTES)
+
+which pulls movies with few reviews towards the catalog-wide mean rating.
+A movie's entries are rewritten whenever its reviews, genres or release year
+change (see movies.signals), so reading a board is one range scan of the
+(scope, scope_key, -score) index. Full rebuilds run in the database as a
+single INSERT ... SELECT. The prior mean is fixed when the boards are
+rebuilt (`manage.py rebuild_leaderboard`), which is also needed after
+changing the LEADERBOARD setting, and stored in the LeaderboardPrior row so
+every process scores incremental updates against the same prior.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import LeaderboardEntry, LeaderboardPrior, Movie, related_search_vectors
+
+DEFAULT_LEADERBOARD = {
+    # Reviews a movie needs before it is ranked
+    'MIN_VOTES': 1,
+    # Weight of the prior, in reviews
+    'PRIOR_VOTES': 5,
+    # Rating movies are pulled towards; None uses the mean of all reviews at the last rebuild
+    'PRIOR_MEAN': None,
+}
+
+# Primary key of the single LeaderboardPrior row
+PRIOR_PK = 1
+
+
+def get_leaderboard_settings():
+    return {**DEFAULT_LEADERBOARD, **getattr(settings, 'LEADERBOARD', {})}
+
+
+def decade_of(year):
+    return year // 10 * 10
+
+
+def compute_prior_mean():
+    """Mean rating over every review in the catalog"""
+    totals = Movie.objects.aggregate(votes=Sum('review_count'), total=Sum('review_rating_sum'))
+    return totals['total'] / totals['votes'] if totals['votes'] else 0.0
+
+
+def get_prior_mean():
+    config = get_leaderboard_settings()
+    if config['PRIOR_MEAN'] is not None:
+        return float(config['PRIOR_MEAN'])
+    mean = LeaderboardPrior.objects.filter(pk=PRIOR_PK).values_list('mean', flat=True).first()
+    if mean is None:
+        # The boards were never rebuilt; fix the prior at the current mean
+        prior, _ = LeaderboardPrior.objects.get_or_create(pk=PRIOR_PK, defaults={'mean': compute_prior_mean()})
+        mean = prior.mean
+    return mean
+
+
+def build_entries(movies, genre_ids, config, prior_mean):
+    """
+    Unsaved entries for `movies`, an iterable of (id, release_year, review_count,
+    review_rating_sum), given a dict of movie id -> genre ids
+    """
+    prior_votes = config['PRIOR_VOTES']
+    entries = []
+    for movie_id, release_year, review_count, rating_sum in movies:
+        if review_count < config['MIN_VOTES']:
+            continue
+        score = (rating_sum + prior_votes * prior_mean) / (review_count + prior_votes)
+        boards = [(LeaderboardEntry.SCOPE_ALL, 0), (LeaderboardEntry.SCOPE_DECADE, decade_of(release_year))]
+        boards += [(LeaderboardEntry.SCOPE_GENRE, genre_id) for genre_id in genre_ids.get(movie_id, ())]
+        entries += [
+            LeaderboardEntry(scope=scope, scope_key=key, movie_id=movie_id, score=score)
+            for scope, key in boards
+        ]
+    return entries
+
+
+def refresh_movies(movie_ids):
+    """Rewrite the leaderboard entries of the given movies from their current aggregates"""
+    movie_ids = list(movie_ids)
+    config = get_leaderboard_settings()
+    with transaction.atomic(savepoint=False):
+        # One row per (movie, genre), or a single row with a NULL genre for movies without genres. The
+        # movie rows stay locked, so a refresh after another commit cannot write over newer aggregates.
+        rows = Movie.objects.filter(pk__in=movie_ids, review_count__gte=config['MIN_VOTES']).select_for_update(
+            of=('self',)
+        ).values_list('id', 'release_year', 'review_count', 'review_rating_sum', 'genres__id').order_by()
+        movies, genre_ids = {}, {}
+        for movie_id, release_year, review_count, rating_sum, genre_id in rows:
+            movies[movie_id] = (movie_id, release_year, review_count, rating_sum)
+            if genre_id is not None:
+                genre_ids.setdefault(movie_id, []).append(genre_id)
+
+        LeaderboardEntry.objects.filter(movie_id__in=movie_ids).delete()
+        if movies:
+            LeaderboardEntry.objects.bulk_create(
+                build_entries(movies.values(), genre_ids, config, get_prior_mean())
+            )
+
+
+def refresh_on_commit(movie_ids):
+    """
+    Refresh the given movies once the current transaction commits, outside
+    it, from the committed aggregates
+    """
+    movie_ids = set(movie_ids)
+    if movie_ids:
+        transaction.on_commit(lambda: refresh_movies(movie_ids))
+
+
+def rebuild():
+    """Recompute the prior mean and every board in one INSERT ... SELECT; returns the number of entries written"""
+    config = get_leaderboard_settings()
+    prior_mean = config['PRIOR_MEAN']
+    if prior_mean is None:
+        prior_mean = compute_prior_mean()
+    prior_votes = float(config['PRIOR_VOTES'])
+
+    qn = connection.ops.quote_name
+    score = f'(m.{qn("review_rating_sum")} + %s) / (m.{qn("review_count")} + %s)'
+    qualifies = f'm.{qn("review_count")} >= %s'
+    score_params = [prior_votes * prior_mean, prior_votes, config['MIN_VOTES']]
+    movies = qn(Movie._meta.db_table)
+    links = qn(Movie.genres.through._meta.db_table)
+    sql = f"""
+        INSERT INTO {qn(LeaderboardEntry._meta.db_table)} ({qn('scope')}, {qn('scope_key')}, {qn('movie_id')}, {qn('score')})
+        SELECT %s, 0, m.{qn('id')}, {score} FROM {movies} m WHERE {qualifies}
+        UNION ALL
+        SELECT %s, (m.{qn('release_year')} / 10) * 10, m.{qn('id')}, {score} FROM {movies} m WHERE {qualifies}
+        UNION ALL
+        SELECT %s, g.{qn('genre_id')}, m.{qn('id')}, {score}
+        FROM {movies} m INNER JOIN {links} g ON g.{qn('movie_id')} = m.{qn('id')} WHERE {qualifies}
+    """
+    params = (
+        [LeaderboardEntry.SCOPE_ALL] + score_params
+        + [LeaderboardEntry.SCOPE_DECADE] + score_params
+        + [LeaderboardEntry.SCOPE_GENRE] + score_params
+    )
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            written = cursor.rowcount
+        LeaderboardPrior.objects.update_or_create(pk=PRIOR_PK, defaults={'mean': prior_mean})
+    return written
+
+
+def top_movies(scope=LeaderboardEntry.SCOPE_ALL, scope_key=0, limit=10,
+               select_related=('director',), prefetch_related=('genres',)):
+    """
+    The best `limit` movies of a board with the given movie relations loaded,
+    each carrying its `leaderboard_score`
+    """
+    related = ['movie', *[f'movie__{relation}' for relation in select_related]]
+    entries = (
+        LeaderboardEntry.objects.filter(scope=scope, scope_key=scope_key)
+        .order_by('-score', 'movie_id')
+        .select_related(*related)
+        .defer(*related_search_vectors(LeaderboardEntry, related))
+        .prefetch_related(*[f'movie__{relation}' for relation in prefetch_related])[:limit]
+    )
+    movies = []
+    for entry in entries:
+        entry.movie.leaderboard_score = entry.score
+        movies.append(entry.movie)
+    return movies
@@ -0,0 +1,25 @@
+from django.db.models import CharField, TextField
+from django.db.models.lookups import IContains
+
+
+class TrigramIContains(IContains):
+    """
+    Case-insensitive substring lookup that PostgreSQL can answer from a pg_trgm GIN index.
+
+    The built-in icontains compiles to UPPER("col"::text) LIKE UPPER(%s), which
+    no plain trigram index matches. On PostgreSQL this lookup emits
+    "col" ILIKE %s instead; other backends fall back to the icontains SQL.
+    """
+    lookup_name = 'trgm_icontains'
+
+    def as_sql(self, compiler, connection):
+        return IContains(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs_sql} ILIKE {rhs_sql}', (*lhs_params, *rhs_params)
+
+
+CharField.register_lookup(TrigramIContains)
+TextField.register_lookup(TrigramIContains)
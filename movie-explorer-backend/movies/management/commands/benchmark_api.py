@@ -0,0 +1,304 @@
+import json
+import math
+import statistics
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.db.backends.utils import CursorWrapper
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from movies.models import Actor, Director, Genre, Movie, Review
+from movies.synthetic import generate_catalog
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+@contextmanager
+def count_fetched_rows():
+    """Count the rows every database cursor returns while the block runs"""
+    counter = {'rows': 0}
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        counter['rows'] += row is not None
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        counter['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        counter['rows'] += len(rows)
+        return rows
+
+    # CursorWrapper delegates fetch* to the driver cursor through __getattr__
+    with patch.multiple(CursorWrapper, create=True, fetchone=fetchone, fetchmany=fetchmany, fetchall=fetchall):
+        yield counter
+
+
+def percentile(timings, p):
+    """Nearest-rank percentile of sorted `timings`"""
+    return timings[max(0, math.ceil(len(timings) * p / 100) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic synthetic catalog and measure latency, queries, rows fetched '
+        'and peak memory of every API endpoint through the Django test client'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10000, help='Movies to generate (default 10000)')
+        parser.add_argument('--actors-per-movie', type=int, default=5, help='Cast links per movie (default 5)')
+        parser.add_argument('--genres', type=int, default=20, help='Genres to generate (default 20)')
+        parser.add_argument('--reviews-per-movie', type=int, default=3, help='Reviews per movie (default 3)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=30, help='Timed requests per case (default 30)')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per case first (default 3)')
+        parser.add_argument('--only', help='Run only the cases whose name contains this text')
+        parser.add_argument('--cache', action='store_true',
+                            help='Leave the response cache on (cases then mostly measure cache hits)')
+        parser.add_argument('--regenerate', action='store_true',
+                            help='Delete the existing catalog and generate a new one')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+        parser.add_argument('--compare', help='Print the p50 change against the results in this JSON file')
+
+    def handle(self, *args, **options):
+        if options['regenerate']:
+            for model in (Review, Movie, Actor, Director, Genre):
+                model.objects.all().delete()
+
+        if not Movie.objects.exists():
+            self.stdout.write(f'Generating {options["movies"]} movies...')
+            start = time.perf_counter()
+            counts = generate_catalog(
+                movies=options['movies'],
+                genres=options['genres'],
+                actors_per_movie=options['actors_per_movie'],
+                reviews_per_movie=options['reviews_per_movie'],
+                seed=options['seed'],
+                progress=self.report_progress,
+            )
+            self.stdout.write(f'Generated {counts} in {time.perf_counter() - start:.1f}s')
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = {row['case']: row for row in json.load(f)['results']}
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f'Cannot read {options["compare"]}: {exc}')
+
+        cases = self.build_cases()
+        if options['only']:
+            cases = [case for case in cases if options['only'] in case[0]]
+
+        response_cache = {**getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': options['cache']}
+        results = []
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], RESPONSE_CACHE=response_cache):
+            client = Client()
+            for name, method, url, body in cases:
+                row = self.run_case(client, method, url, body, options['warmup'], options['repeat'])
+                row = {'case': name, 'method': method, 'url': url, **row}
+                results.append(row)
+                line = (
+                    f'{name:<34} {row["status"]:>3}  p50 {row["p50_ms"]:>8.2f}  p95 {row["p95_ms"]:>8.2f}  '
+                    f'p99 {row["p99_ms"]:>8.2f} ms  {row["queries"]:>3} queries  {row["rows"]:>6} rows  '
+                    f'{row["peak_kb"]:>8.1f} KB'
+                )
+                old = baseline and baseline.get(name)
+                if old:
+                    line += f'  p50 {(row["p50_ms"] / max(old["p50_ms"], 1e-6) - 1) * 100:+.0f}%'
+                self.stdout.write(line)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({
+                    'vendor': connection.vendor,
+                    'commit': git_commit(),
+                    'django': django.get_version(),
+                    'response_cache': options['cache'],
+                    'repeat': options['repeat'],
+                    'catalog': {model.__name__.lower(): model.objects.count()
+                                for model in (Movie, Actor, Director, Genre, Review)},
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def build_cases(self):
+        """(name, method, url, JSON body) for every route in movies/urls.py, with ids from the catalog"""
+        movie = Movie.objects.order_by('-review_count', 'pk').select_related('director').first()
+        if movie is None:
+            raise CommandError('The catalog is empty')
+        genre = movie.genres.order_by('pk').first() or Genre.objects.order_by('pk').first()
+        actor = movie.actors.order_by('pk').first() or Actor.objects.order_by('pk').first()
+        director = movie.director
+        review = Review.objects.filter(movie=movie).order_by('pk').first()
+        movie_ids = ','.join(str(pk) for pk in Movie.objects.order_by('-pk').values_list('pk', flat=True)[:50])
+        actor_ids = ','.join(str(pk) for pk in Actor.objects.order_by('-pk').values_list('pk', flat=True)[:50])
+        director_ids = ','.join(str(pk) for pk in Director.objects.order_by('-pk').values_list('pk', flat=True)[:50])
+        title_word = movie.title.split()[0].lower()
+        surname = director.name.split()[1].lower()
+        middle_page = max(1, Movie.objects.count() // 40)
+
+        movies = reverse('movie-list')
+        cases = [
+            ('movies list', 'GET', movies, None),
+            ('movies list middle page', 'GET', f'{movies}?page={middle_page}', None),
+            ('movies list page_size 100', 'GET', f'{movies}?page_size=100', None),
+            ('movies genre by rating', 'GET', f'{movies}?genre_id={genre.pk}&ordering=-rating', None),
+            ('movies years and rating', 'GET',
+             f'{movies}?release_year_gte=1990&release_year_lte=2010&rating_gte=7', None),
+            ('movies title search', 'GET', f'{movies}?title={title_word}', None),
+            ('movies actor', 'GET', f'{movies}?actor_id={actor.pk}', None),
+            ('movies director name', 'GET', f'{movies}?director={surname}', None),
+            ('movies keyset', 'GET', f'{movies}?cursor=&ordering=-rating', None),
+            ('movies sparse fields', 'GET', f'{movies}?fields=id,title,poster_url', None),
+            ('movies include actors', 'GET', f'{movies}?include=actors,plot', None),
+            ('movie detail', 'GET', reverse('movie-detail', args=[movie.pk]), None),
+            ('movie reviews', 'GET', reverse('movie-reviews', args=[movie.pk]), None),
+            ('movie similar', 'GET', reverse('movie-similar', args=[movie.pk]), None),
+            ('movies by_genre', 'GET', f'{reverse("movie-by-genre")}?name={genre.name}', None),
+            ('movies by_director', 'GET', f'{reverse("movie-by-director")}?name={director.name}', None),
+            ('movies facets', 'GET', reverse('movie-facets'), None),
+            ('movies facets genre and years', 'GET',
+             f'{reverse("movie-facets")}?genre_id={genre.pk}&release_year_gte=1990', None),
+            ('movies top_rated', 'GET', reverse('movie-top-rated'), None),
+            ('movies top_rated genre', 'GET', f'{reverse("movie-top-rated")}?genre_id={genre.pk}', None),
+            ('movies top_rated decade', 'GET', f'{reverse("movie-top-rated")}?decade=1990', None),
+            ('movies batch 50', 'GET', f'{reverse("movie-batch")}?ids={movie_ids}', None),
+            ('movies export genre', 'GET', f'{reverse("movie-export")}?genre_id={genre.pk}', None),
+            ('actors list', 'GET', reverse('actor-list'), None),
+            ('actors genre', 'GET', f'{reverse("actor-list")}?genre_id={genre.pk}', None),
+            ('actors name search', 'GET', f'{reverse("actor-list")}?name={actor.name.split()[0].lower()}', None),
+            ('actor detail', 'GET', reverse('actor-detail', args=[actor.pk]), None),
+            ('actors batch 50', 'GET', f'{reverse("actor-batch")}?ids={actor_ids}', None),
+            ('actors export', 'GET', reverse('actor-export'), None),
+            ('directors list', 'GET', reverse('director-list'), None),
+            ('director detail', 'GET', reverse('director-detail', args=[director.pk]), None),
+            ('directors batch 50', 'GET', f'{reverse("director-batch")}?ids={director_ids}', None),
+            ('directors export', 'GET', reverse('director-export'), None),
+            ('genres list', 'GET', reverse('genre-list'), None),
+            ('genre detail', 'GET', reverse('genre-detail', args=[genre.pk]), None),
+            ('reviews list', 'GET', reverse('review-list'), None),
+            ('reviews high ratings', 'GET', f'{reverse("review-list")}?rating_gte=8&ordering=-created_at', None),
+            ('reviews featured', 'GET', reverse('review-featured'), None),
+            ('reviews export movie', 'GET', f'{reverse("review-export")}?movie_id={movie.pk}', None),
+            ('search', 'GET', f'{reverse("search")}?q={title_word}', None),
+            ('search movies', 'GET', f'{reverse("search")}?q={surname}&types=movie,director', None),
+            ('autocomplete', 'GET', f'{reverse("autocomplete")}?q={title_word[:3]}', None),
+            ('async movies list', 'GET', reverse('async-movie-list'), None),
+            ('async movies genre by rating', 'GET',
+             f'{reverse("async-movie-list")}?genre_id={genre.pk}&ordering=-rating', None),
+            ('async movie detail', 'GET', reverse('async-movie-detail', args=[movie.pk]), None),
+            ('async actor detail', 'GET', reverse('async-actor-detail', args=[actor.pk]), None),
+            ('async director detail', 'GET', reverse('async-director-detail', args=[director.pk]), None),
+            ('async genres list', 'GET', reverse('async-genre-list'), None),
+            ('async movies top_rated', 'GET', reverse('async-movie-top-rated'), None),
+        ]
+        if review is not None:
+            cases.append(('review detail', 'GET', reverse('review-detail', args=[review.pk]), None))
+            cases.append(('reviewer recommendations', 'GET',
+                          reverse('reviewer-recommendations', args=[review.reviewer_name]), None))
+
+        new_movie = {
+            'title': 'Benchmark Movie', 'release_year': 2001, 'duration': 120, 'plot': 'Benchmark plot',
+            'rating': '7.5', 'director_id': director.pk, 'genre_ids': [genre.pk], 'actor_ids': [actor.pk],
+        }
+        cases += [
+            ('movie create', 'POST', movies, new_movie),
+            ('movie update', 'PUT', reverse('movie-detail', args=[movie.pk]), {
+                **new_movie, 'title': movie.title, 'release_year': movie.release_year,
+            }),
+            ('movie partial update', 'PATCH', reverse('movie-detail', args=[movie.pk]), {'rating': '8.1'}),
+            ('movie delete', 'DELETE', reverse('movie-detail', args=[movie.pk]), None),
+            ('review create', 'POST', reverse('review-list'), {
+                'movie': movie.pk, 'reviewer_name': 'Benchmark', 'rating': 8, 'comment': 'Benchmark review',
+            }),
+            ('movies bulk create 100', 'POST', reverse('movie-bulk'), [
+                {**new_movie, 'title': f'Benchmark Movie {i}'} for i in range(100)
+            ]),
+            ('reviews bulk upsert 100', 'PUT', reverse('review-bulk'), [
+                {'movie_id': movie.pk, 'reviewer_name': f'Benchmark {i}', 'rating': i % 10 + 1, 'comment': 'Bulk'}
+                for i in range(100)
+            ]),
+        ]
+        return cases
+
+    def run_case(self, client, method, url, body, warmup, repeat):
+        """
+        Latency percentiles over `repeat` requests, plus the queries, rows and
+        peak Python memory of one profiled request after the warmup. Writes
+        are rolled back after every request, so each one sees the same catalog.
+        """
+        cache.clear()
+        for _ in range(warmup):
+            self.request(client, method, url, body)
+
+        # Every request clears the query log that `queries` slices, so start from
+        # an empty log and count before the next request
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries, count_fetched_rows() as fetched:
+            tracemalloc.start()
+            try:
+                response_status, size = self.request(client, method, url, body)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        query_count = len(queries)
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self.request(client, method, url, body)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            'status': response_status,
+            'bytes': size,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': query_count,
+            'rows': fetched['rows'],
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    @staticmethod
+    def request(client, method, url, body):
+        """Send one request and read the whole body; returns the status and body size"""
+        kwargs = {'data': body, 'content_type': 'application/json'} if body is not None else {}
+        if method in WRITE_METHODS:
+            with transaction.atomic():
+                response = getattr(client, method.lower())(url, **kwargs)
+                transaction.set_rollback(True)
+        else:
+            response = getattr(client, method.lower())(url, **kwargs)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, len(content)
+
+    def report_progress(self, stage, done, total):
+        if stage == 'movies':
+            self.stdout.write(f'  {stage}: {done}/{total}')
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from movies.models import Genre, Movie
+from movies.synthetic import generate_catalog
+
+from .benchmark_api import git_commit, percentile
+
+# How each route is served: the WSGI handler on a thread pool, or the ASGI handler on one event loop
+MODES = ('wsgi', 'asgi-sync', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of the async read routes under the ASGI handler with the DRF routes under '
+        'the WSGI handler, with many requests in flight at once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10000, help='Movies to generate if the catalog is empty')
+        parser.add_argument('--concurrency', default='1,8,32',
+                            help='Comma-separated numbers of requests in flight (default 1,8,32)')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per case and level')
+        parser.add_argument('--only', help='Run only the cases whose name contains this text')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency takes comma-separated integers')
+        if not Movie.objects.exists():
+            self.stdout.write(f'Generating {options["movies"]} movies...')
+            generate_catalog(movies=options['movies'])
+
+        cases = self.build_cases()
+        if options['only']:
+            cases = [case for case in cases if options['only'] in case[0]]
+
+        response_cache = {**getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': False}
+        results = []
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], RESPONSE_CACHE=response_cache):
+            wsgi, asgi = WSGIHandler(), ASGIHandler()
+            for name, sync_url, async_url in cases:
+                for level in levels:
+                    for mode in MODES:
+                        url = async_url if mode == 'asgi' else sync_url
+                        if mode == 'wsgi':
+                            row = self.run_wsgi(wsgi, url, level, options['requests'])
+                        else:
+                            row = asyncio.run(self.run_asgi(asgi, url, level, options['requests']))
+                        row = {'case': name, 'mode': mode, 'url': url, 'concurrency': level, **row}
+                        results.append(row)
+                        self.stdout.write(
+                            f'{name:<24} {mode:<9} c={level:<3} {row["status"]:>3}  {row["rps"]:>8.1f} req/s  '
+                            f'p50 {row["p50_ms"]:>8.2f}  p95 {row["p95_ms"]:>8.2f} ms'
+                        )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({
+                    'vendor': connection.vendor,
+                    'commit': git_commit(),
+                    'django': django.get_version(),
+                    'requests': options['requests'],
+                    'catalog': {'movie': Movie.objects.count()},
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def build_cases(self):
+        """(name, DRF route, async route) of every async read endpoint, with ids from the catalog"""
+        movie = Movie.objects.order_by('-review_count', 'pk').select_related('director').first()
+        actor = movie.actors.order_by('pk').first()
+        genre = movie.genres.order_by('pk').first() or Genre.objects.order_by('pk').first()
+        cases = [
+            ('movies list', reverse('movie-list'), reverse('async-movie-list')),
+            ('movies genre by rating', f'{reverse("movie-list")}?genre_id={genre.pk}&ordering=-rating',
+             f'{reverse("async-movie-list")}?genre_id={genre.pk}&ordering=-rating'),
+            ('movie detail', reverse('movie-detail', args=[movie.pk]), reverse('async-movie-detail', args=[movie.pk])),
+            ('director detail', reverse('director-detail', args=[movie.director_id]),
+             reverse('async-director-detail', args=[movie.director_id])),
+            ('genres list', reverse('genre-list'), reverse('async-genre-list')),
+            ('movies top_rated', reverse('movie-top-rated'), reverse('async-movie-top-rated')),
+        ]
+        if actor is not None:
+            cases.insert(3, ('actor detail', reverse('actor-detail', args=[actor.pk]),
+                             reverse('async-actor-detail', args=[actor.pk])))
+        return cases
+
+    @staticmethod
+    def summarize(timings, elapsed, statuses):
+        timings.sort()
+        return {
+            'status': max(statuses),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+        }
+
+    def run_wsgi(self, handler, url, concurrency, requests):
+        """`requests` requests through the WSGI handler from `concurrency` threads, like a threaded worker"""
+        path, _, query = url.partition('?')
+        remaining = iter(range(requests))
+        lock = threading.Lock()
+        timings, statuses = [], set()
+
+        def start_response(status, headers, exc_info=None):
+            statuses.add(int(status.split()[0]))
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'testserver',
+                           'HTTP_HOST': 'testserver'}
+                setup_testing_defaults(environ)
+                start = time.perf_counter()
+                response = handler(environ, start_response)
+                b''.join(response)
+                # Closing the response sends request_finished, which closes the thread's connection
+                response.close()
+                timings.append((time.perf_counter() - start) * 1000)
+
+        cache.clear()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            for future in [executor.submit(worker) for _ in range(concurrency)]:
+                future.result()
+        return self.summarize(timings, time.perf_counter() - start, statuses)
+
+    async def run_asgi(self, handler, url, concurrency, requests):
+        """`requests` requests through the ASGI handler from `concurrency` tasks on one event loop"""
+        parts = urlsplit(url)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': parts.path, 'raw_path': parts.path.encode(), 'query_string': parts.query.encode(),
+            'root_path': '', 'headers': [(b'host', b'testserver')], 'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0),
+        }
+        remaining = iter(range(requests))
+        timings, statuses = [], set()
+
+        async def request():
+            sent = False
+
+            async def receive():
+                nonlocal sent
+                if not sent:
+                    sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.add(message['status'])
+
+            await handler(dict(scope), receive, send)
+
+        async def worker():
+            while next(remaining, None) is not None:
+                start = time.perf_counter()
+                await request()
+                timings.append((time.perf_counter() - start) * 1000)
+
+        cache.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return self.summarize(timings, time.perf_counter() - start, statuses)
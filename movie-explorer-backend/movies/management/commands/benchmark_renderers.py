@@ -0,0 +1,101 @@
+import json
+import statistics
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from movies.models import Actor, Director, Genre, Movie, Review
+from movies.renderers import FastJSONParser, FastJSONRenderer, orjson
+from movies.serializers import MovieDetailSerializer, MovieListSerializer, ReviewSerializer
+from movies.synthetic import generate_catalog
+from movies.views import movie_detail_queryset, movie_list_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSON renderer and parser with the orjson-backed ones on "
+        'API-shaped payloads from a synthetic catalog'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10000, help='Movies to generate (default 10000)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--page-size', type=int, default=100, help='Items per rendered page (default 100)')
+        parser.add_argument('--repeat', type=int, default=50, help='Timed runs per payload (default 50)')
+        parser.add_argument('--regenerate', action='store_true',
+                            help='Delete the existing catalog and generate a new one')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        if options['regenerate']:
+            for model in (Review, Movie, Actor, Director, Genre):
+                model.objects.all().delete()
+
+        if not Movie.objects.exists():
+            self.stdout.write(f'Generating {options["movies"]} movies...')
+            start = time.perf_counter()
+            counts = generate_catalog(movies=options['movies'], seed=options['seed'])
+            self.stdout.write(f'Generated {counts} in {time.perf_counter() - start:.1f}s')
+
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson is not installed, so both sides use the stdlib encoder; pip install orjson'
+            ))
+
+        size, repeat = options['page_size'], options['repeat']
+        list_fields = MovieListSerializer().fields
+        detail_fields = MovieDetailSerializer().fields
+        payloads = [
+            ('movie list page', self.page(MovieListSerializer(
+                movie_list_queryset(list_fields)[:size], many=True).data)),
+            ('movie detail batch', {'results': MovieDetailSerializer(
+                movie_detail_queryset(detail_fields, many=True)[:size // 5], many=True).data, 'missing': []}),
+            ('review page', self.page(ReviewSerializer(Review.objects.all()[:size], many=True).data)),
+        ]
+
+        results = []
+        for label, data in payloads:
+            row = {'payload': label}
+            body = JSONRenderer().render(data)
+            row['bytes'] = len(body)
+            for side, renderer, parser in (('drf', JSONRenderer(), JSONParser()),
+                                           ('fast', FastJSONRenderer(), FastJSONParser())):
+                row[f'{side}_render'] = self.time(lambda: renderer.render(data), repeat)
+                row[f'{side}_parse'] = self.time(lambda: parser.parse(BytesIO(body)), repeat)
+            for step in ('render', 'parse'):
+                row[f'{step}_speedup'] = round(
+                    row[f'drf_{step}']['p50_ms'] / max(row[f'fast_{step}']['p50_ms'], 1e-6), 1
+                )
+            results.append(row)
+            self.stdout.write(
+                f'{label:<20} {row["bytes"]:>8} B   '
+                f'render p50 {row["drf_render"]["p50_ms"]:>7.3f} -> {row["fast_render"]["p50_ms"]:>7.3f} ms '
+                f'x{row["render_speedup"]:<6} '
+                f'parse p50 {row["drf_parse"]["p50_ms"]:>7.3f} -> {row["fast_parse"]["p50_ms"]:>7.3f} ms '
+                f'x{row["parse_speedup"]}'
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'orjson': orjson is not None, 'page_size': size, 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    @staticmethod
+    def page(items):
+        return {'count': len(items), 'next': None, 'previous': None, 'results': items}
+
+    @staticmethod
+    def time(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        }
@@ -0,0 +1,102 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from movies.models import Actor, Director, Genre, Movie, Review
+from movies.synthetic import generate_catalog
+
+# (label, model, lookup path, search term) for every text filter in movies/filters.py
+CASES = [
+    ('movies?title=', Movie, 'title', 'river'),
+    ('movies?director=', Movie, 'director__name', 'moreau'),
+    ('movies?actor=', Movie, 'actors__name', 'tanaka'),
+    ('movies?genre=', Movie, 'genres__name', 'thrill'),
+    ('actors?name=', Actor, 'name', 'rosa'),
+    ('actors?nationality=', Actor, 'nationality', 'japan'),
+    ('directors?name=', Director, 'name', 'okafor'),
+    ('genres?name=', Genre, 'name', 'myst'),
+    ('reviews?reviewer_name=', Review, 'reviewer_name', 'reviewer12'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare latency of the old icontains lookups with the trigram-indexable '
+        'trgm_icontains lookups on a synthetic catalog'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10000, help='Movies to generate (default 10000)')
+        parser.add_argument('--actors-per-movie', type=int, default=5, help='Cast links per movie (default 5)')
+        parser.add_argument('--reviews-per-movie', type=int, default=2, help='Reviews per movie (default 2)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query (default 20)')
+        parser.add_argument('--regenerate', action='store_true',
+                            help='Delete the existing catalog and generate a new one')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        if options['regenerate']:
+            for model in (Review, Movie, Actor, Director, Genre):
+                model.objects.all().delete()
+
+        if not Movie.objects.exists():
+            self.stdout.write(f'Generating {options["movies"]} movies...')
+            start = time.perf_counter()
+            counts = generate_catalog(
+                movies=options['movies'],
+                actors_per_movie=options['actors_per_movie'],
+                reviews_per_movie=options['reviews_per_movie'],
+                seed=options['seed'],
+                progress=self.report_progress,
+            )
+            self.stdout.write(f'Generated {counts} in {time.perf_counter() - start:.1f}s')
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                f'{connection.vendor} compiles both lookups to the same SQL; '
+                'run against PostgreSQL to measure the trigram indexes'
+            ))
+
+        results = []
+        for label, model, path, term in CASES:
+            row = {'filter': label, 'term': term}
+            for lookup in ('icontains', 'trgm_icontains'):
+                queryset = model.objects.filter(**{f'{path}__{lookup}': term})
+                if '__' in path:
+                    queryset = queryset.distinct()
+                row[lookup] = self.time_queryset(queryset, options['repeat'])
+            row['speedup'] = round(row['icontains']['p50_ms'] / max(row['trgm_icontains']['p50_ms'], 1e-6), 1)
+            results.append(row)
+            self.stdout.write(
+                f'{label:<26} icontains p50 {row["icontains"]["p50_ms"]:>9.2f} ms   '
+                f'trgm_icontains p50 {row["trgm_icontains"]["p50_ms"]:>9.2f} ms   '
+                f'x{row["speedup"]}'
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'vendor': connection.vendor, 'movies': Movie.objects.count(), 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def time_queryset(self, queryset, repeat):
+        """Time what a list endpoint runs: the total count plus the first page of ids"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            matches = queryset.count()
+            list(queryset.order_by('pk').values_list('pk', flat=True)[:20])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            'matches': matches,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        }
+
+    def report_progress(self, stage, done, total):
+        if stage == 'movies':
+            self.stdout.write(f'  {stage}: {done}/{total}')
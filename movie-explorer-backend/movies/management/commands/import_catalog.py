@@ -0,0 +1,58 @@
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.catalog_import import CatalogImporter, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream movies (with their director, genres, actors and reviews) from CSV or JSONL files '
+        'into the catalog in batches, using COPY on PostgreSQL'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='CSV or JSONL files, one movie per row/line')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format (default: from the extension)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Movies per transaction (default 5000)')
+        parser.add_argument('--method', choices=['auto', 'copy', 'bulk'], default='auto',
+                            help='copy: PostgreSQL COPY; bulk: bulk_create upserts (default: copy on PostgreSQL)')
+
+    def handle(self, *args, **options):
+        try:
+            importer = CatalogImporter(
+                batch_size=options['batch_size'],
+                method=options['method'],
+                progress=self.report_progress,
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(f'Importing with {importer.method} loading, {options["batch_size"]} movies per batch')
+        start = time.perf_counter()
+        records = itertools.chain.from_iterable(read_records(path, options['format']) for path in options['paths'])
+        try:
+            importer.run(records)
+        except OSError as exc:
+            raise CommandError(exc)
+
+        for location, error in importer.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'  skipped {location}: {error}'))
+        if len(importer.errors) > 20:
+            self.stdout.write(self.style.WARNING(f'  ... and {len(importer.errors) - 20} more'))
+
+        elapsed = time.perf_counter() - start
+        stats = importer.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats["movies"]} movies, {stats["reviews"]} reviews, {stats["cast_links"]} cast links '
+            f'and {stats["genre_links"]} genre links ({stats["new_directors"]} new directors, '
+            f'{stats["new_actors"]} new actors, {stats["new_genres"]} new genres; {stats["skipped"]} skipped) '
+            f'in {elapsed:.1f}s ({stats["movies"] / max(elapsed, 1e-9):,.0f} movies/s)'
+        ))
+
+    def report_progress(self, stats, elapsed):
+        self.stdout.write(
+            f'  {stats["movies"]:>10,} movies  {stats["reviews"]:>10,} reviews  '
+            f'{elapsed:7.1f}s  {stats["movies"] / max(elapsed, 1e-9):>8,.0f} movies/s'
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from movies import leaderboard
+from movies.models import Movie
+from movies.versions import bump_versions
+
+
+class Command(BaseCommand):
+    help = 'Recompute the prior mean and every top-rated leaderboard from the stored review aggregates'
+
+    def handle(self, *args, **options):
+        written = leaderboard.rebuild()
+        bump_versions(Movie)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} leaderboard entries'))
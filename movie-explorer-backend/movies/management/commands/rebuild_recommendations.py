@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from movies import recommendations
+from movies.models import RatingNeighbor
+from movies.versions import bump_versions
+
+
+class Command(BaseCommand):
+    help = "Recompute every movie's rating neighbours, used for reviewer recommendations, from the reviews"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = recommendations.rebuild()
+        bump_versions(RatingNeighbor)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} rating neighbour entries in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from movies import leaderboard
+from movies.models import Movie
+from movies.versions import bump_versions
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the denormalized review count/sum/average columns on Movie from the Review table, '
+        'then the leaderboard entries that depend on them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--movie-id',
+            type=int,
+            action='append',
+            dest='movie_ids',
+            help='Only rebuild the given movie (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        movies = Movie.objects.all()
+        if options['movie_ids']:
+            movies = movies.filter(pk__in=options['movie_ids'])
+
+        updated = movies.rebuild_review_aggregates()
+        if options['movie_ids']:
+            leaderboard.refresh_movies(options['movie_ids'])
+        else:
+            leaderboard.rebuild()
+        bump_versions(Movie)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt review aggregates for {updated} movies'))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from movies import similarity
+from movies.models import Movie
+from movies.versions import bump_versions
+
+
+class Command(BaseCommand):
+    help = 'Recompute the similar movies of every movie from their actors, genres, director and decade'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = similarity.rebuild()
+        bump_versions(Movie)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} similar movie entries in {time.perf_counter() - start:.1f}s'
+        ))
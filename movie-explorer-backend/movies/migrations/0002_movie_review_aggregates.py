@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:20
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def backfill_review_aggregates(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Review = apps.get_model('movies', 'Review')
+
+    reviews = Review.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    count = Subquery(reviews.annotate(c=Count('pk')).values('c'))
+    total = Subquery(reviews.annotate(s=Sum('rating')).values('s'))
+    Movie.objects.update(
+        review_count=Coalesce(count, 0),
+        review_rating_sum=Coalesce(total, 0),
+        avg_review_rating=Round(Cast(total, FloatField()) / Cast(count, FloatField()), 1),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='avg_review_rating',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='review_rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_review_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_movie_review_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actor',
+            index=models.Index(fields=['name', 'id'], name='actor_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='director',
+            index=models.Index(fields=['name', 'id'], name='director_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['release_year', 'id'], name='movie_release_year_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title', 'id'], name='movie_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['rating', 'id'], name='movie_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['created_at', 'id'], name='movie_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at', 'id'], name='review_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['rating', 'id'], name='review_rating_id_idx'),
+        ),
+    ]
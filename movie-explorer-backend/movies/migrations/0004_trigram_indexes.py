@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# (index name, table, column) for every column behind a trgm_icontains filter
+TRIGRAM_INDEXES = [
+    ('movie_title_trgm_idx', 'movies_movie', 'title'),
+    ('director_name_trgm_idx', 'movies_director', 'name'),
+    ('director_nationality_trgm_idx', 'movies_director', 'nationality'),
+    ('actor_name_trgm_idx', 'movies_actor', 'name'),
+    ('actor_nationality_trgm_idx', 'movies_actor', 'nationality'),
+    ('genre_name_trgm_idx', 'movies_genre', 'name'),
+    ('review_reviewer_name_trgm_idx', 'movies_review', 'reviewer_name'),
+]
+
+
+def pg_trgm_available(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Other backends (SQLite in tests) and servers without the contrib
+    # extension keep working through the plain icontains/ILIKE scan
+    if schema_editor.connection.vendor != 'postgresql' or not pg_trgm_available(schema_editor):
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:29
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# table -> [(column, weight)] indexed into each table's search_vector
+SEARCH_DOCUMENTS = {
+    'movies_movie': [('title', 'A'), ('plot', 'B')],
+    'movies_actor': [('name', 'A'), ('biography', 'B')],
+    'movies_director': [('name', 'A'), ('biography', 'B')],
+    'movies_review': [('comment', 'B')],
+}
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, columns in SEARCH_DOCUMENTS.items():
+        document = ' || '.join(
+            f"setweight(to_tsvector('pg_catalog.english', coalesce(NEW.{column}, '')), '{weight}')"
+            for column, weight in columns
+        )
+        watched = ', '.join([column for column, weight in columns] + ['search_vector'])
+        schema_editor.execute(f"""
+            CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {document};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        schema_editor.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF {watched} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()
+        """)
+        # Touching search_vector fires the trigger, backfilling existing rows
+        schema_editor.execute(f'UPDATE {table} SET search_vector = NULL')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_search_vector_idx ON {table} USING gin (search_vector)'
+        )
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_DOCUMENTS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_vector_idx')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}')
+        schema_editor.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='director',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
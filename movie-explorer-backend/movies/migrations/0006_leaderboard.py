@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_full_text_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('all', 'All movies'), ('genre', 'Genre'), ('decade', 'Decade')], max_length=10)),
+                ('scope_key', models.IntegerField(default=0)),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['scope', 'scope_key', '-score', 'movie_id'],
+                'indexes': [models.Index(fields=['scope', 'scope_key', '-score', 'movie'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'scope_key', 'movie'), name='leaderboard_entry_unique')],
+            },
+        ),
+    ]
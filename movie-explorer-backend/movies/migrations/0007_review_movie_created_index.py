@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['movie', 'created_at', 'id'], name='review_movie_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_review_movie_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='movies.movie')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.movie')),
+            ],
+            options={
+                'ordering': ['movie_id', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('movie', 'rank'), name='similar_movie_rank_unique')],
+            },
+        ),
+    ]
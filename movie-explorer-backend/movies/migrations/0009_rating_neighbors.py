@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_similar_movies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'ordering': ['movie_id', 'rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewer_name', '-created_at'], name='review_reviewer_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='ratingneighbor',
+            name='movie',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rating_neighbors', to='movies.movie'),
+        ),
+        migrations.AddField(
+            model_name='ratingneighbor',
+            name='neighbor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movies.movie'),
+        ),
+        migrations.AddConstraint(
+            model_name='ratingneighbor',
+            constraint=models.UniqueConstraint(fields=('movie', 'rank'), name='rating_neighbor_rank_unique'),
+        ),
+    ]
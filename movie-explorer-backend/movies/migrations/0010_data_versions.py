@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:17
+
+import time
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    # Start every model at one version so reads do not have to create the rows
+    DataVersion = apps.get_model('movies', 'DataVersion')
+    now = time.time_ns()
+    DataVersion.objects.bulk_create([
+        DataVersion(model=model._meta.label_lower, version=now)
+        for model in apps.get_app_config('movies').get_models()
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_rating_neighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('model', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_data_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField()),
+            ],
+        ),
+    ]
@@ -1,4 +1,8 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Prefetch, Subquery, Sum, Value, When
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Cast, Coalesce, Round
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -13,6 +17,75 @@ class BaseModel(models.Model):
         abstract = True
 
 
+SEARCH_VECTOR_FIELD = 'search_vector'
+
+
+def has_search_vector(model):
+    return any(field.name == SEARCH_VECTOR_FIELD for field in model._meta.concrete_fields)
+
+
+def related_search_vectors(model, lookups):
+    """The search_vector lookups of the models joined by select_related(*lookups) from `model`"""
+    deferred = []
+    for lookup in lookups:
+        if lookup is None:
+            continue
+        related, path = model, []
+        for name in lookup.split(LOOKUP_SEP):
+            related = related._meta.get_field(name).related_model
+            path.append(name)
+            if has_search_vector(related):
+                deferred.append(LOOKUP_SEP.join([*path, SEARCH_VECTOR_FIELD]))
+    return deferred
+
+
+class SearchVectorQuerySet(models.QuerySet):
+    """
+    QuerySet that also leaves out the search_vector column of every model it
+    select_related()s. Only movies.search reads the columns, by name.
+    """
+
+    def select_related(self, *fields):
+        queryset = super().select_related(*fields)
+        deferred = related_search_vectors(self.model, fields)
+        return queryset.defer(*deferred) if deferred else queryset
+
+
+class SearchVectorManager(models.Manager):
+    """Default manager deferring the model's own search_vector column"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.defer(SEARCH_VECTOR_FIELD) if has_search_vector(self.model) else queryset
+
+
+class MoviesCountQuerySet(SearchVectorQuerySet):
+    """
+    QuerySet for models related to Movie through a `movies` reverse relation
+    """
+
+    def with_movies_count(self, subquery=False):
+        """
+        Annotate `movies_count` so serializers can read it without a COUNT query per row.
+
+        Pass subquery=True for querysets used in a Prefetch through `movies`: the
+        prefetch filter reuses the relation join, so a plain Count would only see
+        the prefetching movie.
+        """
+        if not subquery:
+            return self.annotate(movies_count=Count('movies', distinct=True))
+
+        relation = self.model._meta.get_field('movies').field.name
+        movies = (
+            Movie.objects.filter(**{relation: OuterRef('pk')})
+            .order_by()
+            .values(relation)
+            .annotate(c=Count('pk'))
+            .values('c')
+        )
+        return self.annotate(movies_count=Coalesce(Subquery(movies), 0))
+
+
 class Genre(BaseModel):
     """
     Genre model representing movie genres (e.g., Action, Comedy, Drama)
@@ -20,6 +93,8 @@ class Genre(BaseModel):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
 
+    objects = MoviesCountQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
 
@@ -36,9 +111,16 @@ class Director(BaseModel):
     nationality = models.CharField(max_length=100, blank=True)
     biography = models.TextField(blank=True)
     image_url = models.URLField(blank=True, null=True, help_text="Director's photo URL")
+    # name (A) + biography (B), maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchVectorManager.from_queryset(MoviesCountQuerySet)()
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='director_name_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -53,14 +135,60 @@ class Actor(BaseModel):
     nationality = models.CharField(max_length=100, blank=True)
     biography = models.TextField(blank=True)
     image_url = models.URLField(blank=True, null=True, help_text="Actor's photo URL")
+    # name (A) + biography (B), maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchVectorManager.from_queryset(MoviesCountQuerySet)()
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='actor_name_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class MovieQuerySet(SearchVectorQuerySet):
+    """
+    QuerySet helpers for maintaining the denormalized review aggregates
+    """
+
+    def apply_review_delta(self, count_delta, rating_delta):
+        """Shift review_count/review_rating_sum in place and recompute the average in the same UPDATE"""
+        new_count = F('review_count') + count_delta
+        new_sum = F('review_rating_sum') + rating_delta
+        return self.update(
+            review_count=new_count,
+            review_rating_sum=new_sum,
+            avg_review_rating=Case(
+                When(review_count=-count_delta, then=Value(None)),
+                default=Round(Cast(new_sum, FloatField()) / Cast(new_count, FloatField()), 1),
+                output_field=FloatField(),
+            ),
+        )
+
+    def with_review_preview(self):
+        """
+        Prefetch the review preview of every movie in one query, for
+        rendering many movie details at once (see Movie.review_preview)
+        """
+        preview = Review.objects.order_by('-created_at', '-id')[:Movie.REVIEW_PREVIEW_SIZE]
+        return self.prefetch_related(Prefetch('reviews', queryset=preview, to_attr='prefetched_review_preview'))
+
+    def rebuild_review_aggregates(self):
+        """Recompute the review aggregates of every movie in the queryset from the Review table"""
+        reviews = Review.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+        count = Subquery(reviews.annotate(c=Count('pk')).values('c'))
+        total = Subquery(reviews.annotate(s=Sum('rating')).values('s'))
+        return self.update(
+            review_count=Coalesce(count, 0),
+            review_rating_sum=Coalesce(total, 0),
+            avg_review_rating=Round(Cast(total, FloatField()) / Cast(count, FloatField()), 1),
+        )
+
+
 class Movie(BaseModel):
     """
     Movie model representing movies with relationships to genres, directors, and actors
@@ -97,25 +225,78 @@ class Movie(BaseModel):
         related_name='movies'
     )
 
+    # title (A) + plot (B), maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Denormalized review aggregates, maintained by movies.signals
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    review_rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    avg_review_rating = models.FloatField(null=True, blank=True, editable=False)
+
+    objects = SearchVectorManager.from_queryset(MovieQuerySet)()
+
+    # Persisted values the post_save signals compare against: a changed year moves the movie
+    # between decade leaderboards, a changed director alters its similar movies and a changed
+    # title reorders the filter index's title ranks
+    TRACKED_FIELDS = ('release_year', 'director_id', 'title')
+
+    # Written only through MovieQuerySet, so saving a stale instance must not overwrite them
+    REVIEW_AGGREGATE_FIELDS = ('review_count', 'review_rating_sum', 'avg_review_rating')
+    # Reviews embedded in movie details; the rest are paged from /api/movies/{id}/reviews/
+    REVIEW_PREVIEW_SIZE = 5
+
     class Meta:
         ordering = ['-release_year', 'title']
         unique_together = ['title', 'release_year', 'director']
+        indexes = [
+            # Keyset pagination: one (field, id) index per ordering exposed by MovieFilter
+            models.Index(fields=['release_year', 'id'], name='movie_release_year_id_idx'),
+            models.Index(fields=['title', 'id'], name='movie_title_id_idx'),
+            models.Index(fields=['rating', 'id'], name='movie_rating_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='movie_created_at_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.REVIEW_AGGREGATE_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+        self._track_loaded()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._track_loaded()
+        return instance
+
+    def _track_loaded(self):
+        self._loaded = {attname: self.__dict__.get(attname) for attname in self.TRACKED_FIELDS}
+
+    def loaded_value(self, attname):
+        """The persisted value of a TRACKED_FIELDS attribute, None if unknown"""
+        return getattr(self, '_loaded', {}).get(attname)
 
     def __str__(self):
         return f"{self.title} ({self.release_year})"
 
     @property
-    def average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if reviews:
-            return round(sum(review.rating for review in reviews) / len(reviews), 1)
-        return None
+    def review_preview(self):
+        """
+        The newest REVIEW_PREVIEW_SIZE reviews: prefetched by with_review_preview(),
+        or read backwards from the (movie, created_at, id) index
+        """
+        if hasattr(self, 'prefetched_review_preview'):
+            return self.prefetched_review_preview
+        return self.reviews.order_by('-created_at', '-id')[:self.REVIEW_PREVIEW_SIZE]
 
     @property
-    def review_count(self):
-        """Get total number of reviews"""
-        return self.reviews.count()
+    def average_rating(self):
+        """Average rating from reviews, read from the stored aggregate"""
+        return self.avg_review_rating
 
 
 class Review(BaseModel):
@@ -133,10 +314,155 @@ class Review(BaseModel):
     )
     comment = models.TextField()
     is_featured = models.BooleanField(default=False)
+    # comment, maintained by a database trigger on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchVectorManager.from_queryset(SearchVectorQuerySet)()
 
     class Meta:
         ordering = ['-created_at']
         unique_together = ['movie', 'reviewer_name']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='review_created_at_id_idx'),
+            models.Index(fields=['rating', 'id'], name='review_rating_id_idx'),
+            # Keyset pages and previews of one movie's reviews, newest first
+            models.Index(fields=['movie', 'created_at', 'id'], name='review_movie_created_idx'),
+            # A reviewer's ratings, newest first, for their recommendations
+            models.Index(fields=['reviewer_name', '-created_at'], name='review_reviewer_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the persisted movie/rating so updates can be applied as deltas
+        instance._loaded_movie_id = instance.__dict__.get('movie_id')
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
 
     def __str__(self):
         return f"{self.reviewer_name} - {self.movie.title} ({self.rating}/10)"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Precomputed top-rated ranking row: one per movie per leaderboard it
+    qualifies for, maintained by movies.leaderboard
+    """
+    SCOPE_ALL = 'all'
+    SCOPE_GENRE = 'genre'
+    SCOPE_DECADE = 'decade'
+    SCOPE_CHOICES = [
+        (SCOPE_ALL, 'All movies'),
+        (SCOPE_GENRE, 'Genre'),
+        (SCOPE_DECADE, 'Decade'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    # Genre id for genre boards, first year of the decade for decade boards, 0 for the overall board
+    scope_key = models.IntegerField(default=0)
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='leaderboard_entries'
+    )
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['scope', 'scope_key', '-score', 'movie_id']
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'scope_key', 'movie'], name='leaderboard_entry_unique'),
+        ]
+        indexes = [
+            # Every board is read as one range scan in rank order
+            models.Index(fields=['scope', 'scope_key', '-score', 'movie'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.scope_key} {self.movie_id} ({self.score:.3f})"
+
+
+class LeaderboardPrior(models.Model):
+    """
+    Single row holding the prior mean the leaderboard scores were computed
+    with, written by movies.leaderboard.rebuild
+    """
+    mean = models.FloatField()
+
+    def __str__(self):
+        return f"{self.mean:.3f}"
+
+
+class SimilarMovie(models.Model):
+    """
+    Precomputed "more like this" row: one per movie per neighbour among its
+    most similar movies, maintained by movies.similarity
+    """
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='similar_entries'
+    )
+    similar = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # 0 for the most similar movie
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['movie_id', 'rank']
+        constraints = [
+            # Also the index a movie's neighbours are read from, in rank order
+            models.UniqueConstraint(fields=['movie', 'rank'], name='similar_movie_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} #{self.rank}: {self.similar_id} ({self.score:.3f})"
+
+
+class RatingNeighbor(models.Model):
+    """
+    Precomputed item-item collaborative filtering row: one per movie per
+    neighbour among the movies its reviewers rated most alike, maintained by
+    movies.recommendations
+    """
+    # Indexed by the (movie, rank) constraint
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='rating_neighbors',
+        db_index=False
+    )
+    neighbor = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # 0 for the most similar movie
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['movie_id', 'rank']
+        constraints = [
+            # Also the index a movie's neighbours are read from, in rank order
+            models.UniqueConstraint(fields=['movie', 'rank'], name='rating_neighbor_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} #{self.rank}: {self.neighbor_id} ({self.score:.3f})"
+
+
+class DataVersion(models.Model):
+    """
+    Current data version of one catalog model, keying the cached API data
+    derived from it; maintained by movies.versions
+    """
+    # Model label, e.g. movies.movie
+    model = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.model}: {self.version}"
@@ -1,7 +1,388 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .versions import get_query_models, get_request_versions
+
+DEFAULT_PAGINATION_COUNT = {
+    # Seconds to cache exact counts for a filter set (0 disables the cache)
+    'CACHE_TIMEOUT': 30,
+    # Only counts at least this large are worth caching
+    'CACHE_MIN_COUNT': 1000,
+    # Serve the PostgreSQL planner estimate when it is at least this large (None disables estimates)
+    'ESTIMATE_THRESHOLD': 100000,
+}
+
+# Query parameters that change which page is served but not how many rows match
+NON_FILTER_PARAMS = {'page', 'page_size', 'ordering', 'cursor', 'format'}
+
+
+def get_pagination_count_settings():
+    return {**DEFAULT_PAGINATION_COUNT, **getattr(settings, 'PAGINATION_COUNT', {})}
+
+
+def estimate_count(queryset, min_rows=0):
+    """
+    Planner row estimate for the queryset on PostgreSQL: pg_class.reltuples
+    for an unfiltered table, otherwise the top plan node of EXPLAIN. The
+    table size is cached, and EXPLAIN is skipped when the table itself has
+    fewer than `min_rows` rows. Returns None when no usable estimate exists.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    table_rows = estimate_table_rows(connection, queryset.model._meta.db_table)
+    if table_rows is None or table_rows < min_rows:
+        return None
+    if not queryset.query.where and not queryset.query.distinct:
+        return table_rows
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_table_rows(connection, table, timeout=300):
+    """pg_class.reltuples for a table, cached; None if it has never been analyzed"""
+    key = f'movies:reltuples:{connection.alias}:{table}'
+    rows = cache.get(key)
+    if rows is None:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+        rows = row[0] if row else -1
+        cache.set(key, rows, timeout)
+    # reltuples is -1 for tables that have never been analyzed
+    return rows if rows >= 0 else None
+
+
+class EstimatedPage(Page):
+    """
+    Page of a paginator whose count is an estimate: built from the page's rows
+    plus the first row of the next page, which decides has_next
+    """
+
+    def __init__(self, rows, number, paginator):
+        super().__init__(rows[:paginator.per_page], number, paginator)
+        self._has_next = len(rows) > paginator.per_page
+
+    def has_next(self):
+        return self._has_next
+
+
+class CountingPaginator(Paginator):
+    """
+    Django Paginator whose total comes from a count strategy instead of an unconditional COUNT(*).
+
+    An estimated count only sizes the response's `count`: page numbers past
+    the estimated last page are served while they have rows, and whether a
+    next page exists is decided by reading one row past the page.
+    """
+
+    def __init__(self, object_list, per_page, get_count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+        self.count_is_exact = True
+
+    @cached_property
+    def count(self):
+        count, self.count_is_exact = self.get_count(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        self.count
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_is_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self.estimated_page(number, list(self.object_list[bottom:bottom + self.per_page + 1]))
+
+    def estimated_page(self, number, rows):
+        """The page `number` from its rows plus up to one more, read by the caller"""
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return EstimatedPage(rows, number, self)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over one ordering field plus the primary key as tiebreaker.
+
+    Pages are addressed with an opaque cursor holding the ordering and the
+    (value, pk) of the last row served, so each page is an indexed range scan
+    with no OFFSET and no COUNT(*). NULLs sort after every value ascending and
+    before them descending; the page that crosses from one to the other reads
+    the second range with a query of its own, so neither scan needs an OR
+    that the index cannot bound. Views opt in by declaring
+    `keyset_ordering_fields` and `keyset_default_ordering`; the ordering is taken
+    from the `ordering` query parameter (first term only).
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    @staticmethod
+    def is_supported(view):
+        return bool(getattr(view, 'keyset_ordering_fields', None))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, view)
+        self.field = queryset.model._meta.get_field(self.ordering.lstrip('-'))
+        self.descending = self.ordering.startswith('-')
+
+        queryset = queryset.order_by(*self.get_order_by())
+        position = self.decode_cursor(request)
+        if position is None:
+            results = list(queryset[:self.page_size + 1])
+        else:
+            results = []
+            for seek in self.get_seek_filters(*position):
+                results += queryset.filter(seek)[:self.page_size + 1 - len(results)]
+                if len(results) > self.page_size:
+                    break
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_ordering(self, request, view):
+        allowed = view.keyset_ordering_fields
+        requested = request.query_params.get(self.ordering_query_param, '').split(',')[0].strip()
+        if requested.lstrip('-') in allowed:
+            return requested
+        return view.keyset_default_ordering
+
+    def get_order_by(self):
+        name = self.field.name
+        if self.descending:
+            # Match PostgreSQL's default null placement so (field, id) indexes can be scanned backwards
+            return [F(name).desc(nulls_first=True), '-pk']
+        return [F(name).asc(nulls_last=True), 'pk']
+
+    def get_seek_filters(self, value, pk):
+        """
+        Filters for the rows after (value, pk), one per index range, in the
+        order they are served. `field >= value` is redundant with the OR that
+        follows it but gives the index scan its start.
+        """
+        name = self.field.name
+        if self.descending:
+            if value is None:
+                return [Q(**{f'{name}__isnull': True, 'pk__lt': pk}), Q(**{f'{name}__isnull': False})]
+            return [Q(**{f'{name}__lte': value}) & (Q(**{f'{name}__lt': value}) | Q(**{name: value, 'pk__lt': pk}))]
+
+        if value is None:
+            return [Q(**{f'{name}__isnull': True, 'pk__gt': pk})]
+        seeks = [Q(**{f'{name}__gte': value}) & (Q(**{f'{name}__gt': value}) | Q(**{name: value, 'pk__gt': pk}))]
+        if self.field.null:
+            seeks.append(Q(**{f'{name}__isnull': True}))
+        return seeks
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if data['o'] != self.ordering:
+                raise ValueError('cursor was issued for a different ordering')
+            value = data['v']
+            if value is not None:
+                value = self.field.to_python(value)
+            return value, int(data['p'])
+        except (TypeError, ValueError, KeyError, ValidationError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item):
+        value = self.get_item_value(item, self.field.attname)
+        if isinstance(value, date):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        data = {'o': self.ordering, 'v': value, 'p': self.get_item_value(item, 'pk')}
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('ascii'))
+        return encoded.decode('ascii').rstrip('=')
+
+    @staticmethod
+    def get_item_value(item, name):
+        if isinstance(item, dict):
+            return item['id'] if name == 'pk' else item[name]
+        return getattr(item, name)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+    # Passing ?cursor= (empty for the first page) switches views that support it to keyset pagination
+    keyset_class = KeysetPagination
+
+    def django_paginator_class(self, object_list, per_page):
+        return CountingPaginator(object_list, per_page, self.get_count)
+
+    def get_count(self, object_list):
+        """
+        Return (count, is_exact) for the filtered object list. Large counts are
+        served from a short-lived cache keyed by route, filter parameters and the
+        versions of every table the query reads, or from the planner estimate
+        when it is big enough that an exact figure is not worth a full scan.
+        """
+        if not isinstance(object_list, QuerySet):
+            return len(object_list), True
+
+        config = get_pagination_count_settings()
+        cache_key = self.get_count_cache_key(object_list) if config['CACHE_TIMEOUT'] else None
+        if cache_key:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        result = None
+        if config['ESTIMATE_THRESHOLD'] is not None:
+            estimate = estimate_count(object_list, min_rows=config['ESTIMATE_THRESHOLD'])
+            if estimate is not None and estimate >= config['ESTIMATE_THRESHOLD']:
+                result = (estimate, False)
+        if result is None:
+            result = (object_list.count(), True)
+
+        if cache_key and result[0] >= config['CACHE_MIN_COUNT']:
+            cache.set(cache_key, result, config['CACHE_TIMEOUT'])
+        return result
+
+    def get_count_cache_key(self, queryset):
+        params = sorted(
+            (key, sorted(values))
+            for key, values in self.request.query_params.lists()
+            if key not in NON_FILTER_PARAMS
+        )
+        versions = sorted(get_request_versions(self.request, get_query_models(queryset)).items())
+        raw = json.dumps([self.request.path, params, versions])
+        return 'movies:count:' + hashlib.sha256(raw.encode()).hexdigest()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params and self.keyset_class.is_supported(view):
+            self.keyset = self.keyset_class(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if getattr(self, 'keyset', None) is not None:
+            return self.keyset.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_exact', self.page.paginator.count_is_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_exact'] = {
+            'type': 'boolean',
+            'description': 'False when count is a planner estimate rather than an exact total',
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        if self.keyset_class.is_supported(view):
+            parameters.append({
+                'name': self.keyset_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque keyset cursor; pass it empty for the first page to '
+                               'switch from page numbers to keyset pagination (no total count).',
+                'schema': {'type': 'string'},
+            })
+        return parameters
+
+
+class KeysetOnlyPagination(CustomPageNumberPagination):
+    """
+    Always keyset-paginate, for routes whose row counts are unbounded (such as
+    one movie's reviews): the first page needs no cursor and no COUNT(*) is run
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.keyset_class(self.get_page_size(request))
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.keyset_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque keyset cursor from the previous page\'s next link.',
+                'schema': {'type': 'string'},
+            },
+        ]
@@ -0,0 +1,32 @@
+"""
+PostgreSQL COPY FROM STDIN, shared by the catalog import and the
+precomputed neighbour tables.
+"""
+import io
+
+
+def copy_rows(cursor, sql, rows):
+    """COPY `rows`, sequences of Python values"""
+    copy_data(cursor, sql, ''.join('\t'.join(copy_value(value) for value in row) + '\n' for row in rows))
+
+
+def copy_data(cursor, sql, data):
+    """COPY `data`, already in COPY's text format"""
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2
+        raw.copy_expert(sql, io.StringIO(data))
+    else:  # psycopg 3
+        with raw.copy(sql) as copy:
+            copy.write(data)
+
+
+def copy_value(value):
+    """A value in COPY's text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
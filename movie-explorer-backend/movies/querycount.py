@@ -0,0 +1,215 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_BUDGET = {
+    # Record queries for every request and check them against the budgets below
+    # (None follows settings.DEBUG)
+    'ENABLED': None,
+    # Maximum queries per request when a route has no budget of its own (None = unlimited)
+    'DEFAULT': None,
+    # Per-route budgets keyed by URL name ("movie-list") or "METHOD url-name" ("GET movie-list")
+    'ROUTES': {},
+    # A query shape repeated at least this many times in one request is reported as N+1
+    'N_PLUS_ONE_THRESHOLD': 5,
+    # Raise QueryBudgetExceeded instead of logging a warning
+    'RAISE': False,
+    # Add X-Query-Count to responses
+    'HEADER': False,
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+\b')
+
+
+def get_query_budget_settings():
+    return {**DEFAULT_QUERY_BUDGET, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def normalize_sql(sql):
+    """
+    Reduce a SQL statement to its shape so repeated queries group together
+    regardless of parameters or IN list length
+    """
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING_LITERAL.sub('?', sql)
+    return _NUMBER_LITERAL.sub('?', sql)
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when a request or test block exceeds its query budget or repeats a query shape
+    """
+
+
+class QueryRecorder:
+    """
+    Context manager that records every SQL statement executed on the given
+    database aliases (all configured aliases by default)
+    """
+
+    def __init__(self, using=None):
+        self.using = list(using) if using else list(connections)
+        self.queries = []
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.using:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._record(alias)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def _record(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append({
+                    'alias': alias,
+                    'sql': sql,
+                    'time': time.perf_counter() - start,
+                })
+        return wrapper
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def shapes(self):
+        """Count executions per normalized query shape"""
+        return Counter(normalize_sql(query['sql']) for query in self.queries)
+
+    def repeated(self, threshold):
+        """Query shapes executed at least `threshold` times, most frequent first"""
+        return [(shape, count) for shape, count in self.shapes().most_common() if count >= threshold]
+
+    def problems(self, max_queries=None, n_plus_one_threshold=None):
+        """Describe every way the recorded queries break the given budget"""
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f'{self.count} queries executed, budget is {max_queries}')
+        if n_plus_one_threshold:
+            for shape, count in self.repeated(n_plus_one_threshold):
+                problems.append(f'possible N+1: {count}x {shape}')
+        return problems
+
+
+class QueryBudgetMiddleware:
+    """
+    Record the SQL issued by each request and log (or raise) when a route
+    exceeds its configured query budget or repeats a query shape.
+
+    Configured through the QUERY_BUDGET setting, see DEFAULT_QUERY_BUDGET.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Run in the handler's own mode so async views are not adapted through a thread
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        config = get_query_budget_settings()
+        if not self.is_enabled(config):
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.check_budget(config, request, response, recorder)
+
+    async def __acall__(self, request):
+        config = get_query_budget_settings()
+        if not self.is_enabled(config):
+            return await self.get_response(request)
+
+        # The async ORM runs its queries on a worker thread with its own
+        # connections, so the recorder is attached there
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.check_budget(config, request, response, recorder)
+
+    def is_enabled(self, config):
+        return settings.DEBUG if config['ENABLED'] is None else config['ENABLED']
+
+    def check_budget(self, config, request, response, recorder):
+        route = self.get_route(request)
+        problems = recorder.problems(
+            max_queries=self.get_budget(config, request.method, route),
+            n_plus_one_threshold=config['N_PLUS_ONE_THRESHOLD'],
+        )
+        if config['HEADER']:
+            response['X-Query-Count'] = str(recorder.count)
+        if problems:
+            message = f'{request.method} {request.path} ({route}): ' + '; '.join(problems)
+            if config['RAISE']:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def get_route(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        return match.view_name
+
+    def get_budget(self, config, method, route):
+        routes = config['ROUTES']
+        for key in (f'{method} {route}', route):
+            if key in routes:
+                return routes[key]
+        return config['DEFAULT']
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin for pinning query counts and catching N+1 patterns
+    """
+
+    n_plus_one_threshold = 3
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries=None, exact=None, n_plus_one_threshold=None, using=None):
+        """
+        Fail if the block executes more than `max_queries` (or not exactly
+        `exact`) queries, or repeats a query shape `n_plus_one_threshold` times
+        """
+        if n_plus_one_threshold is None:
+            n_plus_one_threshold = self.n_plus_one_threshold
+
+        with QueryRecorder(using=using) as recorder:
+            yield recorder
+
+        problems = recorder.problems(max_queries, n_plus_one_threshold)
+        if exact is not None and recorder.count != exact:
+            problems.append(f'{recorder.count} queries executed, expected exactly {exact}')
+        if problems:
+            queries = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(recorder.queries, 1))
+            self.fail('\n'.join(problems) + '\nQueries:\n' + queries)
+
+    def assertNoNPlusOne(self, n_plus_one_threshold=None, using=None):
+        """Fail if the block repeats any query shape `n_plus_one_threshold` times"""
+        return self.assertQueryBudget(n_plus_one_threshold=n_plus_one_threshold, using=using)
@@ -0,0 +1,146 @@
+"""
+Item-item collaborative filtering over reviews.
+
+Reviews form a sparse movie x reviewer rating matrix. Every reviewer's
+ratings are centred on their own mean, so a harsh and a generous reviewer
+who agree on which movies are better count as agreeing, and every movie's
+row is scaled to unit length: the dot product of two rows is their adjusted
+cosine similarity. Similarities resting on few common reviewers are shrunk
+by n / (n + SHRINKAGE). Only every reviewer's MAX_REVIEWS newest ratings
+are used: every pair of movies one reviewer rated is scored, so a few
+accounts with tens of thousands of reviews would otherwise make the work
+quadratic in the catalog and dominate every list. `manage.py rebuild_recommendations` stores the
+NEIGHBORS most similar movies of every movie as ranked RatingNeighbor rows,
+computed in vectorized blocks like movies.similarity.
+
+A reviewer's recommendations only read their MAX_REVIEWS newest ratings and
+the stored neighbours of those movies, so the work per request is bounded
+however large the catalog grows. Each unrated neighbour gets the item-based
+prediction: the reviewer's mean plus the similarity-weighted mean of their
+deviations from it on the movies it neighbours, with the mean itself
+counted as a neighbour of weight PRIOR_WEIGHT. Ratings written since the
+last rebuild are used; the neighbour lists only change on a rebuild.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from . import similarity
+from .models import Movie, RatingNeighbor, Review
+
+DEFAULT_RECOMMENDATIONS = {
+    # Neighbours stored per movie
+    'NEIGHBORS': 50,
+    # Common reviewers at which a similarity keeps half its value
+    'SHRINKAGE': 10,
+    # Newest ratings of a reviewer used for the neighbours and their recommendations
+    'MAX_REVIEWS': 200,
+    # Similarity weight given to the reviewer's mean in every prediction, so
+    # predictions resting on a few weak neighbours stay close to it
+    'PRIOR_WEIGHT': 1.0,
+    # Movies scored per vectorized block
+    'BATCH_SIZE': 256,
+}
+
+
+def get_recommendations_settings():
+    return {**DEFAULT_RECOMMENDATIONS, **getattr(settings, 'RECOMMENDATIONS', {})}
+
+
+def build_matrix(max_reviews):
+    """
+    Sorted ids of the reviewed movies, their L2-normalized CSR rows of
+    mean-centred ratings by reviewer, and the matching 0/1 matrix of who
+    rated what, from every reviewer's `max_reviews` newest ratings
+    """
+    reviews = list(
+        Review.objects.order_by('reviewer_name', '-created_at').values_list('movie_id', 'reviewer_name', 'rating')
+    )
+    _, starts, columns = np.unique(
+        np.array([review[1] for review in reviews], dtype=object), return_index=True, return_inverse=True
+    )
+    columns = columns.ravel().astype(np.int64)
+    # Reviews come grouped by reviewer, newest first
+    newest = np.arange(len(reviews)) - starts[columns] < max_reviews
+    columns = columns[newest]
+    movie_ids = np.array([review[0] for review in reviews], dtype=np.int64)[newest]
+    ratings = np.array([review[2] for review in reviews], dtype=np.float32)[newest]
+    ids, rows = np.unique(movie_ids, return_inverse=True)
+    rows = rows.ravel()
+
+    counts = np.bincount(columns)
+    means = np.bincount(columns, weights=ratings) / np.maximum(counts, 1)
+    shape = (len(ids), len(counts))
+    matrix = sparse.csr_matrix((ratings - means[columns].astype(np.float32), (rows, columns)), shape=shape)
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    rated = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=shape)
+    return ids, sparse.diags(1 / norms).dot(matrix).tocsr(), rated
+
+
+def top_neighbors(matrix, rated, rows, config):
+    """similarity.top_neighbors() of `rows` by shrunk adjusted cosine"""
+    scores = (matrix[rows] @ matrix.T).tocsr()
+    common = (rated[rows] @ rated.T).tocsr()
+    common.data = common.data / (common.data + config['SHRINKAGE'])
+    return similarity.select_top(scores.multiply(common).tocsr(), rows, config['NEIGHBORS'])
+
+
+def rebuild():
+    """Recompute the rating neighbours of every movie; returns the number of entries written"""
+    config = get_recommendations_settings()
+    ids, matrix, rated = build_matrix(config['MAX_REVIEWS'])
+    written = 0
+    with transaction.atomic():
+        RatingNeighbor.objects.all().delete()
+        for start in range(0, len(ids), config['BATCH_SIZE']):
+            rows = np.arange(start, min(start + config['BATCH_SIZE'], len(ids)))
+            sources, neighbors, ranks, scores = top_neighbors(matrix, rated, rows, config)
+            similarity.insert_neighbors(RatingNeighbor, 'neighbor', ids, sources, neighbors, ranks, scores)
+            written += len(sources)
+        similarity.analyze(RatingNeighbor)
+    return written
+
+
+def recommend(reviewer_name, limit=10, select_related=('director',), prefetch_related=('genres',)):
+    """
+    The `limit` movies `reviewer_name` has not reviewed with the highest
+    predicted rating, each carrying its `predicted_rating`, or None when they
+    have no reviews
+    """
+    config = get_recommendations_settings()
+    rated = dict(
+        Review.objects.filter(reviewer_name=reviewer_name).order_by('-created_at')
+        .values_list('movie_id', 'rating')[:config['MAX_REVIEWS']]
+    )
+    if not rated:
+        return None
+    rated_ids = np.array(sorted(rated), dtype=np.int64)
+    mean = sum(rated.values()) / len(rated)
+    deviations = np.array([rated[movie_id] for movie_id in rated_ids.tolist()], dtype=np.float64) - mean
+
+    entries = np.array(
+        list(RatingNeighbor.objects.filter(movie_id__in=rated_ids.tolist()).order_by()
+             .values_list('movie_id', 'neighbor_id', 'score')), dtype=np.float64
+    ).reshape(-1, 3)
+    sources, neighbors, scores = entries[:, 0].astype(np.int64), entries[:, 1].astype(np.int64), entries[:, 2]
+    keep = ~np.isin(neighbors, rated_ids)
+    candidates, inverse = np.unique(neighbors[keep], return_inverse=True)
+    support = np.bincount(inverse, weights=scores[keep], minlength=len(candidates))
+    weighted = np.bincount(
+        inverse, weights=scores[keep] * deviations[np.searchsorted(rated_ids, sources[keep])],
+        minlength=len(candidates),
+    )
+    predicted = np.clip(mean + weighted / (support + config['PRIOR_WEIGHT']), 1, 10)
+    # Highest prediction first, then the best supported one
+    order = np.lexsort((candidates, -support, -predicted))[:limit]
+
+    top = dict(zip(candidates[order].tolist(), predicted[order].tolist()))
+    positions = {movie_id: position for position, movie_id in enumerate(top)}
+    movies = Movie.objects.filter(pk__in=list(top)).select_related(*select_related).prefetch_related(*prefetch_related)
+    movies = sorted(movies, key=lambda movie: positions[movie.pk])
+    for movie in movies:
+        movie.predicted_rating = round(top[movie.pk], 2)
+    return movies
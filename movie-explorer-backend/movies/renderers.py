@@ -0,0 +1,61 @@
+"""
+JSON renderer and parser backed by orjson when it is installed.
+
+Responses decode to the same data as DRF's JSONRenderer output: compact
+UTF-8 with U+2028/U+2029 escaped (floats may use a shorter exponent form,
+e.g. 1e-5). Types orjson does not handle the same way (Decimal, datetime, date,
+time, lazy translation strings, querysets) go through DRF's JSONEncoder.default,
+and anything orjson refuses outright (non-string keys, integers wider than 64
+bits, indentation other than 2) falls back to DRF's stdlib implementation.
+Without orjson both classes behave exactly like DRF's.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Left to JSONEncoder.default so dates keep DRF's millisecond precision and 'Z' suffix
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """DRF's JSONRenderer, encoding with orjson when available"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+        options = ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """DRF's JSONParser, decoding UTF-8 bodies with orjson when available"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,208 @@
+"""
+Read-only fast path for list endpoints.
+
+A RowSerializer renders the rows of a .values() queryset exactly as its
+serializer_class renders model instances, for the same (possibly sparse) set
+of fields and in the same field order. It skips per-row model instances,
+per-field source traversal and the related managers StringRelatedField
+builds for every row. Multi-valued relations are fetched with one
+through-table query per relation and page, and turned into movie id ->
+names maps. Values are passed through unchanged where the serializer field
+would return them as they are. The rest (decimals, dates) go through the
+serializer field's own to_representation, so the output is identical.
+
+Only list reads use it (the async routes also render the movies of actor,
+director and leaderboard responses with it, loading the relations through
+the async ORM); writes, detail views and the OpenAPI schema keep the
+ModelSerializers.
+"""
+import asyncio
+
+from rest_framework import fields as drf_fields
+
+from .fieldsets import READ_METHODS
+from .models import Movie
+from .serializers import ActorSerializer, DirectorSerializer, GenreSerializer, MovieListSerializer
+
+# Fields whose to_representation returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    drf_fields.BooleanField, drf_fields.CharField, drf_fields.FloatField, drf_fields.IntegerField,
+    drf_fields.ReadOnlyField, drf_fields.SerializerMethodField,
+)
+
+
+class RowSerializer:
+    """
+    Renders .values() rows like `serializer_class`. Subclasses map every
+    field to a values() lookup in `columns`, or to a (many-to-many field,
+    related label field) pair in `relations`. A relation is rendered as the
+    list of labels in the related model's default ordering, like
+    StringRelatedField(many=True) with a __str__ returning that label.
+    """
+    serializer_class = None
+    columns = {}
+    relations = {}
+
+    def __init__(self, fields, extra_columns=()):
+        """`fields`: the serializer's fields to render; `extra_columns` are also selected, e.g. for cursors"""
+        self.fields = {name: field for name, field in fields.items() if not field.write_only}
+        self.extra_columns = tuple(extra_columns)
+
+    def get_queryset(self, queryset):
+        """`queryset` reduced to the columns the rendered fields read, as dicts"""
+        lookups = {'id'}
+        lookups.update(self.columns[name] for name in self.fields if name in self.columns)
+        lookups.update(self.extra_columns)
+        return queryset.values(*sorted(lookups))
+
+    def to_representation(self, rows):
+        ids = [row['id'] for row in rows]
+        return self.render(rows, {
+            name: self.get_relation(*self.relations[name], ids) for name in self.fields if name in self.relations
+        })
+
+    async def ato_representation(self, rows):
+        """to_representation() for async views, loading the relations concurrently"""
+        return self.render(rows, await self.aget_related([row['id'] for row in rows]))
+
+    async def aget_related(self, ids):
+        """{relation field name: get_relation() map} for the rendered relations, read concurrently"""
+        names = [name for name in self.fields if name in self.relations]
+        maps = await asyncio.gather(*(self.aget_relation(*self.relations[name], ids) for name in names))
+        return dict(zip(names, maps))
+
+    def render(self, rows, related):
+        """The rendered rows, given the `related` maps of their relations"""
+        converters = []
+        for name, field in self.fields.items():
+            if name in related:
+                converters.append((name, None, related[name]))
+            elif isinstance(field, PASSTHROUGH_FIELDS):
+                converters.append((name, self.columns[name], None))
+            else:
+                converters.append((name, self.columns[name], field.to_representation))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in converters:
+                if column is None:
+                    item[name] = convert.get(row['id'], [])
+                else:
+                    value = row[column]
+                    item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+    @staticmethod
+    def relation_queryset(field, label, ids):
+        """(source id, label) pairs of `ids` in the related model's ordering"""
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        ordering = [f'{target}__{name}' for name in field.related_model._meta.ordering] + ['pk']
+        return (
+            through.objects.filter(**{f'{source}__in': ids}).order_by(*ordering)
+            .values_list(f'{source}_id', f'{target}__{label}')
+        )
+
+    @classmethod
+    def get_relation(cls, field, label, ids):
+        """{source id: [labels in the related model's ordering]} read with one through-table query"""
+        related = {}
+        for source_id, value in cls.relation_queryset(field, label, ids):
+            related.setdefault(source_id, []).append(value)
+        return related
+
+    @classmethod
+    async def aget_relation(cls, field, label, ids):
+        """get_relation() through the async ORM"""
+        related = {}
+        async for source_id, value in cls.relation_queryset(field, label, ids):
+            related.setdefault(source_id, []).append(value)
+        return related
+
+    def bind(self, rows):
+        """A serializer-like object whose .data is the rendered rows"""
+        return RenderedRows(self.to_representation(list(rows)))
+
+
+class RenderedRows:
+    def __init__(self, data):
+        self.data = data
+
+
+class MovieListRowSerializer(RowSerializer):
+    serializer_class = MovieListSerializer
+    columns = {
+        'id': 'id', 'title': 'title', 'release_year': 'release_year', 'rating': 'rating',
+        'poster_url': 'poster_url', 'backdrop_url': 'backdrop_url', 'director_name': 'director__name',
+        'average_rating': 'avg_review_rating', 'review_count': 'review_count',
+        'duration': 'duration', 'plot': 'plot',
+    }
+    relations = {
+        'genres': (Movie._meta.get_field('genres'), 'name'),
+        'actors': (Movie._meta.get_field('actors'), 'name'),
+    }
+
+
+class PersonRowSerializer(RowSerializer):
+    columns = {
+        field: field for field in (
+            'id', 'name', 'birth_date', 'nationality', 'biography', 'image_url', 'movies_count',
+            'created_at', 'updated_at',
+        )
+    }
+
+
+class ActorRowSerializer(PersonRowSerializer):
+    serializer_class = ActorSerializer
+
+
+class DirectorRowSerializer(PersonRowSerializer):
+    serializer_class = DirectorSerializer
+
+
+class GenreRowSerializer(RowSerializer):
+    serializer_class = GenreSerializer
+    columns = {field: field for field in ('id', 'name', 'description', 'movies_count', 'created_at', 'updated_at')}
+
+
+class RowSerializerViewMixin:
+    """
+    Serve `row_actions` (GET list actions rendered with the viewset's list
+    serializer) from .values() rows through `row_serializer_class`. Views
+    pass their list querysets through get_row_queryset(), which only
+    applies it when the fast path is in use.
+    """
+    row_serializer_class = None
+    row_actions = ('list',)
+
+    def uses_rows(self):
+        return (
+            self.row_serializer_class is not None
+            and self.action in self.row_actions
+            and self.request is not None and self.request.method in READ_METHODS
+            and not getattr(self, 'swagger_fake_view', False)
+        )
+
+    def get_row_serializer(self):
+        if not hasattr(self, '_row_serializer'):
+            serializer_class = self.row_serializer_class.serializer_class
+            if hasattr(self, 'get_rendered_fields'):
+                fields = self.get_rendered_fields(serializer_class)
+            else:
+                fields = serializer_class(context=self.get_serializer_context()).fields
+            self._row_serializer = self.row_serializer_class(fields, getattr(self, 'keyset_ordering_fields', ()))
+        return self._row_serializer
+
+    def get_row_queryset(self, queryset):
+        """`queryset` as rows for the fast path when it is in use, else unchanged"""
+        if not self.uses_rows():
+            return queryset
+        return self.get_row_serializer().get_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and self.uses_rows():
+            return self.get_row_serializer().bind(args[0])
+        return super().get_serializer(*args, **kwargs)
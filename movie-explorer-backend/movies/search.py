@@ -0,0 +1,100 @@
+"""
+Cross-entity full-text search.
+
+On PostgreSQL every entity type is ranked and highlighted in a single UNION ALL
+query over the trigger-maintained, GIN-indexed `search_vector` columns. Other
+backends (SQLite in tests) fall back to one icontains scan per entity type.
+"""
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import CharField, F, IntegerField, Q, Value
+from django.db.models.functions import Concat
+
+from .models import Actor, Director, Movie, Review
+
+SEARCH_CONFIG = 'english'
+HEADLINE_OPTIONS = {
+    'start_sel': '<mark>',
+    'stop_sel': '</mark>',
+    'max_words': 25,
+    'min_words': 10,
+    'max_fragments': 2,
+}
+
+# type -> (model, label field, fields searched by the fallback, headline document, movie reference)
+SEARCH_TYPES = {
+    'movie': (Movie, 'title', ('title', 'plot'), ('title', 'plot'), 'id'),
+    'actor': (Actor, 'name', ('name', 'biography'), ('name', 'biography'), None),
+    'director': (Director, 'name', ('name', 'biography'), ('name', 'biography'), None),
+    'review': (Review, 'reviewer_name', ('comment',), ('comment',), 'movie_id'),
+}
+
+RESULT_FIELDS = ('type', 'id', 'label', 'rank', 'snippet', 'movie_id')
+
+
+def search(text, types=None, limit=20):
+    """
+    Ranked search results across movies, people and reviews as a list of dicts
+    with the keys in RESULT_FIELDS, best match first
+    """
+    types = [t for t in (types or SEARCH_TYPES) if t in SEARCH_TYPES]
+    if not text.strip() or not types:
+        return []
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(text, types, limit)
+    return _search_fallback(text, types, limit)
+
+
+def _document(fields):
+    if len(fields) == 1:
+        return F(fields[0])
+    parts = []
+    for field in fields:
+        parts += [F(field), Value(' — ')]
+    return Concat(*parts[:-1], output_field=CharField())
+
+
+def _search_postgresql(text, types, limit):
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    querysets = []
+    for name in types:
+        model, label, _, headline, movie_ref = SEARCH_TYPES[name]
+        queryset = (
+            model.objects.filter(search_vector=query)
+            .annotate(
+                type=Value(name, output_field=CharField()),
+                label=F(label),
+                rank=SearchRank(F('search_vector'), query),
+                snippet=SearchHeadline(_document(headline), query, config=SEARCH_CONFIG, **HEADLINE_OPTIONS),
+                movie_ref=F(movie_ref) if movie_ref else Value(None, output_field=IntegerField()),
+            )
+            .order_by('-rank')
+            .values_list('type', 'id', 'label', 'rank', 'snippet', 'movie_ref')[:limit]
+        )
+        querysets.append(queryset)
+
+    combined = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    rows = combined.order_by('-rank')[:limit] if len(querysets) > 1 else combined
+    return [dict(zip(RESULT_FIELDS, row)) for row in rows]
+
+
+def _search_fallback(text, types, limit):
+    term = text.strip()
+    results = []
+    for name in types:
+        model, label, fields, _, movie_ref = SEARCH_TYPES[name]
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': term})
+        for obj in model.objects.filter(condition)[:limit]:
+            label_value = getattr(obj, label)
+            results.append({
+                'type': name,
+                'id': obj.pk,
+                'label': label_value,
+                'rank': 1.0 if term.lower() in label_value.lower() else 0.5,
+                'snippet': ' — '.join(str(getattr(obj, field)) for field in fields if getattr(obj, field))[:200],
+                'movie_id': getattr(obj, movie_ref) if movie_ref else None,
+            })
+    results.sort(key=lambda result: -result['rank'])
+    return results[:limit]
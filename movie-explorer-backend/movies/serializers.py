@@ -1,8 +1,24 @@
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from .models import Movie, Actor, Director, Genre, Review
+from .fieldsets import SparseFieldsetSerializerMixin
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+def annotated_movies_count(obj):
+    """
+    Read the `movies_count` annotation when the queryset provides it,
+    falling back to a COUNT query for objects loaded without one
+    """
+    count = getattr(obj, 'movies_count', None)
+    if count is None:
+        count = obj.movies.count()
+    return count
+
+
+class ReviewSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Review model
     """
@@ -12,7 +28,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Genre model
     """
@@ -24,10 +40,10 @@ class GenreSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def get_movies_count(self, obj):
-        return obj.movies.count()
+        return annotated_movies_count(obj)
 
 
-class DirectorSerializer(serializers.ModelSerializer):
+class DirectorSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Director model
     """
@@ -39,10 +55,10 @@ class DirectorSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def get_movies_count(self, obj):
-        return obj.movies.count()
+        return annotated_movies_count(obj)
 
 
-class ActorSerializer(serializers.ModelSerializer):
+class ActorSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Actor model
     """
@@ -54,35 +70,71 @@ class ActorSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
     def get_movies_count(self, obj):
-        return obj.movies.count()
+        return annotated_movies_count(obj)
 
 
-class MovieListSerializer(serializers.ModelSerializer):
+class MovieListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Movie list view (minimal fields for performance)
     """
     director_name = serializers.CharField(source='director.name', read_only=True)
     genres = serializers.StringRelatedField(many=True, read_only=True)
-    average_rating = serializers.ReadOnlyField()
+    actors = serializers.StringRelatedField(many=True, read_only=True)
+    average_rating = serializers.ReadOnlyField(source='avg_review_rating')
     review_count = serializers.ReadOnlyField()
 
     class Meta:
         model = Movie
         fields = [
             'id', 'title', 'release_year', 'rating', 'poster_url', 'backdrop_url',
-            'director_name', 'genres', 'average_rating', 'review_count'
+            'director_name', 'genres', 'average_rating', 'review_count',
+            'duration', 'plot', 'actors'
         ]
+        # Rendered only when requested with ?include= or ?fields=
+        optional_fields = ['duration', 'plot', 'actors']
+
+
+class TopRatedMovieSerializer(MovieListSerializer):
+    """
+    Serializer for leaderboard rows: the movie list fields plus the ranking score
+    """
+    score = serializers.FloatField(source='leaderboard_score', read_only=True)
+
+    class Meta(MovieListSerializer.Meta):
+        fields = MovieListSerializer.Meta.fields + ['score']
+
+
+class SimilarMovieSerializer(MovieListSerializer):
+    """
+    Serializer for similar movies: the movie list fields plus the cosine similarity
+    """
+    score = serializers.FloatField(source='similarity_score', read_only=True)
+
+    class Meta(MovieListSerializer.Meta):
+        fields = MovieListSerializer.Meta.fields + ['score']
+
+
+class RecommendedMovieSerializer(MovieListSerializer):
+    """
+    Serializer for a reviewer's recommendations: the movie list fields plus the predicted rating
+    """
+    predicted_rating = serializers.FloatField(read_only=True)
 
+    class Meta(MovieListSerializer.Meta):
+        fields = MovieListSerializer.Meta.fields + ['predicted_rating']
 
-class MovieDetailSerializer(serializers.ModelSerializer):
+
+class MovieDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Movie detail view (all fields with nested relationships)
     """
     director = DirectorSerializer(read_only=True)
     actors = ActorSerializer(many=True, read_only=True)
     genres = GenreSerializer(many=True, read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.ReadOnlyField()
+    # A preview only: all reviews are paged from reviews_url
+    reviews = ReviewSerializer(source='review_preview', many=True, read_only=True)
+    reviews_url = serializers.SerializerMethodField()
+    average_rating = serializers.ReadOnlyField(source='avg_review_rating')
     review_count = serializers.ReadOnlyField()
     
     # Write-only fields for creating/updating relationships
@@ -101,11 +153,17 @@ class MovieDetailSerializer(serializers.ModelSerializer):
         model = Movie
         fields = [
             'id', 'title', 'release_year', 'duration', 'plot', 'poster_url', 'backdrop_url', 'rating',
-            'director', 'actors', 'genres', 'reviews', 'average_rating', 'review_count',
+            'director', 'actors', 'genres', 'reviews', 'reviews_url', 'average_rating', 'review_count',
             'created_at', 'updated_at', 'director_id', 'actor_ids', 'genre_ids'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    @extend_schema_field(OpenApiTypes.URI)
+    def get_reviews_url(self, obj):
+        return reverse('movie-reviews', kwargs={'movie_pk': obj.pk}, request=self.context.get('request'))
+
+    # One transaction per write, so the movie's similar movies are refreshed once it is complete
+    @transaction.atomic(savepoint=False)
     def create(self, validated_data):
         actor_ids = validated_data.pop('actor_ids', [])
         genre_ids = validated_data.pop('genre_ids', [])
@@ -118,6 +176,7 @@ class MovieDetailSerializer(serializers.ModelSerializer):
         
         return movie
 
+    @transaction.atomic(savepoint=False)
     def update(self, instance, validated_data):
         actor_ids = validated_data.pop('actor_ids', None)
         genre_ids = validated_data.pop('genre_ids', None)
@@ -152,3 +211,98 @@ class DirectorDetailSerializer(DirectorSerializer):
 
     class Meta(DirectorSerializer.Meta):
         fields = DirectorSerializer.Meta.fields + ['movies']
+
+
+class MovieBulkItemSerializer(serializers.ModelSerializer):
+    """
+    One movie of a bulk write: the MovieDetailSerializer write fields, validated
+    without queries (ids and uniqueness are checked per batch, see movies.bulk)
+    """
+    director_id = serializers.IntegerField()
+    actor_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    genre_ids = serializers.ListField(child=serializers.IntegerField())
+
+    class Meta:
+        model = Movie
+        fields = [
+            'title', 'release_year', 'duration', 'plot', 'poster_url', 'backdrop_url', 'rating',
+            'director_id', 'actor_ids', 'genre_ids'
+        ]
+        validators = []
+
+
+class ReviewBulkItemSerializer(serializers.ModelSerializer):
+    """
+    One review of a bulk write, validated without queries (see movies.bulk)
+    """
+    movie_id = serializers.IntegerField()
+
+    class Meta:
+        model = Review
+        fields = ['movie_id', 'reviewer_name', 'rating', 'comment', 'is_featured']
+        validators = []
+
+
+class BulkWriteResultSerializer(serializers.Serializer):
+    """
+    Serializer describing the outcome of one bulk write item (used for the schema)
+    """
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=['created', 'updated'])
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """
+    Serializer describing one /api/search/ hit (used for the schema)
+    """
+    type = serializers.ChoiceField(choices=['movie', 'actor', 'director', 'review'])
+    id = serializers.IntegerField()
+    label = serializers.CharField()
+    rank = serializers.FloatField()
+    snippet = serializers.CharField()
+    movie_id = serializers.IntegerField(allow_null=True)
+
+
+class AutocompleteResultSerializer(serializers.Serializer):
+    """
+    Serializer describing one /api/autocomplete/ suggestion (used for the schema)
+    """
+    type = serializers.ChoiceField(choices=['movie', 'actor', 'director', 'genre'])
+    id = serializers.IntegerField()
+    label = serializers.CharField()
+
+
+class FacetValueSerializer(serializers.Serializer):
+    """
+    Serializer describing one genre or director of /api/movies/facets/ (used for the schema)
+    """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class DecadeFacetSerializer(serializers.Serializer):
+    """
+    Serializer describing one decade of /api/movies/facets/ (used for the schema)
+    """
+    decade = serializers.IntegerField(help_text='First year of the decade')
+    count = serializers.IntegerField()
+
+
+class RatingFacetSerializer(serializers.Serializer):
+    """
+    Serializer describing one rating threshold of /api/movies/facets/ (used for the schema)
+    """
+    rating_gte = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class MovieFacetsSerializer(serializers.Serializer):
+    """
+    Serializer describing the /api/movies/facets/ counts (used for the schema)
+    """
+    count = serializers.IntegerField()
+    genres = FacetValueSerializer(many=True)
+    decades = DecadeFacetSerializer(many=True)
+    ratings = RatingFacetSerializer(many=True)
+    directors = FacetValueSerializer(many=True)
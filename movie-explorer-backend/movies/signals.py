@@ -0,0 +1,273 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import autocomplete, filter_index, leaderboard, similarity
+from .models import Actor, Director, Genre, LeaderboardEntry, Movie, Review, SimilarMovie
+from .versions import bump_versions
+
+CATALOG_MODELS = (Movie, Review, Actor, Director, Genre)
+
+
+def receiver_for(signal, senders):
+    """
+    Connect the decorated function to `signal` for the given senders only. Unlike
+    a receiver without a sender, this keeps Django's single-query fast delete for
+    every other model (leaderboard entries, M2M rows).
+    """
+    def decorator(func):
+        for sender in senders:
+            signal.connect(func, sender=sender)
+        return func
+    return decorator
+
+
+def deleted_with_movie(origin):
+    """Whether a delete started from a movie (or its director) that cascades to its reviews"""
+    model = getattr(origin, 'model', type(origin))
+    return model in (Movie, Director)
+
+
+@receiver(post_save, sender=Review)
+def update_review_aggregates_on_save(sender, instance, created, raw=False, **kwargs):
+    """Apply the review's contribution to the parent movie's stored aggregates"""
+    if raw:
+        return
+
+    old_movie_id = getattr(instance, '_loaded_movie_id', None)
+    old_rating = getattr(instance, '_loaded_rating', None)
+
+    if created:
+        Movie.objects.filter(pk=instance.movie_id).apply_review_delta(1, instance.rating)
+    elif old_movie_id is None:
+        # Saved without being loaded first, so the previous values are unknown
+        Movie.objects.filter(pk=instance.movie_id).rebuild_review_aggregates()
+    elif old_movie_id != instance.movie_id:
+        Movie.objects.filter(pk=old_movie_id).apply_review_delta(-1, -old_rating)
+        Movie.objects.filter(pk=instance.movie_id).apply_review_delta(1, instance.rating)
+    elif old_rating != instance.rating:
+        Movie.objects.filter(pk=instance.movie_id).apply_review_delta(0, instance.rating - old_rating)
+    else:
+        return
+
+    # Queued before bump_catalog_version's bump, so boards are rewritten before cached responses expire
+    leaderboard.refresh_on_commit({instance.movie_id, old_movie_id} - {None})
+    instance._loaded_movie_id = instance.movie_id
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def update_review_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    """Remove the review's contribution from the parent movie's stored aggregates"""
+    if deleted_with_movie(origin):
+        return
+    movie_id = getattr(instance, '_loaded_movie_id', None) or instance.movie_id
+    rating = getattr(instance, '_loaded_rating', None)
+    if rating is None:
+        rating = instance.rating
+    Movie.objects.filter(pk=movie_id).apply_review_delta(-1, -rating)
+    leaderboard.refresh_on_commit([movie_id])
+
+
+@receiver_for(pre_delete, CATALOG_MODELS)
+def track_delete_versions(sender, origin=None, **kwargs):
+    """
+    Start recording the models a delete bumps. Django sends pre_delete for
+    every row of a delete before any post_delete.
+    """
+    if origin is not None:
+        origin._bumped_versions = set()
+
+
+@receiver_for(post_save, CATALOG_MODELS)
+@receiver_for(post_delete, CATALOG_MODELS)
+def bump_catalog_version(sender, raw=False, origin=None, **kwargs):
+    """Invalidate cached data for the written model"""
+    if raw:
+        return
+    # A delete and its cascades run in one transaction, so one bump per model is enough
+    bumped = getattr(origin, '_bumped_versions', None)
+    if bumped is not None:
+        if sender in bumped:
+            return
+        bumped.add(sender)
+    bump_versions(sender)
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def bump_relation_versions(sender, instance, action, model, **kwargs):
+    """Invalidate cached data for both sides of a changed movie relation"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_versions(type(instance), model)
+
+
+def on_commit_if_loaded(func, *args):
+    """Apply an autocomplete index update once the write commits (skipped until the index is loaded)"""
+    if autocomplete.index.is_tracking:
+        transaction.on_commit(lambda: func(*args))
+
+
+@receiver_for(post_save, autocomplete.INDEXED_MODELS)
+def index_name_on_save(sender, instance, created, raw=False, **kwargs):
+    """Add or rename the saved object in the autocomplete index"""
+    if raw:
+        return
+    kind, label = autocomplete.INDEXED_MODELS[sender]
+    on_commit_if_loaded(autocomplete.index.upsert, kind, instance.pk, getattr(instance, label))
+    if sender is Movie and created and instance.director_id:
+        on_commit_if_loaded(autocomplete.index.adjust_weight, 'director', instance.director_id, 1)
+
+
+@receiver_for(post_delete, autocomplete.INDEXED_MODELS)
+def unindex_name_on_delete(sender, instance, **kwargs):
+    """Drop the deleted object from the autocomplete index"""
+    kind, _ = autocomplete.INDEXED_MODELS[sender]
+    on_commit_if_loaded(autocomplete.index.remove, kind, instance.pk)
+    if sender is Movie and instance.director_id:
+        on_commit_if_loaded(autocomplete.index.adjust_weight, 'director', instance.director_id, -1)
+
+
+@receiver(post_save, sender=Review)
+def weight_movie_on_review_save(sender, instance, created, raw=False, **kwargs):
+    """Keep a movie's autocomplete weight in step with its review count"""
+    if created and not raw:
+        on_commit_if_loaded(autocomplete.index.adjust_weight, 'movie', instance.movie_id, 1)
+
+
+@receiver(post_delete, sender=Review)
+def weight_movie_on_review_delete(sender, instance, origin=None, **kwargs):
+    """Keep a movie's autocomplete weight in step with its review count"""
+    if not deleted_with_movie(origin):
+        on_commit_if_loaded(autocomplete.index.adjust_weight, 'movie', instance.movie_id, -1)
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def weight_names_on_relation_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Keep actor and genre autocomplete weights in step with their movie counts"""
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        kind, _ = autocomplete.INDEXED_MODELS[type(instance)]
+        on_commit_if_loaded(autocomplete.index.adjust_weight, kind, instance.pk, delta * len(pk_set))
+    else:
+        kind, _ = autocomplete.INDEXED_MODELS[model]
+        for pk in pk_set:
+            on_commit_if_loaded(autocomplete.index.adjust_weight, kind, pk, delta)
+
+
+@receiver(post_save, sender=Movie)
+def refresh_similar_on_save(sender, instance, created, raw=False, **kwargs):
+    """Recompute the similar movies around a new movie, or one whose director or decade changed"""
+    if raw:
+        return
+    old_director_id = instance.loaded_value('director_id')
+    old_year = instance.loaded_value('release_year')
+    if (
+        created or old_director_id != instance.director_id or old_year is None
+        or leaderboard.decade_of(old_year) != leaderboard.decade_of(instance.release_year)
+    ):
+        similarity.refresh_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Movie)
+def rank_movie_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move an updated movie to its new decade leaderboard"""
+    old_year = instance.loaded_value('release_year')
+    if not created and not raw and old_year is not None and old_year != instance.release_year:
+        leaderboard.refresh_movies([instance.pk])
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def rank_movies_on_genre_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the genre leaderboards in step with the movies' genres"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # Movies without enough reviews have no entries to move
+        if instance.review_count >= leaderboard.get_leaderboard_settings()['MIN_VOTES']:
+            leaderboard.refresh_movies([instance.pk])
+    elif action == 'post_clear':
+        LeaderboardEntry.objects.filter(scope=LeaderboardEntry.SCOPE_GENRE, scope_key=instance.pk).delete()
+    elif pk_set:
+        leaderboard.refresh_movies(pk_set)
+
+
+@receiver(post_delete, sender=Genre)
+def drop_genre_leaderboard(sender, instance, **kwargs):
+    """Remove the deleted genre's leaderboard"""
+    LeaderboardEntry.objects.filter(scope=LeaderboardEntry.SCOPE_GENRE, scope_key=instance.pk).delete()
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def refresh_similar_on_relation_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recompute the similar movies around movies whose actors or genres changed"""
+    if action in ('post_add', 'post_remove') and pk_set:
+        similarity.refresh_on_commit(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear' and not reverse:
+        similarity.refresh_on_commit([instance.pk])
+    elif action == 'pre_clear' and reverse:
+        similarity.refresh_on_commit(instance.movies.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Movie)
+def refresh_similar_on_movie_delete(sender, instance, **kwargs):
+    """Refill the similar movies of the movies that listed the deleted one"""
+    similarity.refresh_on_commit(
+        SimilarMovie.objects.filter(similar=instance).order_by().values_list('movie_id', flat=True)
+    )
+
+
+@receiver_for(pre_delete, (Actor, Genre))
+def refresh_similar_on_feature_delete(sender, instance, **kwargs):
+    """Recompute the similar movies around the movies losing the deleted actor or genre"""
+    similarity.refresh_on_commit(instance.movies.values_list('pk', flat=True))
+
+
+def on_commit_if_indexed(func, *args):
+    """Apply a filter index update once the write commits (skipped until the index is loaded)"""
+    if filter_index.index.is_tracking:
+        transaction.on_commit(lambda: func(*args))
+
+
+@receiver(post_save, sender=Movie)
+def index_movie_on_save(sender, instance, created, raw=False, **kwargs):
+    """Add or update the saved movie's filter index columns"""
+    if raw:
+        return
+    title_changed = created or instance.loaded_value('title') != instance.title
+    on_commit_if_indexed(
+        filter_index.index.upsert_movie, instance.pk, instance.release_year, instance.rating,
+        instance.director_id, instance.created_at, title_changed,
+    )
+
+
+@receiver(post_delete, sender=Movie)
+def unindex_movie_on_delete(sender, instance, **kwargs):
+    """Drop the deleted movie from the filter index"""
+    on_commit_if_indexed(filter_index.index.remove_movie, instance.pk)
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def index_links_on_relation_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Keep the filter index's genre and actor members in step with the movies' relations"""
+    relation = (type(instance) if reverse else model)._meta.model_name
+    if action in ('post_add', 'post_remove') and pk_set:
+        pairs = [(pk, instance.pk) for pk in pk_set] if reverse else [(instance.pk, pk) for pk in pk_set]
+        update = filter_index.index.add_links if action == 'post_add' else filter_index.index.remove_links
+        on_commit_if_indexed(update, relation, pairs)
+    elif action == 'post_clear':
+        if reverse:
+            on_commit_if_indexed(filter_index.index.remove_key, relation, instance.pk)
+        else:
+            on_commit_if_indexed(filter_index.index.clear_movie_links, relation, instance.pk)
+
+
+@receiver_for(post_delete, (Actor, Genre))
+def unindex_links_on_feature_delete(sender, instance, **kwargs):
+    """Unlink every movie from the deleted actor or genre in the filter index"""
+    on_commit_if_indexed(filter_index.index.remove_key, sender._meta.model_name, instance.pk)
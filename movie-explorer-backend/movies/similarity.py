@@ -0,0 +1,511 @@
+"""
+Precomputed "more like this" neighbours.
+
+Every movie is a sparse feature vector over its actors, genres, director and
+release decade, each feature weighted by its kind (SIMILAR_MOVIES['WEIGHTS'])
+and the vector scaled to unit length, so the dot product of two rows is their
+cosine similarity. The TOP_K most similar movies of each movie are stored as
+ranked SimilarMovie rows, and reading them is one range scan of the
+(movie, rank) index.
+
+A full rebuild (`manage.py rebuild_similar_movies`) multiplies blocks of
+BATCH_SIZE rows by the whole matrix with SciPy and picks each row's top
+neighbours with NumPy. When a movie's cast, genres, director or year change
+(see movies.signals), refresh_movies() loads only the changed movies, the
+movies that listed them and the movies that can rank them or be ranked by
+them: those sharing a director or an actor with them, and the few sharing
+only genres or the decade that SQL finds can still matter, as they have few
+enough actors to outscore a changed movie's TOP_K-th neighbour or a low
+enough last stored score to take a changed movie in. The load stays small
+however many movies share a genre or a decade. It recomputes the changed movies' neighbours, and patches their new
+scores into the stored neighbours of the movies that listed them or now rank
+them high enough. No other pair's score changes, so the result matches a
+full rebuild; a movie whose stored TOP_K cannot be refilled that way is
+recomputed from its own neighbourhood.
+Refreshes run on a background thread once the write commits, so requests
+do not wait for them. Changing the settings needs a rebuild.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import LessThanOrEqual
+from scipy import sparse
+
+from . import pgcopy
+from .models import Movie, SimilarMovie, related_search_vectors
+from .versions import bump_versions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIMILAR_MOVIES = {
+    # Neighbours stored per movie
+    'TOP_K': 20,
+    # Weight of one shared feature of each kind
+    'WEIGHTS': {'actor': 1.0, 'director': 1.0, 'genre': 0.5, 'decade': 0.25},
+    # Movies scored per vectorized block; a block's scores against every movie are held at once
+    'BATCH_SIZE': 256,
+}
+
+
+# Slack for float32 rounding when computed scores are compared with exact bounds
+SCORE_TOLERANCE = 1e-5
+
+
+def get_similar_movies_settings():
+    return {**DEFAULT_SIMILAR_MOVIES, **getattr(settings, 'SIMILAR_MOVIES', {})}
+
+
+def build_matrix(weights, movie_ids=None):
+    """
+    Sorted movie ids and the L2-normalized CSR feature matrix with one row per
+    id, for every movie or only the existing ones of `movie_ids`
+    """
+    movies = Movie.objects.order_by('pk')
+    if movie_ids is not None:
+        movies = movies.filter(pk__in=movie_ids)
+    movies = np.array(list(movies.values_list('pk', 'director_id', 'release_year')), dtype=np.int64).reshape(-1, 3)
+    ids = movies[:, 0]
+    rows, columns, values = [], [], []
+    offset = 0
+
+    def add(kind, movie_ids, keys):
+        nonlocal offset
+        keys, columns_of = np.unique(keys, return_inverse=True)
+        rows.append(np.searchsorted(ids, movie_ids))
+        columns.append(columns_of.ravel() + offset)
+        values.append(np.full(len(movie_ids), weights[kind], dtype=np.float32))
+        offset += len(keys)
+
+    add('director', ids, movies[:, 1])
+    add('decade', ids, movies[:, 2] // 10)
+    for kind, relation in (('actor', Movie.actors), ('genre', Movie.genres)):
+        through = relation.through
+        column = relation.field.m2m_reverse_name()
+        links = through.objects.order_by()
+        if movie_ids is not None:
+            links = links.filter(movie_id__in=ids.tolist())
+        links = np.array(list(links.values_list('movie_id', column)), dtype=np.int64).reshape(-1, 2)
+        add(kind, links[:, 0], links[:, 1])
+
+    matrix = sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(len(ids), offset), dtype=np.float32,
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return ids, sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def movie_features(movie_ids):
+    """
+    (id, director id, release year, actor count, genre count) of each of the
+    existing `movie_ids`
+    """
+    movies = list(Movie.objects.filter(pk__in=movie_ids).order_by().values_list('pk', 'director_id', 'release_year'))
+    counts = {pk: [0, 0] for pk, _, _ in movies}
+    for i, relation in enumerate((Movie.actors, Movie.genres)):
+        for movie_id, count in (
+            relation.through.objects.filter(movie_id__in=list(counts)).order_by()
+            .values('movie_id').annotate(count=Count('pk')).values_list('movie_id', 'count')
+        ):
+            counts[movie_id][i] = count
+    return [(pk, director_id, year, *counts[pk]) for pk, director_id, year in movies]
+
+
+def strong_neighbors(features):
+    """
+    Ids of the movies sharing a director or an actor with the movie_features()
+    `features`, read through the indexes on those columns
+    """
+    near = set(Movie.objects.filter(director_id__in={feature[1] for feature in features})
+               .order_by().values_list('pk', flat=True))
+    through = Movie.actors.through
+    actors = through.objects.filter(movie_id__in=[feature[0] for feature in features]).values('actor_id')
+    near.update(through.objects.filter(actor_id__in=actors).order_by().values_list('movie_id', flat=True))
+    return near
+
+
+def weak_neighbors(features, *conditions):
+    """
+    Ids of the movies sharing a release decade or a genre with the
+    movie_features() `features` that meet every filter() condition of
+    `conditions`. Together with strong_neighbors() these are the only movies
+    scoring above 0 against them; with a condition, only the few that can
+    matter leave the database.
+    """
+    through = Movie.genres.through
+    genres = through.objects.filter(movie_id__in=[feature[0] for feature in features]).values('genre_id')
+    shared = Q(pk__in=through.objects.filter(genre_id__in=genres).values('movie_id'))
+    for decade in {feature[2] // 10 for feature in features}:
+        shared |= Q(release_year__gte=decade * 10, release_year__lt=decade * 10 + 10)
+    return set(Movie.objects.filter(shared, *conditions).order_by().values_list('pk', flat=True))
+
+
+def weak_score_bound(weights, actors, genres, other_actors=0):
+    """
+    Highest score a movie with `actors` actors and `genres` genres can have
+    against a movie with at least `other_actors` actors sharing neither its
+    director nor an actor: the other movie shares every genre and the decade,
+    and has no other feature besides its director.
+    """
+    shared = weights['genre'] ** 2 * genres + weights['decade'] ** 2
+    if not shared:
+        return 0
+    common = weights['director'] ** 2 + shared
+    return shared / np.sqrt((common + weights['actor'] ** 2 * actors) * (common + weights['actor'] ** 2 * other_actors))
+
+
+def weak_actor_limit(weights, actors, genres, score):
+    """
+    Most actors a movie sharing only genres and the decade with a movie of
+    `actors` actors and `genres` genres can have and still reach `score`
+    against it; None when any number can, -1 when none can
+    """
+    if score <= 0 or (weights['actor'] == 0 and weak_score_bound(weights, actors, genres) >= score):
+        return None
+    if weak_score_bound(weights, actors, genres) < score:
+        return -1
+    shared = weights['genre'] ** 2 * genres + weights['decade'] ** 2
+    common = weights['director'] ** 2 + shared
+    reach = (shared / score) ** 2 / (common + weights['actor'] ** 2 * actors)
+    return int((reach - common) / weights['actor'] ** 2)
+
+
+def actor_count_at_most(limit):
+    """weak_neighbors() condition: the movie has at most `limit` actors"""
+    through = Movie.actors.through
+    counts = through.objects.filter(movie_id=OuterRef('pk')).order_by().values('movie_id').annotate(
+        count=Count('pk')
+    ).values('count')
+    return LessThanOrEqual(Coalesce(Subquery(counts), 0), limit)
+
+
+def neighborhood_matrix(features, config, extra=()):
+    """
+    build_matrix() over the movie_features() `features`, `extra` and every
+    movie that can rank among their TOP_K neighbours. Besides the
+    strong_neighbors(), a movie sharing only genres or the decade must have
+    few enough actors for its weak_score_bound() to reach the TOP_K-th score
+    found among the others; usually no more than a handful of movies do, where
+    loading every weak_neighbors() would read most of the catalog.
+    """
+    weights, k = config['WEIGHTS'], config['TOP_K']
+    loaded = {feature[0] for feature in features} | set(extra) | strong_neighbors(features)
+    ids, matrix = build_matrix(weights, loaded)
+    rows = positions_of(ids, [feature[0] for feature in features])
+    kth = {}
+    for start in range(0, len(rows), config['BATCH_SIZE']):
+        sources, _, ranks, scores = top_neighbors(matrix, rows[start:start + config['BATCH_SIZE']], k)
+        kth.update(zip(ids[sources[ranks == k - 1]].tolist(), scores[ranks == k - 1].tolist()))
+    limit = -1
+    for pk, _, _, actors, genres in features:
+        movie_limit = weak_actor_limit(weights, actors, genres, kth.get(pk, 0) - SCORE_TOLERANCE)
+        if movie_limit is None:
+            limit = None
+            break
+        limit = max(limit, movie_limit)
+    if limit is not None and limit < 0:
+        return ids, matrix
+    near = weak_neighbors(features, *([] if limit is None else [actor_count_at_most(limit)]))
+    if near <= loaded:
+        return ids, matrix
+    return build_matrix(weights, loaded | near)
+
+
+def top_neighbors(matrix, rows, k):
+    """
+    (row, neighbour column, rank, score) arrays holding the up to `k` best
+    scoring other rows of each of `rows`, highest score (then lowest column)
+    first; rows sharing no feature are left out
+    """
+    return select_top((matrix[rows] @ matrix.T).tocsr(), rows, k)
+
+
+def select_top(product, rows, k):
+    """
+    top_neighbors() of a block of scores: `product` holds one sparse row of
+    scores against every column for each of `rows`; zero and negative scores
+    are left out
+    """
+    product.sort_indices()
+    sources, neighbors, ranks, scores = [], [], [], []
+    for i, row in enumerate(rows):
+        start, end = product.indptr[i], product.indptr[i + 1]
+        columns, values = product.indices[start:end], product.data[start:end]
+        keep = (columns != row) & (values > 0)
+        columns, values = columns[keep], values[keep]
+        if len(values) > k:
+            # Everything above the k-th best score, then as many ties with it as fit, lowest column first
+            kth = np.partition(values, len(values) - k)[len(values) - k]
+            above = values > kth
+            ties = np.flatnonzero(values == kth)[:k - above.sum()]
+            above[ties] = True
+            columns, values = columns[above], values[above]
+        order = np.lexsort((columns, -values))
+        sources.append(np.full(len(order), row))
+        neighbors.append(columns[order])
+        ranks.append(np.arange(len(order)))
+        scores.append(values[order])
+    if not sources:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty, np.array([], dtype=np.float32)
+    return np.concatenate(sources), np.concatenate(neighbors), np.concatenate(ranks), np.concatenate(scores)
+
+
+def neighbor_entries(ids, sources, neighbors, ranks, scores):
+    """top_neighbors() results as (movie id, neighbour id, rank, score) tuples, mapping matrix rows to `ids`"""
+    return list(zip(ids[sources].tolist(), ids[neighbors].tolist(), ranks.tolist(), scores.astype(float).tolist()))
+
+
+def insert_neighbors(entry_model, neighbor_field, ids, sources, neighbors, ranks, scores):
+    """
+    Insert top_neighbors() results as (movie, `neighbor_field`, rank, score)
+    rows of `entry_model`, mapping matrix rows to `ids`
+    """
+    insert_entries(entry_model, neighbor_field, neighbor_entries(ids, sources, neighbors, ranks, scores))
+
+
+def insert_entries(entry_model, neighbor_field, entries):
+    """
+    Insert (movie id, neighbour id, rank, score) tuples as rows of `entry_model`,
+    with COPY on PostgreSQL
+    """
+    columns = ('movie_id', f'{neighbor_field}_id', 'rank', 'score')
+    if connection.vendor == 'postgresql':
+        qn = connection.ops.quote_name
+        copy_sql = 'COPY {} ({}) FROM STDIN'.format(
+            qn(entry_model._meta.db_table), ', '.join(qn(column) for column in columns)
+        )
+        # Numbers only, so the rows are formatted in one pass rather than value by value
+        data = ''.join(map('%d\t%d\t%d\t%r\n'.__mod__, entries))
+        with connection.cursor() as cursor:
+            pgcopy.copy_data(cursor, copy_sql, data)
+    else:
+        entry_model.objects.bulk_create(
+            [entry_model(**dict(zip(columns, entry))) for entry in entries], batch_size=5000
+        )
+
+
+def write_neighbors(entry_model, ids, matrix, rows, config):
+    """
+    Compute and insert the neighbours of `rows` in blocks; returns the number
+    of entries written
+    """
+    written = 0
+    for start in range(0, len(rows), config['BATCH_SIZE']):
+        sources, neighbors, ranks, scores = top_neighbors(
+            matrix, rows[start:start + config['BATCH_SIZE']], config['TOP_K']
+        )
+        insert_neighbors(entry_model, 'similar', ids, sources, neighbors, ranks, scores)
+        written += len(sources)
+    return written
+
+
+def analyze(entry_model):
+    """Refresh the planner statistics of a rebuilt table on PostgreSQL"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE ' + connection.ops.quote_name(entry_model._meta.db_table))
+
+
+def positions_of(ids, movie_ids):
+    """Matrix rows of the `movie_ids` that are in `ids`"""
+    positions = np.searchsorted(ids, movie_ids)
+    found = positions < len(ids)
+    found[found] = ids[positions[found]] == np.asarray(movie_ids)[found]
+    return positions[found]
+
+
+def refresh_movies(movie_ids):
+    """
+    Recompute the neighbours of the given movies from their neighbourhood,
+    and patch in the new scores of every movie whose stored neighbours they
+    join or leave
+    """
+    changed = sorted(set(movie_ids))
+    if not changed:
+        return
+    config = get_similar_movies_settings()
+    k = config['TOP_K']
+    features = movie_features(changed)
+    # Movies that listed a changed movie may now rank it lower, or lost it
+    listers = set(SimilarMovie.objects.filter(similar_id__in=changed).order_by().values_list('movie_id', flat=True))
+    # A movie sharing only genres or the decade can only take up a changed movie whose score
+    # may reach its last stored neighbour's
+    bound = max((weak_score_bound(config['WEIGHTS'], *feature[3:]) for feature in features), default=0)
+    joiners = weak_neighbors(features, ~Exists(
+        SimilarMovie.objects.filter(movie_id=OuterRef('pk'), rank=k - 1, score__gt=bound + SCORE_TOLERANCE)
+    )) if bound > 0 else set()
+    ids, matrix = neighborhood_matrix(features, config, listers | joiners)
+    present = positions_of(ids, changed)
+
+    entries = []
+    # Best score of every loaded movie against any changed movie
+    best = np.zeros(len(ids), dtype=np.float32)
+    for start in range(0, len(present), config['BATCH_SIZE']):
+        block = present[start:start + config['BATCH_SIZE']]
+        product = (matrix[block] @ matrix.T).tocsr()
+        best = np.maximum(best, product.max(axis=0).toarray().ravel())
+        entries += neighbor_entries(ids, *select_top(product, block, k))
+    best[present] = 0
+    candidates = np.flatnonzero(best > 0)
+    # The score to beat is a movie's last stored neighbour's, or 0 while it has fewer than TOP_K
+    last_scores = dict(
+        SimilarMovie.objects.filter(movie_id__in=ids[candidates].tolist(), rank=k - 1)
+        .order_by().values_list('movie_id', 'score')
+    )
+    patched = listers.difference(changed)
+    patched.update(
+        movie_id for position, movie_id in zip(candidates.tolist(), ids[candidates].tolist())
+        if best[position] >= last_scores.get(movie_id, 0)
+    )
+    patched = sorted(patched)
+    patched_entries, recompute = patch_neighbors(ids, matrix, present, patched, k)
+    entries += patched_entries
+    if recompute:
+        ids, matrix = neighborhood_matrix(movie_features(recompute), config)
+        rows = positions_of(ids, recompute)
+        for start in range(0, len(rows), config['BATCH_SIZE']):
+            entries += neighbor_entries(ids, *top_neighbors(matrix, rows[start:start + config['BATCH_SIZE']], k))
+
+    with transaction.atomic(savepoint=False):
+        SimilarMovie.objects.filter(movie_id__in=changed + patched).delete()
+        insert_entries(SimilarMovie, 'similar', entries)
+        # Refreshes run after the write commits, so responses cached in between must not be reused
+        bump_versions(Movie)
+
+
+def patch_neighbors(ids, matrix, present, movie_ids, k):
+    """
+    New neighbour entries of the unchanged `movie_ids`: their stored
+    neighbours other than the changed movies at rows `present`, merged with
+    their new scores against those. Scores between unchanged movies stay the
+    same, so the merge matches a full rebuild unless the stored TOP_K were
+    full and the merge no longer fills them from stored or better entries.
+    Returns the entries and the movies that need recomputing instead.
+    """
+    changed = set(ids[present].tolist())
+    stored = {}
+    for movie_id, similar_id, score in SimilarMovie.objects.filter(movie_id__in=movie_ids).order_by(
+        'movie_id', 'rank'
+    ).values_list('movie_id', 'similar_id', 'score'):
+        stored.setdefault(movie_id, []).append((similar_id, score))
+
+    rows = positions_of(ids, movie_ids)
+    scores = (matrix[rows] @ matrix[present].T).tocsr()
+    scores.sort_indices()
+    row_of = dict(zip(ids[rows].tolist(), range(len(rows))))
+
+    def rank_key(entry):
+        # Highest score first, then lowest id, as select_top() ranks them
+        return -entry[1], entry[0]
+
+    entries, recompute = [], []
+    for movie_id in movie_ids:
+        listed = stored.get(movie_id, [])
+        merged = [(similar_id, score) for similar_id, score in listed if similar_id not in changed]
+        if movie_id in row_of:
+            i = row_of[movie_id]
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            merged += [
+                (similar_id, score)
+                for similar_id, score in zip(
+                    ids[present[scores.indices[start:end]]].tolist(), scores.data[start:end].astype(float).tolist()
+                )
+                if score > 0
+            ]
+        merged = sorted(merged, key=rank_key)[:k]
+        if len(listed) == k and (len(merged) < k or rank_key(merged[-1]) > rank_key(listed[-1])):
+            # Movies past the stored TOP_K may now belong
+            recompute.append(movie_id)
+        else:
+            entries += [(movie_id, similar_id, rank, score) for rank, (similar_id, score) in enumerate(merged)]
+    return entries, recompute
+
+
+# One refresh at a time, off the request path; changes queued while it runs are refreshed together next
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similar-movies')
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+def refresh_on_commit(movie_ids):
+    """
+    Refresh the given movies in the background once the current transaction
+    commits. The ids are captured with the callback, so a transaction only
+    ever hands over its own committed changes.
+    """
+    movie_ids = set(movie_ids)
+    if movie_ids:
+        transaction.on_commit(lambda: refresh_in_background(movie_ids))
+
+
+def refresh_in_background(movie_ids):
+    """
+    Queue a refresh of committed changes on the refresh thread. Inside a
+    transaction the refresh runs right away, as the thread would not see
+    its writes.
+    """
+    if connection.in_atomic_block:
+        refresh_movies(movie_ids)
+        return
+    with _queued_lock:
+        idle = not _queued
+        _queued.update(movie_ids)
+    if idle:
+        _executor.submit(_refresh_queued)
+
+
+def _refresh_queued():
+    with _queued_lock:
+        movie_ids = list(_queued)
+        _queued.clear()
+    try:
+        refresh_movies(movie_ids)
+    except Exception:
+        logger.exception('Refreshing the similar movies of %d movies failed', len(movie_ids))
+    finally:
+        connection.close()
+
+
+def wait_for_refreshes():
+    """Block until every queued refresh has run"""
+    _executor.submit(lambda: None).result()
+
+
+def rebuild():
+    """Recompute the neighbours of every movie; returns the number of entries written"""
+    config = get_similar_movies_settings()
+    ids, matrix = build_matrix(config['WEIGHTS'])
+    with transaction.atomic():
+        SimilarMovie.objects.all().delete()
+        written = write_neighbors(SimilarMovie, ids, matrix, np.arange(len(ids)), config)
+        # Without fresh statistics a freshly loaded table is read with sequential scans
+        analyze(SimilarMovie)
+    return written
+
+
+def similar_movies(movie_id, limit=10, select_related=('director',), prefetch_related=('genres',)):
+    """
+    The `limit` movies most similar to `movie_id` with the given relations
+    loaded, each carrying its `similarity_score`
+    """
+    related = ['similar', *[f'similar__{relation}' for relation in select_related]]
+    entries = (
+        SimilarMovie.objects.filter(movie_id=movie_id)
+        .order_by('rank')
+        .select_related(*related)
+        .defer(*related_search_vectors(SimilarMovie, related))
+        .prefetch_related(*[f'similar__{relation}' for relation in prefetch_related])[:limit]
+    )
+    movies = []
+    for entry in entries:
+        entry.similar.similarity_score = entry.score
+        movies.append(entry.similar)
+    return movies
@@ -0,0 +1,146 @@
+"""
+Deterministic synthetic catalog generator for benchmarks.
+
+Rows are written with bulk_create in batches, so model signals do not fire;
+the review aggregates, leaderboards, similar movies and recommendation
+neighbours are rebuilt and the cache versions bumped once at the end.
+"""
+import random
+
+from django.db import connection, transaction
+
+from . import filter_index, leaderboard, recommendations, similarity
+from .models import Actor, Director, Genre, Movie, RatingNeighbor, Review
+from .versions import bump_versions
+
+TITLE_WORDS = [
+    'Silent', 'River', 'Midnight', 'Empire', 'Shadow', 'Golden', 'Last', 'City', 'Broken', 'Dream',
+    'Winter', 'Fire', 'Lost', 'Kingdom', 'Storm', 'Hidden', 'Echo', 'Iron', 'Crimson', 'Ocean',
+    'Desert', 'Glass', 'Wild', 'Secret', 'Night', 'Summer', 'Stone', 'Electric', 'Paper', 'Velvet',
+    'Northern', 'Lights', 'Garden', 'Machine', 'Harbor', 'Ghost', 'Silver', 'Road', 'Falling', 'Star',
+]
+FIRST_NAMES = [
+    'Anna', 'Ben', 'Carla', 'David', 'Elena', 'Frank', 'Grace', 'Hugo', 'Iris', 'Jonas',
+    'Kate', 'Liam', 'Maya', 'Noah', 'Olivia', 'Paul', 'Quinn', 'Rosa', 'Samuel', 'Tara',
+    'Umar', 'Vera', 'Walter', 'Xenia', 'Yusuf', 'Zoe',
+]
+LAST_NAMES = [
+    'Anderson', 'Bergman', 'Castillo', 'Dubois', 'Eriksen', 'Fischer', 'Garcia', 'Hansen', 'Ivanova',
+    'Johnson', 'Kowalski', 'Larsen', 'Moreau', 'Nakamura', 'Okafor', 'Petrov', 'Quinlan', 'Rossi',
+    'Schmidt', 'Tanaka', 'Usman', 'Varga', 'Williams', 'Xu', 'Yilmaz', 'Zimmermann',
+]
+NATIONALITIES = ['American', 'British', 'French', 'German', 'Japanese', 'Italian', 'Canadian', 'Korean', 'Indian']
+GENRE_NAMES = [
+    'Action', 'Drama', 'Sci-Fi', 'Thriller', 'Crime', 'Adventure', 'Comedy', 'Horror', 'Romance',
+    'Fantasy', 'Mystery', 'Biography', 'War', 'Western', 'Animation', 'Documentary', 'Musical',
+    'Family', 'History', 'Sport',
+]
+
+
+def _person_name(rng, i):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}'
+
+
+def _skewed_sample(rng, population, k):
+    """Up to k distinct indexes, biased towards the start so some rows are far more popular"""
+    picks = {int(population * rng.random() ** 2) for _ in range(k)}
+    return sorted(picks)
+
+
+def _bulk_ids(model, objects, batch_size):
+    created = model.objects.bulk_create(objects, batch_size=batch_size)
+    return [obj.pk for obj in created]
+
+
+def generate_catalog(movies=1000, actors=None, directors=None, genres=20, actors_per_movie=5,
+                     genres_per_movie=2, reviews_per_movie=0, seed=42, batch_size=5000, progress=None):
+    """
+    Insert a reproducible catalog and return the number of rows created per table.
+
+    The same arguments always produce the same names, relations and ratings.
+    `progress(stage, done, total)` is called after every batch.
+    """
+    rng = random.Random(seed)
+    actors = actors or max(movies // 2, actors_per_movie)
+    directors = directors or max(movies // 10, 1)
+    reviewers = max(100, movies * reviews_per_movie // 20)
+    report = progress or (lambda stage, done, total: None)
+
+    genre_ids = _bulk_ids(Genre, [
+        Genre(name=GENRE_NAMES[i] if i < len(GENRE_NAMES) else f'{GENRE_NAMES[i % len(GENRE_NAMES)]} {i}')
+        for i in range(genres)
+    ], batch_size)
+    report('genres', genres, genres)
+
+    director_ids = []
+    for start in range(0, directors, batch_size):
+        director_ids += _bulk_ids(Director, [
+            Director(name=_person_name(rng, i), nationality=rng.choice(NATIONALITIES))
+            for i in range(start, min(start + batch_size, directors))
+        ], batch_size)
+        report('directors', len(director_ids), directors)
+
+    actor_ids = []
+    for start in range(0, actors, batch_size):
+        actor_ids += _bulk_ids(Actor, [
+            Actor(name=_person_name(rng, i), nationality=rng.choice(NATIONALITIES))
+            for i in range(start, min(start + batch_size, actors))
+        ], batch_size)
+        report('actors', len(actor_ids), actors)
+
+    MovieActor = Movie.actors.through
+    MovieGenre = Movie.genres.through
+    counts = {'genres': genres, 'directors': directors, 'actors': actors,
+              'movies': 0, 'cast_links': 0, 'genre_links': 0, 'reviews': 0}
+
+    for start in range(0, movies, batch_size):
+        with transaction.atomic():
+            batch = []
+            for i in range(start, min(start + batch_size, movies)):
+                quality = rng.random()
+                batch.append(Movie(
+                    title=f'{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {i}',
+                    release_year=rng.randint(1920, 2025),
+                    duration=rng.randint(80, 180),
+                    plot=' '.join(rng.choice(TITLE_WORDS).lower() for _ in range(12)),
+                    rating=round(2 + quality * 8, 1),
+                    director_id=director_ids[int(len(director_ids) * rng.random() ** 2)],
+                ))
+            movie_ids = _bulk_ids(Movie, batch, batch_size)
+
+            cast, tags, reviews = [], [], []
+            for movie_id, movie in zip(movie_ids, batch):
+                cast += [MovieActor(movie_id=movie_id, actor_id=actor_ids[i])
+                         for i in _skewed_sample(rng, len(actor_ids), actors_per_movie)]
+                tags += [MovieGenre(movie_id=movie_id, genre_id=genre_ids[i])
+                         for i in _skewed_sample(rng, len(genre_ids), genres_per_movie)]
+                base = float(movie.rating)
+                reviews += [
+                    Review(movie_id=movie_id, reviewer_name=f'reviewer{r}',
+                           rating=min(10, max(1, round(rng.gauss(base, 1.5)))),
+                           comment=' '.join(rng.choice(TITLE_WORDS).lower() for _ in range(8)))
+                    for r in rng.sample(range(reviewers), min(reviews_per_movie, reviewers))
+                ]
+            MovieActor.objects.bulk_create(cast, batch_size=batch_size)
+            MovieGenre.objects.bulk_create(tags, batch_size=batch_size)
+            Review.objects.bulk_create(reviews, batch_size=batch_size)
+
+        counts['movies'] += len(movie_ids)
+        counts['cast_links'] += len(cast)
+        counts['genre_links'] += len(tags)
+        counts['reviews'] += len(reviews)
+        report('movies', counts['movies'], movies)
+
+    if counts['reviews']:
+        Movie.objects.rebuild_review_aggregates()
+        leaderboard.rebuild()
+        recommendations.rebuild()
+    similarity.rebuild()
+    bump_versions(Movie, Review, Actor, Director, Genre, RatingNeighbor)
+    # Bulk loaded rows skip the model signals, so this process's filter index reloads on its next
+    # lookup; other processes only see them once theirs expire (FILTER_INDEX['MAX_AGE'])
+    filter_index.index.clear()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return counts
@@ -1,15 +1,47 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from decimal import Decimal
-from datetime import date
-from .models import Movie, Actor, Director, Genre, Review
+from datetime import date, datetime, timezone as dt_timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from .models import (
+    Movie, Actor, Director, Genre, Review, DataVersion, LeaderboardEntry, LeaderboardPrior, RatingNeighbor, SimilarMovie,
+)
+from .pagination import estimate_count
+from .querycount import QueryBudgetTestMixin
+from .renderers import FastJSONParser, FastJSONRenderer
+from .autocomplete import PrefixIndex, index as autocomplete_index
+from .bulk import BulkWriter
+from .filter_index import index as filter_index, title_rank
+from .leaderboard import refresh_movies as leaderboard_refresh_movies, top_movies
+from . import recommendations, similarity
+from .serializers import ActorSerializer, MovieListSerializer
+from .versions import bump_versions, get_versions
+from .views import ActorViewSet, DirectorViewSet, GenreViewSet, MovieViewSet
 
 
 class MovieAPITestCase(APITestCase):
     """Test cases for Movie API endpoints"""
     
     def setUp(self):
+        cache.clear()
         # Create test data
         self.director = Director.objects.create(
             name="Christopher Nolan",
@@ -42,13 +74,14 @@ class MovieAPITestCase(APITestCase):
         self.movie.actors.set([self.actor1, self.actor2])
         self.movie.genres.set([self.genre1, self.genre2])
         
-        self.review = Review.objects.create(
-            movie=self.movie,
-            reviewer_name="John Doe",
-            rating=9,
-            comment="Amazing movie!",
-            is_featured=True
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review = Review.objects.create(
+                movie=self.movie,
+                reviewer_name="John Doe",
+                rating=9,
+                comment="Amazing movie!",
+                is_featured=True
+            )
 
     def test_movie_list(self):
         """Test GET /api/movies/"""
@@ -180,6 +213,7 @@ class ActorAPITestCase(APITestCase):
     """Test cases for Actor API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.actor = Actor.objects.create(
             name="Tom Hanks",
             birth_date=date(1956, 7, 9),
@@ -266,6 +300,7 @@ class DirectorAPITestCase(APITestCase):
     """Test cases for Director API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.director = Director.objects.create(
             name="Quentin Tarantino",
             birth_date=date(1963, 3, 27),
@@ -333,6 +368,7 @@ class GenreAPITestCase(APITestCase):
     """Test cases for Genre API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.genre = Genre.objects.create(
             name="Horror",
             description="Horror movies that scare"
@@ -387,6 +423,7 @@ class ReviewAPITestCase(APITestCase):
     """Test cases for Review API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.director = Director.objects.create(name="Test Director")
         self.movie = Movie.objects.create(
             title="Test Movie",
@@ -487,6 +524,7 @@ class ValidationTestCase(APITestCase):
     """Test cases for data validation"""
     
     def setUp(self):
+        cache.clear()
         self.director = Director.objects.create(name="Test Director")
 
     def test_movie_invalid_year(self):
@@ -535,6 +573,7 @@ class PaginationTestCase(APITestCase):
     """Test cases for pagination"""
     
     def setUp(self):
+        cache.clear()
         self.director = Director.objects.create(name="Test Director")
         
         # Create multiple movies for pagination testing
@@ -589,3 +628,2307 @@ class ErrorHandlingTestCase(APITestCase):
         url = reverse('review-detail', kwargs={'pk': 999})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReviewAggregateTestCase(APITestCase):
+    """Test cases for the denormalized review aggregates on Movie"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.movie = Movie.objects.create(
+            title="Test Movie",
+            release_year=2023,
+            director=self.director
+        )
+        self.other_movie = Movie.objects.create(
+            title="Other Movie",
+            release_year=2022,
+            director=self.director
+        )
+
+    def assertAggregates(self, movie, count, total, average):
+        movie.refresh_from_db()
+        self.assertEqual(movie.review_count, count)
+        self.assertEqual(movie.review_rating_sum, total)
+        self.assertEqual(movie.avg_review_rating, average)
+
+    def test_stale_movie_save_keeps_aggregates(self):
+        """Test saving a movie loaded before its reviews does not reset the aggregates"""
+        stale = Movie.objects.get(pk=self.movie.pk)
+        Review.objects.create(movie=self.movie, reviewer_name="A", rating=8, comment="Good")
+        stale.title = "Renamed Movie"
+        stale.save()
+        self.assertAggregates(self.movie, 1, 8, 8.0)
+        self.assertEqual(self.movie.title, "Renamed Movie")
+
+    def test_aggregates_follow_review_lifecycle(self):
+        """Test create, update, move and delete of reviews"""
+        self.assertAggregates(self.movie, 0, 0, None)
+
+        first = Review.objects.create(movie=self.movie, reviewer_name="A", rating=8, comment="Good")
+        Review.objects.create(movie=self.movie, reviewer_name="B", rating=5, comment="Okay")
+        self.assertAggregates(self.movie, 2, 13, 6.5)
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 10
+        first.save()
+        self.assertAggregates(self.movie, 2, 15, 7.5)
+
+        first.movie = self.other_movie
+        first.save()
+        self.assertAggregates(self.movie, 1, 5, 5.0)
+        self.assertAggregates(self.other_movie, 1, 10, 10.0)
+
+        first.delete()
+        self.assertAggregates(self.other_movie, 0, 0, None)
+
+    def test_aggregates_updated_through_api(self):
+        """Test POST/PATCH/DELETE /api/reviews/ keep the movie aggregates current"""
+        url = reverse('review-list')
+        response = self.client.post(url, {
+            'movie': self.movie.pk,
+            'reviewer_name': 'Bob Smith',
+            'rating': 7,
+            'comment': 'Good movie'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertAggregates(self.movie, 1, 7, 7.0)
+
+        detail_url = reverse('review-detail', kwargs={'pk': response.data['id']})
+        self.client.patch(detail_url, {'rating': 9}, format='json')
+        self.assertAggregates(self.movie, 1, 9, 9.0)
+
+        self.client.delete(detail_url)
+        self.assertAggregates(self.movie, 0, 0, None)
+
+    def test_movie_list_reads_stored_aggregates(self):
+        """Test GET /api/movies/ serves aggregates without loading reviews"""
+        Review.objects.create(movie=self.movie, reviewer_name="A", rating=6, comment="Fine")
+        Review.objects.create(movie=self.movie, reviewer_name="B", rating=9, comment="Great")
+
+        response = self.client.get(reverse('movie-list'), {'title': 'Test Movie'})
+        result = response.data['results'][0]
+        self.assertEqual(result['review_count'], 2)
+        self.assertEqual(result['average_rating'], 7.5)
+
+    def test_rebuild_review_aggregates_command(self):
+        """Test the rebuild_review_aggregates management command"""
+        Review.objects.create(movie=self.movie, reviewer_name="A", rating=4, comment="Meh")
+        Movie.objects.update(review_count=0, review_rating_sum=0, avg_review_rating=None)
+
+        call_command('rebuild_review_aggregates', stdout=StringIO())
+        self.assertAggregates(self.movie, 1, 4, 4.0)
+        self.assertAggregates(self.other_movie, 0, 0, None)
+
+
+class MoviesCountTestCase(APITestCase):
+    """Test cases for the annotated movies_count on genres, directors and actors"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.genre = Genre.objects.create(name="Drama")
+        self.actor = Actor.objects.create(name="Test Actor")
+        for i in range(3):
+            movie = Movie.objects.create(
+                title=f"Movie {i}",
+                release_year=2020 + i,
+                director=self.director
+            )
+            movie.genres.add(self.genre)
+            movie.actors.add(self.actor)
+
+    def test_list_counts(self):
+        """Test movies_count on list endpoints"""
+        for name in ('genre-list', 'director-list', 'actor-list'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.data['results'][0]['movies_count'], 3)
+
+    def test_counts_not_inflated_by_relation_filters(self):
+        """Test movies_count stays distinct when filtering across movies"""
+        response = self.client.get(reverse('actor-list'), {'genre': 'Drama'})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['movies_count'], 3)
+
+    def test_counts_nested_in_movie_detail(self):
+        """Test movies_count on objects nested in the movie detail"""
+        movie = Movie.objects.first()
+        response = self.client.get(reverse('movie-detail', kwargs={'pk': movie.pk}))
+        self.assertEqual(response.data['genres'][0]['movies_count'], 3)
+        self.assertEqual(response.data['actors'][0]['movies_count'], 3)
+        self.assertEqual(response.data['director']['movies_count'], 3)
+
+    @override_settings(PAGINATION_COUNT={'ESTIMATE_THRESHOLD': None})
+    def test_genre_list_query_count(self):
+        """Test GET /api/genres/ does not issue a COUNT per genre"""
+        for i in range(5):
+            Genre.objects.create(name=f"Genre {i}")
+        # Data versions, count and page
+        with self.assertNumQueries(3):
+            self.client.get(reverse('genre-list'))
+
+
+@override_settings(PAGINATION_COUNT={'ESTIMATE_THRESHOLD': None})
+class QueryCountTestCase(QueryBudgetTestMixin, APITestCase):
+    """Pin the number of queries issued by every viewset action"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.genres = [Genre.objects.create(name=f"Genre {i}") for i in range(3)]
+        self.actors = [Actor.objects.create(name=f"Actor {i}") for i in range(3)]
+        self.movies = []
+        for i in range(5):
+            movie = Movie.objects.create(
+                title=f"Movie {i}",
+                release_year=2000 + i,
+                director=self.director
+            )
+            movie.genres.set(self.genres)
+            movie.actors.set(self.actors)
+            with self.captureOnCommitCallbacks(execute=True):
+                for j in range(3):
+                    Review.objects.create(
+                        movie=movie,
+                        reviewer_name=f"Reviewer {j}",
+                        rating=5 + j,
+                        comment="Comment",
+                        is_featured=j == 0
+                    )
+            self.movies.append(movie)
+        self.movie = self.movies[0]
+        self.review = self.movie.reviews.first()
+
+    def movie_payload(self, title):
+        return {
+            'title': title,
+            'release_year': 2020,
+            'director_id': self.director.pk,
+            'actor_ids': [actor.pk for actor in self.actors],
+            'genre_ids': [genre.pk for genre in self.genres],
+        }
+
+    def test_read_actions(self):
+        """Test GET endpoints stay within their query budgets"""
+        # Every budget includes the data version lookup of the conditional response
+        cases = [
+            (reverse('movie-list'), {}, 4),
+            (reverse('movie-list'), {'genre': 'Genre', 'actor': 'Actor'}, 4),
+            (reverse('movie-detail', kwargs={'pk': self.movie.pk}), {}, 6),
+            ('/api/movies/by_genre/', {'name': 'Genre'}, 4),
+            ('/api/movies/by_director/', {'name': 'Test'}, 4),
+            ('/api/movies/top_rated/', {}, 3),
+            ('/api/movies/facets/', {'genre_id': self.genres[0].pk, 'rating_gte': 5}, 6),
+            (reverse('actor-list'), {}, 3),
+            (reverse('actor-detail', kwargs={'pk': self.actors[0].pk}), {}, 4),
+            (reverse('director-list'), {}, 3),
+            (reverse('director-detail', kwargs={'pk': self.director.pk}), {}, 4),
+            (reverse('genre-list'), {}, 3),
+            (reverse('genre-detail', kwargs={'pk': self.genres[0].pk}), {}, 2),
+            (reverse('review-list'), {}, 3),
+            (reverse('review-detail', kwargs={'pk': self.review.pk}), {}, 2),
+            ('/api/reviews/featured/', {}, 3),
+        ]
+        for url, params, expected in cases:
+            with self.subTest(url=url, params=params):
+                with self.assertQueryBudget(exact=expected):
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_write_actions(self):
+        """Test POST/PUT/PATCH/DELETE endpoints stay within their query budgets"""
+        # Leaderboard refreshes of movie writes include one read of the stored prior mean; data version
+        # bumps and the leaderboard refreshes of review writes run once the write commits, which the
+        # test transaction never does
+        movie_url = reverse('movie-detail', kwargs={'pk': self.movie.pk})
+        review_url = reverse('review-detail', kwargs={'pk': self.review.pk})
+        genre_url = reverse('genre-detail', kwargs={'pk': self.genres[0].pk})
+        actor_url = reverse('actor-detail', kwargs={'pk': self.actors[0].pk})
+        director_url = reverse('director-detail', kwargs={'pk': self.director.pk})
+        cases = [
+            ('post', reverse('movie-list'), self.movie_payload('New Movie'), 12),
+            ('put', movie_url, self.movie_payload('Renamed Movie'), 13),
+            ('patch', movie_url, {'title': 'Patched Movie'}, 7),
+            ('post', reverse('review-list'), {
+                'movie': self.movie.pk, 'reviewer_name': 'New', 'rating': 7, 'comment': 'Nice'
+            }, 4),
+            ('patch', review_url, {'rating': 9}, 3),
+            ('post', reverse('genre-list'), {'name': 'New Genre'}, 3),
+            ('patch', genre_url, {'description': 'Updated'}, 2),
+            ('post', reverse('actor-list'), {'name': 'New Actor'}, 2),
+            ('patch', actor_url, {'nationality': 'British'}, 2),
+            ('post', reverse('director-list'), {'name': 'New Director'}, 2),
+            ('patch', director_url, {'nationality': 'British'}, 2),
+            ('delete', review_url, None, 3),
+            ('delete', movie_url, None, 10),
+        ]
+        for method, url, data, expected in cases:
+            with self.subTest(method=method, url=url):
+                with self.assertQueryBudget(exact=expected):
+                    response = getattr(self.client, method)(url, data, format='json')
+                self.assertLess(response.status_code, 300)
+
+    def test_query_budget_detects_n_plus_one(self):
+        """Test the assertion API reports repeated query shapes"""
+        with self.assertRaises(AssertionError):
+            with self.assertNoNPlusOne():
+                for movie in Movie.objects.all():
+                    movie.director.name
+
+
+class KeysetPaginationTestCase(APITestCase):
+    """Test cases for opt-in keyset (cursor) pagination"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        for i in range(11):
+            Movie.objects.create(
+                title=f"Movie {i % 4}",
+                release_year=2000 + i % 3,
+                rating=None if i % 5 == 0 else Decimal(i % 4),
+                director=self.director
+            )
+
+    def collect(self, params):
+        """Follow next links from the first page and return the ids served"""
+        ids = []
+        response = self.client.get(reverse('movie-list'), {'cursor': '', 'page_size': 3, **params})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(movie['id'] for movie in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_keyset_orderings(self):
+        """Test every exposed ordering walks the full result set in order"""
+        for ordering in ('release_year', '-release_year', 'title', '-title',
+                         'rating', '-rating', 'created_at', '-created_at'):
+            with self.subTest(ordering=ordering):
+                field = ordering.lstrip('-')
+                if ordering.startswith('-'):
+                    order_by = [F(field).desc(nulls_first=True), '-pk']
+                else:
+                    order_by = [F(field).asc(nulls_last=True), 'pk']
+                expected = list(Movie.objects.order_by(*order_by).values_list('pk', flat=True))
+                self.assertEqual(self.collect({'ordering': ordering}), expected)
+
+    def test_seek_is_index_range_scan(self):
+        """Test cursor pages start their index scan at the cursor instead of filtering the whole index"""
+        if connection.vendor != 'postgresql':
+            self.skipTest('EXPLAIN output is PostgreSQL specific')
+        # Title can also be seeked through the (title, release_year, director) unique index
+        for ordering, index in (('rating', 'movie_rating_id_idx'), ('-release_year', 'movie_release_year_id_idx'),
+                                ('title', '(movie_title_id_idx|movies_movie_title_release_year_director_id_\\w+)')):
+            with self.subTest(ordering=ordering):
+                response = self.client.get(reverse('movie-list'), {'cursor': '', 'page_size': 3, 'ordering': ordering})
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(response.data['next'])
+                field = ordering.lstrip('-')
+                sql = next(query['sql'] for query in queries if 'FROM "movies_movie" ' in query['sql'])
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                    cursor.execute('SET LOCAL enable_sort = off')
+                    cursor.execute('EXPLAIN ' + sql)
+                    plan = '\n'.join(row[0] for row in cursor.fetchall())
+                self.assertRegex(plan, rf'Index (Only )?Scan (Backward )?using {index} on movies_movie')
+                self.assertRegex(plan, rf'Index Cond: \(\(?{field}(\)::text)? [<>]= ')
+
+    def test_keyset_respects_filters(self):
+        """Test keyset pages only contain filtered movies"""
+        ids = self.collect({'release_year': 2001, 'ordering': 'title'})
+        expected = Movie.objects.filter(release_year=2001).values_list('pk', flat=True)
+        self.assertEqual(sorted(ids), sorted(expected))
+
+    def test_keyset_skips_count_query(self):
+        """Test keyset pages run a single query and no COUNT"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('review-list'), {'cursor': ''})
+        # The page and the data version lookup of the conditional response
+        self.assertEqual(len(queries), 2)
+        self.assertFalse([query for query in queries if 'COUNT' in query['sql']])
+
+    def test_invalid_cursor(self):
+        """Test malformed cursors and cursors for another ordering are rejected"""
+        response = self.client.get(reverse('movie-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('movie-list'), {'cursor': '', 'page_size': 3})
+        cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        response = self.client.get(reverse('movie-list'), {'cursor': cursor, 'ordering': 'title'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_contract_unchanged(self):
+        """Test requests without a cursor keep page-number pagination"""
+        response = self.client.get(reverse('movie-list'), {'page': 2, 'page_size': 5})
+        self.assertEqual(response.data['count'], 11)
+        self.assertEqual(len(response.data['results']), 5)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class PaginationCountTestCase(APITestCase):
+    """Test cases for the cached/estimated pagination count"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        for i in range(3):
+            Movie.objects.create(title=f"Movie {i}", release_year=2020, director=self.director)
+
+    def count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('movie-list'), params or {})
+        return response, [q for q in queries if 'COUNT(*)' in q['sql']]
+
+    def test_count_is_exact_flag(self):
+        """Test page-number responses flag exact counts"""
+        response, _ = self.count_queries()
+        self.assertEqual(response.data['count'], 3)
+        self.assertTrue(response.data['count_is_exact'])
+
+    @override_settings(PAGINATION_COUNT={'CACHE_MIN_COUNT': 1})
+    def test_count_cached_per_filter_set(self):
+        """Test repeated filter sets reuse the cached count"""
+        _, counts = self.count_queries({'release_year': 2020, 'page': 1})
+        self.assertEqual(len(counts), 1)
+        _, counts = self.count_queries({'page': 1, 'release_year': 2020, 'ordering': 'title'})
+        self.assertEqual(len(counts), 0)
+        _, counts = self.count_queries({'release_year': 2021})
+        self.assertEqual(len(counts), 1)
+
+    @override_settings(PAGINATION_COUNT={'CACHE_MIN_COUNT': 1})
+    def test_cached_count_invalidated_by_writes(self):
+        """Test writes to any table the query reads invalidate cached counts"""
+        genre = Genre.objects.create(name="Drama")
+        movies = list(Movie.objects.all())
+        movies[0].genres.add(genre)
+        response, counts = self.count_queries({'genre': 'Drama'})
+        self.assertEqual((len(counts), response.data['count']), (1, 1))
+
+        response, counts = self.count_queries({'genre': 'Drama'})
+        self.assertEqual((len(counts), response.data['count']), (0, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movies[1].genres.add(genre)
+        response, counts = self.count_queries({'genre': 'Drama'})
+        self.assertEqual((len(counts), response.data['count']), (1, 2))
+
+    @override_settings(PAGINATION_COUNT={'ESTIMATE_THRESHOLD': 1})
+    def test_low_estimate_keeps_later_pages(self):
+        """Test pages past a too low estimate are still served and linked, on the sync and async routes"""
+        with patch('movies.pagination.estimate_count', return_value=1):
+            for route in ('movie-list', 'async-movie-list'):
+                with self.subTest(route=route):
+                    pages = []
+                    for page in (1, 2, 3):
+                        response = self.client.get(reverse(route), {'page': page, 'page_size': 1})
+                        self.assertEqual(response.status_code, status.HTTP_200_OK)
+                        data = response.json()
+                        self.assertEqual((data['count'], data['count_is_exact']), (1, False))
+                        pages.append((len(data['results']), data['next'] is not None))
+                    self.assertEqual(pages, [(1, True), (1, True), (1, False)])
+                    response = self.client.get(reverse(route), {'page': 4, 'page_size': 1})
+                    self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_estimate_count(self):
+        """Test planner estimates are PostgreSQL-only and skipped for small tables"""
+        if connection.vendor != 'postgresql':
+            self.assertIsNone(estimate_count(Movie.objects.all()))
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE movies_movie')
+        cache.delete(f'movies:reltuples:{connection.alias}:movies_movie')
+        self.assertEqual(estimate_count(Movie.objects.all()), 3)
+        self.assertIsNotNone(estimate_count(Movie.objects.filter(release_year=2020)))
+        self.assertIsNone(estimate_count(Movie.objects.filter(release_year=2020), min_rows=100))
+
+
+class TrigramLookupTestCase(APITestCase):
+    """Test cases for the trgm_icontains lookup behind the text filters"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Greta Gerwig")
+        Movie.objects.create(title="Lady Bird", release_year=2017, director=self.director)
+        Movie.objects.create(title="100% Wolf", release_year=2020, director=self.director)
+
+    def test_matches_icontains(self):
+        """Test the lookup returns exactly what icontains returns"""
+        for term in ('lady', 'BIRD', 'y b', '%', '_', 'wolf', 'missing'):
+            with self.subTest(term=term):
+                self.assertQuerySetEqual(
+                    Movie.objects.filter(title__trgm_icontains=term).order_by('pk'),
+                    Movie.objects.filter(title__icontains=term).order_by('pk'),
+                )
+
+    def test_sql_is_index_friendly_on_postgresql(self):
+        """Test PostgreSQL gets a bare ILIKE the pg_trgm index can serve"""
+        sql = str(Movie.objects.filter(title__trgm_icontains='bird').query)
+        if connection.vendor == 'postgresql':
+            self.assertIn('"movies_movie"."title" ILIKE', sql)
+            self.assertNotIn('UPPER', sql)
+
+    def test_filters_use_lookup(self):
+        """Test the API text filters still match case-insensitively"""
+        response = self.client.get(reverse('movie-list'), {'director': 'gerwig', 'title': 'BIRD'})
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class SearchAPITestCase(APITestCase):
+    """Test cases for GET /api/search/"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Denis Villeneuve", biography="Directed Arrival")
+        self.actor = Actor.objects.create(name="Amy Adams", biography="Starred in Arrival")
+        self.movie = Movie.objects.create(
+            title="Arrival",
+            release_year=2016,
+            plot="A linguist works with the military to communicate with alien lifeforms",
+            director=self.director
+        )
+        Review.objects.create(movie=self.movie, reviewer_name="Critic", rating=9,
+                              comment="The alien language scenes are stunning")
+
+    def test_search_mixed_types(self):
+        """Test one search returns movies, people and reviews"""
+        response = self.client.get(reverse('search'), {'q': 'arrival'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        types = {result['type'] for result in response.data['results']}
+        self.assertEqual(types, {'movie', 'actor', 'director'})
+        self.assertEqual(response.data['results'][0]['type'], 'movie')
+        self.assertEqual(response.data['results'][0]['id'], self.movie.pk)
+
+    def test_search_review_links_movie(self):
+        """Test review hits reference their movie"""
+        response = self.client.get(reverse('search'), {'q': 'language', 'types': 'review'})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['movie_id'], self.movie.pk)
+
+    def test_search_tracks_updates(self):
+        """Test edited rows are searchable under their new text"""
+        self.movie.title = "Story of Your Life"
+        self.movie.save()
+        response = self.client.get(reverse('search'), {'q': 'story', 'types': 'movie'})
+        self.assertEqual([r['id'] for r in response.data['results']], [self.movie.pk])
+
+    def test_search_requires_query(self):
+        """Test GET /api/search/ without q"""
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reads_skip_search_vectors(self):
+        """Test detail, list and review reads do not select the search_vector columns"""
+        urls = [
+            reverse('movie-detail', args=[self.movie.pk]),
+            reverse('movie-list'),
+            reverse('actor-detail', args=[self.actor.pk]),
+            reverse('director-detail', args=[self.director.pk]),
+            reverse('review-list'),
+        ]
+        for url in urls:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            self.assertFalse([query['sql'] for query in queries if 'search_vector' in query['sql']])
+
+    def test_precomputed_reads_skip_search_vectors(self):
+        """Test top rated and similar movie reads defer the joined movies' search_vector columns"""
+        with CaptureQueriesContext(connection) as queries:
+            top_movies(select_related=('director',))
+            similarity.similar_movies(self.movie.pk, select_related=('director',))
+        self.assertEqual(len(queries), 2)
+        self.assertFalse([query['sql'] for query in queries if 'search_vector' in query['sql']])
+
+    def test_deferred_save(self):
+        """Test saving a movie loaded without its search_vector does not load it"""
+        movie = Movie.objects.get(pk=self.movie.pk)
+        movie.title = "Story of Your Life"
+        with CaptureQueriesContext(connection) as queries:
+            movie.save()
+        self.assertFalse([query['sql'] for query in queries if 'search_vector' in query['sql']])
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).title, "Story of Your Life")
+
+
+class AutocompleteAPITestCase(APITestCase):
+    """Test cases for GET /api/autocomplete/"""
+
+    def setUp(self):
+        cache.clear()
+        autocomplete_index.clear()
+        self.addCleanup(autocomplete_index.clear)
+        self.director = Director.objects.create(name="Hannah Moore")
+        self.actor = Actor.objects.create(name="Tom Hanks")
+        self.movie = Movie.objects.create(title="Amélie", release_year=2001, director=self.director)
+        self.popular = Movie.objects.create(title="Hangover Square", release_year=1945, director=self.director)
+        self.popular.actors.add(self.actor)
+        Review.objects.create(movie=self.popular, reviewer_name="Critic", rating=8)
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(result['type'], result['label']) for result in response.data['results']]
+
+    def test_matches_any_word_start_by_popularity(self):
+        """Test prefixes match the start of any word, most popular first"""
+        self.assertEqual(self.suggest('han'), [
+            ('director', 'Hannah Moore'),
+            ('movie', 'Hangover Square'),
+            ('actor', 'Tom Hanks'),
+        ])
+        self.assertEqual(self.suggest('han', types='actor,genre', limit=1), [('actor', 'Tom Hanks')])
+
+    def test_normalizes_accents_and_case(self):
+        """Test lookups ignore accents, case and extra whitespace"""
+        self.assertEqual(self.suggest('  AMELIE '), [('movie', 'Amélie')])
+
+    def test_lookups_do_not_query_database(self):
+        """Test suggestions are served from memory once the index is loaded"""
+        self.suggest('han')
+        with self.assertNumQueries(0):
+            self.suggest('tom')
+
+    def test_index_follows_writes(self):
+        """Test creates, renames, deletes and new reviews update the loaded index"""
+        self.suggest('han')
+        with self.captureOnCommitCallbacks(execute=True):
+            Actor.objects.create(name="Hank Azaria")
+            self.actor.name = "Thomas Hanks"
+            self.actor.save()
+            self.director.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            director = Director.objects.create(name="Peter Hyams")
+            movie = Movie.objects.create(title="Hanover Street", release_year=1979, director=director)
+            Review.objects.create(movie=movie, reviewer_name="A", rating=6)
+            Review.objects.create(movie=movie, reviewer_name="B", rating=7)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('han'), [
+                ('movie', 'Hanover Street'),
+                ('actor', 'Thomas Hanks'),
+                ('actor', 'Hank Azaria'),
+            ])
+
+    def test_reload_keeps_serving(self):
+        """Test an expired index answers lookups and takes writes while another thread reloads it"""
+        reloading, release, released = threading.Event(), threading.Event(), []
+
+        def loader():
+            if prefix_index.is_loaded:
+                reloading.set()
+                released.append(release.wait(5))
+            return [('actor', 1, 'Tom Hanks', 3)]
+
+        prefix_index = PrefixIndex(loader=loader)
+        prefix_index.load()
+        prefix_index.loaded_at -= 3600
+        reload = threading.Thread(target=prefix_index.ensure_loaded)
+        reload.start()
+        self.addCleanup(reload.join)
+        self.addCleanup(release.set)
+        self.assertTrue(reloading.wait(5))
+
+        prefix_index.upsert('actor', 2, 'Hank Azaria')
+        self.assertEqual([result['label'] for result in prefix_index.lookup('han')], ['Tom Hanks', 'Hank Azaria'])
+        release.set()
+        reload.join()
+        # The lookups and the write above did not wait for the reload
+        self.assertEqual(released, [True])
+        self.assertFalse(prefix_index.is_stale())
+        # The write made during the reload is replayed on the new index
+        self.assertEqual([result['label'] for result in prefix_index.lookup('han')], ['Tom Hanks', 'Hank Azaria'])
+
+    @patch('movies.autocomplete.TOP_MIN_RANGE', 0)
+    @patch('movies.autocomplete.TOP_LIMIT', 3)
+    def test_top_names_follow_writes(self):
+        """Test the kept top names of wide prefixes stay equal to a full scan through every kind of write"""
+        prefix_index = PrefixIndex(loader=lambda: [
+            ('actor', pk, f'Actor {pk}', pk % 4) for pk in range(8)
+        ] + [('movie', pk, f'Movie {pk}', 0) for pk in range(3)])
+        prefix_index.load()
+
+        def check():
+            for prefix in ('a', 'actor', 'm', '1'):
+                for limit in (1, 3, 5):
+                    with self.subTest(prefix=prefix, limit=limit):
+                        tops = prefix_index.lookup(prefix, limit=limit)
+                        with patch('movies.autocomplete.TOP_LIMIT', 0):
+                            self.assertEqual(tops, prefix_index.lookup(prefix, limit=limit))
+
+        check()
+        self.assertIn('a', prefix_index._tops)
+        prefix_index.adjust_weight('actor', 0, 5)
+        self.assertIn('a', prefix_index._tops)
+        check()
+        # Pushing a name out of a full list keeps the bucket; demoting one drops it until the next lookup
+        prefix_index.adjust_weight('actor', 3, -3)
+        self.assertNotIn('a', prefix_index._tops)
+        check()
+        prefix_index.upsert('actor', 20, 'Actor Twenty', 9)
+        prefix_index.upsert('actor', 1, 'Movie Star')
+        prefix_index.remove('actor', 0)
+        prefix_index.upsert('movie', 1, 'Another Movie', 2)
+        check()
+
+    def test_failed_load_stops_recording(self):
+        """Test writes are not journaled forever after a load fails"""
+        def loader():
+            raise DatabaseError('unavailable')
+
+        prefix_index = PrefixIndex(loader=loader)
+        with self.assertRaises(DatabaseError):
+            prefix_index.ensure_loaded()
+        self.assertFalse(prefix_index.is_tracking)
+        prefix_index.upsert('actor', 1, 'Tom Hanks')
+        self.assertIsNone(prefix_index._changes)
+
+    def test_requires_query(self):
+        """Test GET /api/autocomplete/ without q"""
+        response = self.client.get(reverse('autocomplete'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResponseCacheTestCase(APITestCase):
+    """Test cases for the cached read-only API responses"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.genre = Genre.objects.create(name="Drama")
+        self.movie = Movie.objects.create(title="Test Movie", release_year=2020, director=self.director)
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_repeated_request_served_from_cache(self):
+        """Test identical requests are served with only the data version lookup"""
+        first, _ = self.get(reverse('genre-list'), {'name': 'dra', 'page': 1})
+        second, queries = self.get(reverse('genre-list'), {'page': 1, 'name': 'dra'})
+        self.assertEqual((first['X-Cache'], second['X-Cache'], queries), ('MISS', 'HIT', 1))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+    def test_writes_invalidate_dependent_responses(self):
+        """Test saves, deletes and relation changes invalidate every response that shows them"""
+        url = reverse('genre-detail', args=[self.genre.pk])
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.genres.add(self.genre)
+        response, _ = self.get(url)
+        self.assertEqual((response['X-Cache'], response.json()['movies_count']), ('MISS', 1))
+
+        url = reverse('movie-top-rated')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(movie=self.movie, reviewer_name="Critic", rating=8)
+        response, _ = self.get(url)
+        self.assertEqual((response['X-Cache'], response.json()[0]['average_rating']), ('MISS', 8.0))
+
+        url = reverse('director-list')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.director.delete()
+        response, _ = self.get(url)
+        self.assertEqual((response['X-Cache'], response.json()['count']), ('MISS', 0))
+
+    def test_versions_shared_between_processes(self):
+        """Test a version bumped by another process (a management command, another worker) invalidates responses"""
+        url = reverse('movie-list')
+        self.get(url)
+        # What bump_versions in another process leaves behind: the local cache is untouched
+        DataVersion.objects.filter(model='movies.movie').update(version=F('version') + 1)
+        response, _ = self.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_versions_bumped_on_commit(self):
+        """Test versions move once the write commits, and forward even when the clock went back"""
+        before = get_versions([Movie])['movies.movie']
+        with self.captureOnCommitCallbacks() as callbacks:
+            bump_versions(Movie)
+        self.assertEqual(get_versions([Movie])['movies.movie'], before)
+        with patch('movies.versions.time.time_ns', return_value=0):
+            callbacks[0]()
+        self.assertEqual(get_versions([Movie])['movies.movie'], before + 1)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_cached_per_host_and_scheme(self):
+        """Test responses with absolute links are not replayed to another host or scheme"""
+        Movie.objects.bulk_create([
+            Movie(title=f"Movie {i}", release_year=2000 + i, director=self.director) for i in range(25)
+        ])
+        url = reverse('movie-list')
+        self.client.get(url)
+        for extra in ({'HTTP_HOST': 'api.example.com'}, {'secure': True}):
+            with self.subTest(**extra):
+                response = self.client.get(url, **extra)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertEqual(response.json()['next'], response.wsgi_request.build_absolute_uri(f'{url}?page=2'))
+
+    def test_unrelated_writes_keep_cached_responses(self):
+        """Test writes to models a view does not show leave its cache intact"""
+        self.get(reverse('genre-list'))
+        Actor.objects.create(name="Test Actor")
+        response, _ = self.get(reverse('genre-list'))
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_browsable_api_not_cached(self):
+        """Test only JSON responses are cached"""
+        self.client.get(reverse('genre-list'), {'format': 'api'})
+        response = self.client.get(reverse('genre-list'), {'format': 'api'})
+        self.assertNotIn('X-Cache', response)
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': False})
+    def test_disabled(self):
+        """Test RESPONSE_CACHE['ENABLED'] turns caching off"""
+        self.get(reverse('genre-list'))
+        _, queries = self.get(reverse('genre-list'))
+        self.assertGreater(queries, 0)
+
+
+class ConditionalRequestTestCase(APITestCase):
+    """Test cases for ETag / Last-Modified conditional GETs"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.movie = Movie.objects.create(title="Test Movie", release_year=2020, director=self.director)
+        self.review = Review.objects.create(movie=self.movie, reviewer_name="Critic", rating=7)
+
+    def test_etag_revalidation(self):
+        """Test a matching If-None-Match gets a 304 with only the data version lookup, until a write"""
+        url = reverse('review-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.title = "Renamed"
+            self.movie.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_follows_other_processes(self):
+        """Test a version bumped by another process (a management command, another worker) changes the ETag"""
+        url = reverse('movie-detail', args=[self.movie.pk])
+        etag = self.client.get(url)['ETag']
+        # What bump_versions in another process leaves behind: this process's cache is untouched
+        DataVersion.objects.filter(model='movies.movie').update(version=F('version') + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_varies_with_query(self):
+        """Test each route and filter set gets its own ETag"""
+        etags = {
+            self.client.get(reverse('movie-list'))['ETag'],
+            self.client.get(reverse('movie-list'), {'release_year': 2020})['ETag'],
+            self.client.get(reverse('movie-detail', args=[self.movie.pk]))['ETag'],
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_last_modified(self):
+        """Test Last-Modified is sent once the last write's second has passed and honours If-Modified-Since"""
+        url = reverse('director-detail', args=[self.director.pk])
+        with patch('movies.caching.time.time', return_value=time.time() + 2):
+            response = self.client.get(url)
+            last_modified = response['Last-Modified']
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.director.save()
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_errors_not_tagged(self):
+        """Test unsuccessful responses carry no validators"""
+        response = self.client.get(reverse('movie-detail', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(LEADERBOARD={'MIN_VOTES': 1, 'PRIOR_VOTES': 2, 'PRIOR_MEAN': 5})
+class LeaderboardTestCase(APITestCase):
+    """Test cases for the precomputed top-rated leaderboards"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.drama = Genre.objects.create(name="Drama")
+        self.comedy = Genre.objects.create(name="Comedy")
+        # One perfect review vs. many very good ones
+        self.lucky = self.create_movie("Lucky", 1994, [10], [self.drama])
+        self.solid = self.create_movie("Solid", 2003, [9, 9, 9, 9], [self.drama, self.comedy])
+        self.unrated = self.create_movie("Unrated", 1995, [], [self.comedy])
+
+    def create_movie(self, title, year, ratings, genres):
+        movie = Movie.objects.create(title=title, release_year=year, rating=Decimal('9.9'), director=self.director)
+        movie.genres.set(genres)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, rating in enumerate(ratings):
+                Review.objects.create(movie=movie, reviewer_name=f"Reviewer {i}", rating=rating, comment="Comment")
+        return movie
+
+    def top(self, **params):
+        response = self.client.get(reverse('movie-top-rated'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(movie['title'], round(movie['score'], 3)) for movie in response.json()]
+
+    def test_bayesian_ranking(self):
+        """Test scores shrink movies with few reviews towards the prior mean"""
+        self.assertEqual(self.top(), [('Solid', round((36 + 10) / 6, 3)), ('Lucky', round((10 + 10) / 3, 3))])
+
+    def test_genre_and_decade_boards(self):
+        """Test per-genre and per-decade leaderboards"""
+        self.assertEqual([title for title, _ in self.top(genre_id=self.comedy.pk)], ['Solid'])
+        self.assertEqual([title for title, _ in self.top(decade=1999)], ['Lucky'])
+        self.assertEqual(self.top(decade=1980), [])
+
+    def test_incremental_refresh(self):
+        """Test review, genre and release year changes update the boards"""
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(movie=self.unrated, reviewer_name="Fan", rating=10, comment="Wow")
+        self.assertEqual([title for title, _ in self.top(genre_id=self.comedy.pk)], ['Solid', 'Unrated'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.rating = 1
+            review.save()
+        self.assertEqual(self.top(genre_id=self.comedy.pk)[1], ('Unrated', round((1 + 10) / 3, 3)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+            self.lucky.refresh_from_db()
+            self.lucky.genres.add(self.comedy)
+            self.solid.refresh_from_db()
+            self.solid.release_year = 1990
+            self.solid.save()
+        self.assertEqual([title for title, _ in self.top(genre_id=self.comedy.pk)], ['Solid', 'Lucky'])
+        self.assertEqual([title for title, _ in self.top(decade=1990)], ['Solid', 'Lucky'])
+        self.assertEqual(self.top(decade=2000), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.comedy.movies.clear()
+        self.assertEqual(self.top(genre_id=self.comedy.pk), [])
+
+    @override_settings(LEADERBOARD={'MIN_VOTES': 2, 'PRIOR_VOTES': 2, 'PRIOR_MEAN': 5})
+    def test_minimum_votes(self):
+        """Test movies need MIN_VOTES reviews to be ranked"""
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        self.assertEqual([title for title, _ in self.top()], ['Solid'])
+
+    def test_rebuild_matches_incremental(self):
+        """Test a full rebuild produces the incrementally maintained entries"""
+        fields = ('scope', 'scope_key', 'movie_id', 'score')
+        incremental = sorted(LeaderboardEntry.objects.values_list(*fields))
+        out = StringIO()
+        call_command('rebuild_leaderboard', stdout=out)
+        self.assertEqual(sorted(LeaderboardEntry.objects.values_list(*fields)), incremental)
+        self.assertIn('Wrote 7 leaderboard entries', out.getvalue())
+
+    @override_settings(LEADERBOARD={'MIN_VOTES': 1, 'PRIOR_VOTES': 2, 'PRIOR_MEAN': None})
+    def test_prior_mean_kept_in_database(self):
+        """Test incremental updates score against the prior mean of the last rebuild, not a cached one"""
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        prior = (10 + 36) / 5
+        self.assertEqual(LeaderboardPrior.objects.get().mean, prior)
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(movie=self.unrated, reviewer_name="Fan", rating=1, comment="Meh")
+        self.assertEqual(self.top(genre_id=self.comedy.pk)[1], ('Unrated', round((1 + 2 * prior) / 3, 3)))
+
+    def test_single_indexed_read(self):
+        """Test a board is read with one query plus the genre prefetch and the data version lookup"""
+        with self.assertNumQueries(3):
+            self.top(genre_id=self.drama.pk, limit=1)
+
+    def test_invalid_parameters(self):
+        """Test non-integer and conflicting parameters are rejected"""
+        for params in ({'genre_id': 'drama'}, {'genre_id': self.drama.pk, 'decade': 1990}):
+            response = self.client.get(reverse('movie-top-rated'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.json())
+
+    def test_review_writes_refresh_on_commit(self):
+        """Test review writes rewrite the boards once their transaction commits, not inside it"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Review.objects.create(movie=self.unrated, reviewer_name="Fan", rating=10, comment="Wow")
+        self.assertFalse(LeaderboardEntry.objects.filter(movie=self.unrated).exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual([title for title, _ in self.top(genre_id=self.comedy.pk)], ['Solid', 'Unrated'])
+
+
+class FacetsTestCase(APITestCase):
+    """Test cases for the movie facet counts"""
+
+    def setUp(self):
+        cache.clear()
+        self.nolan = Director.objects.create(name="Nolan")
+        self.scott = Director.objects.create(name="Scott")
+        self.drama = Genre.objects.create(name="Drama")
+        self.scifi = Genre.objects.create(name="Sci-Fi")
+        for title, year, rating, director, genres in (
+            ("Memento", 2000, Decimal('8.4'), self.nolan, [self.drama]),
+            ("Interstellar", 2014, Decimal('8.7'), self.nolan, [self.drama, self.scifi]),
+            ("Alien", 1979, Decimal('8.5'), self.scott, [self.scifi]),
+            ("Legend", 1985, Decimal('6.4'), self.scott, []),
+            ("Following", 1998, None, self.nolan, [self.drama]),
+        ):
+            Movie.objects.create(
+                title=title, release_year=year, rating=rating, director=director
+            ).genres.set(genres)
+
+    def facets(self, **params):
+        response = self.client.get(reverse('movie-facets'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_unfiltered_counts(self):
+        """Test every facet counts the whole catalog"""
+        data = self.facets()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['genres'], [
+            {'id': self.drama.pk, 'name': 'Drama', 'count': 3},
+            {'id': self.scifi.pk, 'name': 'Sci-Fi', 'count': 2},
+        ])
+        self.assertEqual(data['decades'], [
+            {'decade': 1970, 'count': 1}, {'decade': 1980, 'count': 1},
+            {'decade': 1990, 'count': 1}, {'decade': 2000, 'count': 1}, {'decade': 2010, 'count': 1},
+        ])
+        ratings = {item['rating_gte']: item['count'] for item in data['ratings']}
+        self.assertEqual((ratings[1], ratings[7], ratings[9]), (4, 3, 0))
+        self.assertEqual(data['directors'], [
+            {'id': self.nolan.pk, 'name': 'Nolan', 'count': 3},
+            {'id': self.scott.pk, 'name': 'Scott', 'count': 2},
+        ])
+
+    def test_facets_ignore_their_own_filters(self):
+        """Test a facet applies every filter except its own"""
+        data = self.facets(genre_id=self.scifi.pk, release_year_gte=2000)
+        self.assertEqual(data['count'], 1)
+        # Genres: every genre among movies from 2000 on
+        self.assertEqual({item['name']: item['count'] for item in data['genres']}, {'Drama': 2, 'Sci-Fi': 1})
+        # Decades: every decade among Sci-Fi movies
+        self.assertEqual([item['decade'] for item in data['decades']], [1970, 2010])
+        self.assertEqual(data['directors'], [{'id': self.nolan.pk, 'name': 'Nolan', 'count': 1}])
+
+    def test_matches_list_counts(self):
+        """Test each facet value's count is the count of the list filtered by it"""
+        data = self.facets(director_id=self.nolan.pk)
+        for item in data['genres']:
+            response = self.client.get(reverse('movie-list'), {'director_id': self.nolan.pk, 'genre_id': item['id']})
+            self.assertEqual(response.json()['count'], item['count'])
+        for item in data['ratings']:
+            response = self.client.get(
+                reverse('movie-list'), {'director_id': self.nolan.pk, 'rating_gte': item['rating_gte']}
+            )
+            self.assertEqual(response.json()['count'], item['count'])
+
+    @override_settings(FACETS={'TOP_DIRECTORS': 1})
+    def test_top_directors(self):
+        """Test only the directors with the most matching movies are listed"""
+        self.assertEqual([item['name'] for item in self.facets()['directors']], ['Nolan'])
+
+    def test_invalid_filter(self):
+        """Test invalid filter values are rejected like on the movie list"""
+        response = self.client.get(reverse('movie-facets'), {'genre_id': 'drama'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('genre_id', response.json())
+
+    def test_cached_per_filter_set(self):
+        """Test facet responses are cached per filter set and invalidated by writes"""
+        cache.clear()
+        self.facets(genre_id=self.drama.pk)
+        # Only the data version lookup
+        with self.assertNumQueries(1):
+            self.assertEqual(self.facets(genre_id=self.drama.pk)['count'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.get(title="Legend").genres.add(self.drama)
+        self.assertEqual(self.facets(genre_id=self.drama.pk)['count'], 4)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False}, FILTER_INDEX={'ENABLED': True, 'MAX_AGE': None})
+class FilterIndexTestCase(APITestCase):
+    """Test cases for the in-memory movie list filter index"""
+
+    def setUp(self):
+        filter_index.clear()
+        self.addCleanup(filter_index.clear)
+        self.nolan = Director.objects.create(name="Nolan")
+        self.scott = Director.objects.create(name="Scott")
+        self.drama = Genre.objects.create(name="Drama")
+        self.scifi = Genre.objects.create(name="Sci-Fi")
+        self.caine = Actor.objects.create(name="Michael Caine")
+        for title, year, rating, director, genres, actors in (
+            ("Memento", 2000, Decimal('8.4'), self.nolan, [self.drama], []),
+            ("Interstellar", 2014, Decimal('8.7'), self.nolan, [self.drama, self.scifi], [self.caine]),
+            ("Alien", 1979, Decimal('8.5'), self.scott, [self.scifi], []),
+            ("Legend", 1985, Decimal('6.4'), self.scott, [], []),
+            ("Following", 1998, None, self.nolan, [self.drama], []),
+            ("Tenet", 2020, Decimal('7.3'), self.nolan, [self.scifi], [self.caine]),
+        ):
+            movie = Movie.objects.create(title=title, release_year=year, rating=rating, director=director)
+            movie.genres.set(genres)
+            movie.actors.set(actors)
+
+    def titles(self, **params):
+        response = self.client.get(reverse('movie-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['count'], [movie['title'] for movie in response.json()['results']]
+
+    def assertMatchesDatabase(self, **params):
+        indexed = self.titles(**params)
+        with override_settings(FILTER_INDEX={'ENABLED': False}):
+            self.assertEqual(indexed, self.titles(**params))
+
+    def filter_combinations(self):
+        return [
+            {}, {'genre_id': self.drama.pk}, {'genre_id': self.scifi.pk, 'actor_id': self.caine.pk},
+            {'director_id': self.nolan.pk, 'rating_gte': 8}, {'release_year_gte': 1985, 'release_year_lte': 2014},
+            {'release_year': 1979}, {'rating_lte': 8.5}, {'genre_id': self.drama.pk, 'director_id': self.scott.pk},
+        ]
+
+    def test_matches_database(self):
+        """Test every indexed filter and ordering gives the database's count and order"""
+        for params in self.filter_combinations():
+            for ordering in (None, 'title', '-title', 'rating', '-rating', 'release_year', 'created_at'):
+                with self.subTest(params=params, ordering=ordering):
+                    self.assertMatchesDatabase(**params, **({'ordering': ordering} if ordering else {}))
+        self.assertMatchesDatabase(page=2, page_size=4)
+        self.assertTrue(filter_index.is_loaded)
+
+    def test_skips_filter_and_count_queries(self):
+        """Test a loaded index answers the filters and count, leaving the page and its genre names"""
+        self.titles()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.titles(genre_id=self.drama.pk)[0], 3)
+        # The page, its genre names and the data version lookup of the conditional response
+        self.assertEqual(len(queries), 3)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql'].upper()])
+
+    def test_follows_writes(self):
+        """Test saves, relation changes and deletes update the loaded index"""
+        self.titles()
+        with self.captureOnCommitCallbacks(execute=True):
+            movie = Movie.objects.create(title="Batman Begins", release_year=2005, rating=Decimal('8.2'),
+                                         director=self.nolan)
+            movie.genres.add(self.drama)
+            movie.actors.add(self.caine)
+        self.assertMatchesDatabase(genre_id=self.drama.pk, ordering='title')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movie.title = "Zorro"
+            movie.rating = None
+            movie.save()
+            self.scifi.movies.add(movie)
+            Movie.objects.get(title="Memento").genres.clear()
+        for params in self.filter_combinations():
+            with self.subTest(params=params):
+                self.assertMatchesDatabase(**params, ordering='-title')
+                self.assertMatchesDatabase(**params, ordering='rating')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.caine.movies.clear()
+            Movie.objects.get(title="Tenet").delete()
+            self.drama.delete()
+        self.assertMatchesDatabase()
+        self.assertMatchesDatabase(actor_id=self.caine.pk)
+        self.assertMatchesDatabase(genre_id=self.scifi.pk)
+
+    def test_follows_bulk_writes(self):
+        """Test bulk created and updated movies update the loaded index"""
+        self.titles()
+        items = [
+            {'title': 'Memento', 'release_year': 2000, 'director_id': self.nolan.pk, 'rating': '5.0',
+             'genre_ids': [self.scifi.pk]},
+            {'title': 'Dunkirk', 'release_year': 2017, 'director_id': self.nolan.pk, 'genre_ids': [self.drama.pk],
+             'actor_ids': [self.caine.pk]},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('movie-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertMatchesDatabase(genre_id=self.drama.pk)
+        self.assertMatchesDatabase(genre_id=self.scifi.pk, ordering='-rating')
+        self.assertMatchesDatabase(actor_id=self.caine.pk, ordering='created_at')
+
+    @override_settings(FILTER_INDEX={'ENABLED': True, 'MAX_AGE': 60})
+    def test_reload_keeps_serving(self):
+        """Test an expired index answers lookups and takes writes while it reloads"""
+        self.titles()
+        filter_index.loaded_at -= 3600
+        scott_movies = list(Movie.objects.filter(director=self.scott).order_by('release_year').values_list('pk', flat=True))
+        results = []
+
+        def lookup_and_write():
+            results.append(list(filter_index.select({'director_id': self.scott.pk}, ['release_year'])))
+            filter_index.upsert_movie(99999, 1990, None, self.scott.pk)
+
+        rank = title_rank
+
+        def blocking_rank():
+            # Runs while the reload reads the database
+            worker = threading.Thread(target=lookup_and_write)
+            worker.start()
+            worker.join(5)
+            results.append(worker.is_alive())
+            return rank()
+
+        with patch('movies.filter_index.title_rank', blocking_rank):
+            filter_index.ensure_loaded()
+        self.assertEqual(results, [scott_movies, False])
+        self.assertFalse(filter_index.is_stale())
+        # The write made during the reload is replayed on the new index
+        self.assertEqual(list(filter_index.select({'director_id': self.scott.pk}, ['release_year'])),
+                         scott_movies + [99999])
+
+    def test_failed_load_stops_recording(self):
+        """Test writes are not journaled forever after a load fails"""
+        with patch.object(filter_index, '_read', side_effect=DatabaseError('unavailable')):
+            with self.assertRaises(DatabaseError):
+                filter_index.ensure_loaded()
+        self.assertFalse(filter_index.is_tracking)
+
+    def test_title_reload_keeps_serving(self):
+        """Test stale title ranks are reloaded without blocking other lookups and writes"""
+        self.titles()
+        with self.captureOnCommitCallbacks(execute=True):
+            movie = Movie.objects.get(title="Alien")
+            movie.title = "Zulu"
+            movie.save()
+        scott_movies = list(Movie.objects.filter(director=self.scott).order_by('release_year').values_list('pk', flat=True))
+        results = []
+
+        def lookup_and_write():
+            results.append(list(filter_index.select({'director_id': self.scott.pk}, ['release_year'])))
+            filter_index.upsert_movie(movie.pk, 1979, None, self.scott.pk)
+
+        rank = title_rank
+
+        def blocking_rank():
+            # Runs while the ranks are read from the database
+            worker = threading.Thread(target=lookup_and_write)
+            worker.start()
+            worker.join(5)
+            results.append(worker.is_alive())
+            return rank()
+
+        with patch('movies.filter_index.title_rank', blocking_rank):
+            filter_index.select({}, ['title'])
+        self.assertEqual(results, [scott_movies, False])
+        # The title write made during the reload marks the ranks stale again
+        self.assertTrue(filter_index._titles_stale)
+        self.assertMatchesDatabase(ordering='title')
+
+    def test_appends_into_spare_capacity(self):
+        """Test new movies fill spare rows instead of copying every column per movie"""
+        self.titles()
+        movies = Movie.objects.bulk_create([
+            Movie(title=f"Sequel {i}", release_year=2001, director=self.scott) for i in range(100)
+        ])
+        columns = []
+        for movie in movies:
+            filter_index.upsert_movie(movie.pk, movie.release_year, movie.rating, movie.director_id, movie.created_at)
+            if not columns or columns[-1] is not filter_index._columns['alive']:
+                columns.append(filter_index._columns['alive'])
+        self.assertLessEqual(len(columns), 3)
+        self.assertMatchesDatabase(director_id=self.scott.pk, ordering='created_at')
+        self.assertMatchesDatabase(release_year=2001)
+
+    def test_other_lookups_use_database(self):
+        """Test unindexed filters, keyset cursors and other actions do not read the index"""
+        with patch.object(filter_index, 'select', side_effect=AssertionError):
+            self.assertEqual(self.titles(title='ment')[1], ['Memento'])
+            response = self.client.get(reverse('movie-list'), {'cursor': '', 'genre_id': self.drama.pk})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(reverse('movie-by-director'), {'name': 'Scott'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_filter(self):
+        """Test invalid filter values are rejected as without the index"""
+        response = self.client.get(reverse('movie-list'), {'genre_id': 'drama'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('genre_id', response.json())
+
+    @override_settings(FILTER_INDEX={'ENABLED': False})
+    def test_disabled(self):
+        """Test the index is neither loaded nor read when disabled"""
+        self.assertEqual(self.titles(genre_id=self.drama.pk)[0], 3)
+        self.assertFalse(filter_index.is_loaded)
+
+
+class SimilarMoviesTestCase(APITestCase):
+    """Test cases for the precomputed similar movies"""
+
+    def setUp(self):
+        cache.clear()
+        self.nolan = Director.objects.create(name="Nolan")
+        self.villeneuve = Director.objects.create(name="Villeneuve")
+        self.actors = [Actor.objects.create(name=f"Actor {i}") for i in range(4)]
+        self.genres = [Genre.objects.create(name=name) for name in ("Drama", "Sci-Fi", "Western")]
+        self.original = self.create_movie("Original", 1994, self.nolan, [0, 1], [0])
+        self.remake = self.create_movie("Remake", 1995, self.nolan, [0, 1], [0])
+        self.cousin = self.create_movie("Cousin", 1998, self.villeneuve, [0], [1])
+        self.stranger = self.create_movie("Stranger", 1970, self.villeneuve, [2], [2])
+        similarity.rebuild()
+
+    def create_movie(self, title, year, director, actors, genres):
+        movie = Movie.objects.create(title=title, release_year=year, director=director)
+        movie.actors.set([self.actors[i] for i in actors])
+        movie.genres.set([self.genres[i] for i in genres])
+        return movie
+
+    def similar(self, movie, **params):
+        response = self.client.get(reverse('movie-similar', kwargs={'pk': movie.pk}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item['title'], round(item['score'], 3)) for item in response.json()]
+
+    def entries(self):
+        return list(SimilarMovie.objects.values_list('movie_id', 'similar_id', 'rank', 'score'))
+
+    def test_cosine_ranking(self):
+        """Test neighbours are ranked by the cosine of their weighted features"""
+        # actor 1 + actor 1 + genre 0.5 + director 1 + decade 0.25, squared: 3.3125; Cousin: 2.3125
+        self.assertEqual(self.similar(self.original), [
+            ('Remake', 1.0), ('Cousin', round((1 + 0.0625) / (3.3125 * 2.3125) ** 0.5, 3)),
+        ])
+        self.assertEqual([title for title, _ in self.similar(self.stranger)], ['Cousin'])
+
+    def test_list_fields(self):
+        """Test similar movies use the movie list representation and sparse fieldsets"""
+        response = self.client.get(reverse('movie-similar', kwargs={'pk': self.original.pk}))
+        self.assertEqual(set(response.json()[0]), set(MovieListSerializer().fields) | {'score'})
+        response = self.client.get(reverse('movie-similar', kwargs={'pk': self.original.pk}), {'fields': 'id,score'})
+        self.assertEqual(set(response.json()[0]), {'id', 'score'})
+        self.assertEqual(response.json()[0]['id'], self.remake.pk)
+
+    def test_single_indexed_read(self):
+        """Test similar movies are read with one query plus the genre prefetch and the data version lookup"""
+        with self.assertNumQueries(3):
+            self.similar(self.original, limit=1)
+
+    def test_invalid_requests(self):
+        """Test unknown movies and non-integer limits are rejected"""
+        response = self.client.get(reverse('movie-similar', kwargs={'pk': 99999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('movie-similar', kwargs={'pk': self.original.pk}), {'limit': 'ten'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.similar(self.original, limit=1), [('Remake', 1.0)])
+
+    def test_incremental_refresh(self):
+        """Test cast, genre, director, year and delete changes match a full rebuild"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('movie-detail', kwargs={'pk': self.stranger.pk}),
+                {'actor_ids': [self.actors[0].pk, self.actors[1].pk], 'genre_ids': [self.genres[0].pk]},
+                format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([title for title, _ in self.similar(self.original)], ['Remake', 'Stranger', 'Cousin'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cousin.refresh_from_db()
+            self.cousin.director = self.nolan
+            self.cousin.release_year = 2005
+            self.cousin.save()
+            self.actors[1].movies.clear()
+            self.genres[1].delete()
+            self.remake.delete()
+        incremental = self.entries()
+        similarity.rebuild()
+        self.assertEqual(self.entries(), incremental)
+        self.assertNotIn('Remake', [title for title, _ in self.similar(self.original)])
+
+    @override_settings(SIMILAR_MOVIES={'TOP_K': 1, 'BATCH_SIZE': 2})
+    def test_refresh_loads_neighborhood(self):
+        """Test a refresh loads only the movies sharing a feature with the changed ones and matches a full rebuild"""
+        similarity.rebuild()
+        self.original.genres.set([self.genres[1]])
+        with patch('movies.similarity.build_matrix', wraps=similarity.build_matrix) as build:
+            similarity.refresh_movies([self.original.pk])
+        self.assertEqual(build.call_args_list[0].args[1], {self.original.pk, self.remake.pk, self.cousin.pk})
+        incremental = self.entries()
+        similarity.rebuild()
+        self.assertEqual(self.entries(), incremental)
+
+    @override_settings(SIMILAR_MOVIES={'TOP_K': 2})
+    def test_refresh_skips_genre_and_decade_only_movies(self):
+        """Test a refresh leaves out the movies sharing only a genre or decade that cannot make a top list"""
+        actors = [Actor.objects.create(name=f"Extra {i}") for i in range(30)]
+        movies = []
+        for i in range(30):
+            movie = Movie.objects.create(
+                title=f"Drama {i}", release_year=1990 + i % 10, director=Director.objects.create(name=f"Director {i}")
+            )
+            # Each movie shares an actor with the one before and the one after it
+            movie.actors.set([actors[i], actors[(i + 1) % 30]])
+            movie.genres.set([self.genres[0]])
+            movies.append(movie)
+        similarity.rebuild()
+        movies[0].genres.add(self.genres[1])
+        with patch('movies.similarity.build_matrix', wraps=similarity.build_matrix) as build:
+            similarity.refresh_movies([movies[0].pk])
+        self.assertEqual(build.call_args_list[0].args[1], {movies[29].pk, movies[0].pk, movies[1].pk})
+        # The listers whose stored neighbours fell behind are recomputed from their own actors' movies
+        loaded = set().union(*[call.args[1] for call in build.call_args_list])
+        self.assertLessEqual(loaded, {movies[i].pk for i in (28, 29, 0, 1, 2)})
+        incremental = self.entries()
+        similarity.rebuild()
+        self.assertEqual(self.entries(), incremental)
+
+    @override_settings(SIMILAR_MOVIES={'TOP_K': 1, 'BATCH_SIZE': 2})
+    def test_rebuild_command(self):
+        """Test the rebuild keeps TOP_K neighbours per movie, computed in blocks"""
+        out = StringIO()
+        call_command('rebuild_similar_movies', stdout=out)
+        self.assertIn('Wrote 4 similar movie entries', out.getvalue())
+        self.assertEqual(self.similar(self.original, limit=5), [('Remake', 1.0)])
+
+
+class SimilarMoviesRefreshTestCase(TransactionTestCase):
+    """Test cases for the background similar movie refreshes"""
+
+    def test_refresh_after_commit_in_background(self):
+        """Test committed changes are refreshed on the refresh thread, not by the writer"""
+        with transaction.atomic():
+            director = Director.objects.create(name="Director")
+            drama = Genre.objects.create(name="Drama")
+            movies = [Movie.objects.create(title=f"Movie {i}", release_year=2000, director=director) for i in range(3)]
+        similarity.wait_for_refreshes()
+
+        refresh = similarity.refresh_movies
+        threads = []
+
+        def record(movie_ids):
+            threads.append(threading.current_thread())
+            refresh(movie_ids)
+
+        with patch('movies.similarity.refresh_movies', record):
+            with transaction.atomic():
+                movies[0].genres.add(drama)
+                movies[1].genres.add(drama)
+                self.assertEqual(threads, [])
+            similarity.wait_for_refreshes()
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual(
+            list(SimilarMovie.objects.filter(movie=movies[0]).values_list('similar_id', flat=True)),
+            [movies[1].pk, movies[2].pk],
+        )
+
+
+class RecommendationsTestCase(APITestCase):
+    """Test cases for the review-based recommendations"""
+
+    def setUp(self):
+        cache.clear()
+        director = Director.objects.create(name="Director")
+        genre = Genre.objects.create(name="Drama")
+        self.movies = {}
+        for title in ("Heist", "Caper", "Romance", "Sequel", "Musical"):
+            self.movies[title] = Movie.objects.create(title=title, release_year=2000, director=director)
+            self.movies[title].genres.add(genre)
+        ratings = {
+            'alice': {'Heist': 9, 'Caper': 9, 'Romance': 2},
+            'bob': {'Heist': 8, 'Caper': 9, 'Romance': 3, 'Sequel': 9},
+            'carol': {'Heist': 2, 'Caper': 3, 'Romance': 9, 'Musical': 9},
+            'dave': {'Heist': 10, 'Romance': 1},
+        }
+        for reviewer, movies in ratings.items():
+            for title, rating in movies.items():
+                Review.objects.create(movie=self.movies[title], reviewer_name=reviewer, rating=rating, comment="...")
+        recommendations.rebuild()
+
+    def recommend(self, reviewer, **params):
+        response = self.client.get(reverse('reviewer-recommendations', kwargs={'reviewer_name': reviewer}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item['title'], item['predicted_rating']) for item in response.json()]
+
+    def neighbors(self, title):
+        return list(
+            RatingNeighbor.objects.filter(movie=self.movies[title]).values_list('neighbor__title', flat=True)
+        )
+
+    def test_neighbors_follow_rating_agreement(self):
+        """Test movies rated alike are neighbours and movies rated oppositely are not"""
+        self.assertEqual(self.neighbors('Heist')[0], 'Caper')
+        self.assertNotIn('Romance', self.neighbors('Heist'))
+        self.assertNotIn('Heist', self.neighbors('Romance'))
+
+    def test_recommendations(self):
+        """Test unreviewed movies are ranked by the rating predicted from similar movies"""
+        results = self.recommend('dave')
+        titles = [title for title, _ in results]
+        self.assertEqual(titles[0], 'Caper')
+        self.assertNotIn('Heist', titles)
+        self.assertNotIn('Romance', titles)
+        # dave loved Heist, which Caper is rated like, so Caper is predicted above dave's mean of 5.5
+        self.assertGreater(results[0][1], 5.5)
+        self.assertEqual([rating for _, rating in results], sorted((rating for _, rating in results), reverse=True))
+
+    def test_new_reviews_are_used_before_a_rebuild(self):
+        """Test a reviewer's latest ratings are used without rebuilding the neighbours"""
+        Review.objects.create(movie=self.movies['Caper'], reviewer_name='erin', rating=8, comment="...")
+        self.assertEqual(self.recommend('erin')[0][0], 'Heist')
+
+    def test_fields_and_limit(self):
+        """Test recommendations accept sparse fieldsets and a limit"""
+        response = self.client.get(
+            reverse('reviewer-recommendations', kwargs={'reviewer_name': 'dave'}),
+            {'fields': 'title,predicted_rating', 'limit': 1},
+        )
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(set(response.json()[0]), {'title', 'predicted_rating'})
+
+    def test_invalid_requests(self):
+        """Test unknown reviewers and non-integer limits are rejected"""
+        response = self.client.get(reverse('reviewer-recommendations', kwargs={'reviewer_name': 'nobody'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(
+            reverse('reviewer-recommendations', kwargs={'reviewer_name': 'dave'}), {'limit': 'all'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bounded_queries(self):
+        """Test recommendations read the ratings, their neighbours, the movies and their genres"""
+        # Plus the data version lookup
+        with self.assertNumQueries(5):
+            self.recommend('dave')
+
+    @override_settings(RECOMMENDATIONS={'MAX_REVIEWS': 1, 'NEIGHBORS': 1, 'BATCH_SIZE': 2})
+    def test_rebuild_command(self):
+        """Test the rebuild keeps NEIGHBORS neighbours per movie from every reviewer's newest ratings"""
+        out = StringIO()
+        call_command('rebuild_recommendations', stdout=out)
+        # One rating per reviewer leaves no movie pair rated by the same reviewer
+        self.assertIn('Wrote 0 rating neighbour entries', out.getvalue())
+        with override_settings(RECOMMENDATIONS={'NEIGHBORS': 1, 'BATCH_SIZE': 2}):
+            call_command('rebuild_recommendations', stdout=out)
+        self.assertEqual(
+            RatingNeighbor.objects.values('movie').distinct().count(), RatingNeighbor.objects.count()
+        )
+
+
+class ImportCatalogTestCase(APITestCase):
+    """Test cases for the import_catalog management command"""
+
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.director = Director.objects.create(name="Known Director")
+        self.drama = Genre.objects.create(name="Drama")
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def write_jsonl(self, records):
+        return self.write_file('movies.jsonl', ''.join(json.dumps(record) + '\n' for record in records))
+
+    def import_catalog(self, *args):
+        out = StringIO()
+        call_command('import_catalog', *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_jsonl(self):
+        """Test movies are imported with their people, genres and reviews"""
+        path = self.write_jsonl([
+            {'title': 'Imported', 'release_year': 2001, 'director': 'Known Director', 'rating': 7.5,
+             'plot': 'Tabs\tand\nnewlines', 'genres': ['Drama', 'Mystery'], 'actors': ['New Actor'],
+             'reviews': [{'reviewer_name': 'Critic', 'rating': 8}, {'reviewer_name': 'Fan', 'rating': 6}]},
+            {'title': 'Second', 'release_year': 2002, 'director': 'New Director'},
+        ])
+        output = self.import_catalog(path, '--batch-size', '1')
+
+        movie = Movie.objects.get(title='Imported')
+        self.assertEqual(movie.director, self.director)
+        self.assertEqual(movie.plot, 'Tabs\tand\nnewlines')
+        self.assertEqual(sorted(movie.genres.values_list('name', flat=True)), ['Drama', 'Mystery'])
+        self.assertEqual(list(movie.actors.values_list('name', flat=True)), ['New Actor'])
+        self.assertEqual((movie.review_count, movie.avg_review_rating), (2, Decimal('7.00')))
+        self.assertEqual(Director.objects.filter(name='Known Director').count(), 1)
+        self.assertTrue(LeaderboardEntry.objects.filter(movie=movie, scope=LeaderboardEntry.SCOPE_GENRE,
+                                                        scope_key=self.drama.pk).exists())
+        self.assertIn('Imported 2 movies, 2 reviews', output)
+
+    def test_reimport_updates(self):
+        """Test importing a movie again updates it instead of duplicating it"""
+        record = {'title': 'Imported', 'release_year': 2001, 'director': 'Known Director', 'rating': 5,
+                  'genres': ['Drama'], 'reviews': [{'reviewer_name': 'Critic', 'rating': 4}]}
+        self.import_catalog(self.write_jsonl([record]))
+        record.update(rating=9, reviews=[{'reviewer_name': 'Critic', 'rating': 10}])
+        self.import_catalog(self.write_jsonl([record]))
+
+        movie = Movie.objects.get(title='Imported')
+        self.assertEqual(movie.rating, Decimal('9.0'))
+        self.assertEqual((movie.review_count, movie.avg_review_rating), (1, Decimal('10.00')))
+        self.assertEqual(movie.genres.count(), 1)
+
+    def test_import_csv(self):
+        """Test CSV rows with |-separated genres and actors"""
+        path = self.write_file('movies.csv', (
+            'title,release_year,director,duration,genres,actors\n'
+            'From CSV,1999,Known Director,120,Drama|Comedy,One|Two\n'
+        ))
+        self.import_catalog(path)
+
+        movie = Movie.objects.get(title='From CSV')
+        self.assertEqual(movie.duration, 120)
+        self.assertEqual(movie.genres.count(), 2)
+        self.assertEqual(sorted(movie.actors.values_list('name', flat=True)), ['One', 'Two'])
+
+    def test_invalid_records_skipped(self):
+        """Test invalid lines are reported and the rest is imported"""
+        path = self.write_file('movies.jsonl', '\n'.join([
+            json.dumps({'title': 'Good', 'release_year': 2001, 'director': 'Known Director'}),
+            json.dumps({'title': 'No Director', 'release_year': 2001}),
+            json.dumps({'title': 'Bad Year', 'release_year': 'soon', 'director': 'Known Director'}),
+            '{not json',
+            json.dumps({'title': 'Too Old', 'release_year': 1800, 'director': 'Known Director'}),
+            json.dumps({'title': 'Bad Rating', 'release_year': 2001, 'director': 'Known Director', 'rating': 'nan'}),
+        ]))
+        output = self.import_catalog(path)
+
+        self.assertEqual(list(Movie.objects.values_list('title', flat=True)), ['Good'])
+        self.assertIn(f'skipped {path}:2: title and director are required', output)
+        self.assertIn(f'skipped {path}:5: movie release_year:', output)
+        self.assertIn('5 skipped', output)
+
+    def test_versions_bumped_per_batch(self):
+        """Test cached responses are invalidated by each committed batch, not only at the end"""
+        path = self.write_jsonl([
+            {'title': f'Imported {i}', 'release_year': 2001, 'director': 'Known Director'} for i in range(3)
+        ])
+        with patch('movies.catalog_import.bump_versions', wraps=bump_versions) as bump:
+            self.import_catalog(path, '--batch-size', '2')
+
+        batch_calls = [call for call in bump.call_args_list if Review in call.args]
+        self.assertEqual(len(batch_calls), 2)
+
+    def test_copy_requires_postgresql(self):
+        """Test --method copy is refused on other databases"""
+        if connection.vendor == 'postgresql':
+            self.skipTest('COPY is available')
+        with self.assertRaises(CommandError):
+            self.import_catalog(self.write_jsonl([]), '--method', 'copy')
+
+
+class ExportTestCase(APITestCase):
+    """Test cases for the streaming NDJSON/CSV export endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.drama = Genre.objects.create(name="Drama")
+        self.comedy = Genre.objects.create(name="Comedy")
+        self.actor = Actor.objects.create(name="Test Actor")
+        self.movies = []
+        for i in range(5):
+            movie = Movie.objects.create(title=f"Movie {i}", release_year=2000 + i, rating=Decimal('7.5'),
+                                         plot=f"Plot, with \"quotes\"\nline {i}", director=self.director)
+            movie.genres.set([self.drama, self.comedy] if i % 2 else [self.drama])
+            movie.actors.add(self.actor)
+            Review.objects.create(movie=movie, reviewer_name="Critic", rating=8, comment="Good")
+            self.movies.append(movie)
+
+    def export(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export(self):
+        """Test NDJSON is the default, one movie per line with its relations"""
+        response, content = self.export('movie-export')
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [movie.pk for movie in self.movies])
+        self.assertEqual(rows[1]['genres'], ['Comedy', 'Drama'])
+        self.assertEqual(rows[1]['actors'], ['Test Actor'])
+        self.assertEqual(rows[1]['director'], 'Test Director')
+        self.assertEqual(rows[1]['rating'], 7.5)
+        self.assertEqual(rows[1]['review_count'], 1)
+
+    def test_csv_export(self):
+        """Test CSV output with a header row and |-separated lists"""
+        response, content = self.export('movie-export', format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('movies.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1]['genres'], 'Comedy|Drama')
+        self.assertEqual(rows[1]['plot'], 'Plot, with "quotes"\nline 1')
+
+    def test_filters_applied(self):
+        """Test exports honor the list filters"""
+        _, content = self.export('movie-export', genre_id=self.comedy.pk, release_year_gte=2002)
+        self.assertEqual([json.loads(line)['title'] for line in content.splitlines()], ['Movie 3'])
+
+        _, content = self.export('review-export', format='csv', movie_id=self.movies[0].pk)
+        self.assertEqual([row['movie'] for row in csv.DictReader(StringIO(content))], ['Movie 0'])
+
+    def test_people_exports(self):
+        """Test actor and director exports list their movie ids"""
+        for url_name in ('actor-export', 'director-export'):
+            _, content = self.export(url_name)
+            row = json.loads(content)
+            self.assertEqual(row['movie_ids'], [movie.pk for movie in self.movies])
+
+    def test_relations_fetched_per_chunk(self):
+        """Test relations are joined in bounded batches, not per row"""
+        with patch.object(MovieViewSet, 'export_chunk_size', 2):
+            with CaptureQueriesContext(connection) as queries:
+                _, content = self.export('movie-export')
+        self.assertEqual(len(content.splitlines()), 5)
+        # The movie rows plus one genre and one actor query for each of the 3 chunks
+        movie_queries = [q for q in queries.captured_queries if 'movies_movie' in q['sql']]
+        self.assertEqual(len(movie_queries), 1 + 3 * 2)
+
+    def test_export_round_trips_through_import(self):
+        """Test an exported CSV can be loaded with import_catalog"""
+        _, content = self.export('movie-export', format='csv')
+        Movie.objects.all().delete()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        call_command('import_catalog', f.name, stdout=StringIO())
+        self.assertEqual(Movie.objects.count(), 5)
+        self.assertEqual(Movie.objects.get(title='Movie 1').genres.count(), 2)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False}, PAGINATION_COUNT={'ESTIMATE_THRESHOLD': None})
+class SparseFieldsetTestCase(APITestCase):
+    """Test cases for the ?fields=, ?include= and ?exclude= parameters"""
+
+    def setUp(self):
+        self.director = Director.objects.create(name="Test Director")
+        self.genre = Genre.objects.create(name="Drama")
+        self.actor = Actor.objects.create(name="Test Actor")
+        self.movie = Movie.objects.create(title="Test Movie", release_year=2020, plot="Plot", director=self.director)
+        self.movie.genres.add(self.genre)
+        self.movie.actors.add(self.actor)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(movie=self.movie, reviewer_name="Critic", rating=8, comment="Good")
+        self.detail_url = reverse('movie-detail', kwargs={'pk': self.movie.pk})
+
+    def get(self, url, params, queries):
+        # Plus the data version lookup of the conditional response
+        with self.assertNumQueries(queries + 1):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_fields_skip_relations(self):
+        """Test ?fields= renders only the listed fields and skips their joins and prefetches"""
+        data = self.get(self.detail_url, {'fields': 'id,title,poster_url'}, 1)
+        self.assertEqual(data, {'id': self.movie.pk, 'title': 'Test Movie', 'poster_url': None})
+
+        data = self.get(reverse('movie-list'), {'fields': 'title'}, 2)
+        self.assertEqual(data['results'], [{'title': 'Test Movie'}])
+
+    def test_nested_fields(self):
+        """Test dotted names select the fields of nested serializers"""
+        data = self.get(self.detail_url, {'fields': 'title,actors.name,genres.name'}, 3)
+        self.assertEqual(data, {'title': 'Test Movie', 'actors': [{'name': 'Test Actor'}], 'genres': [{'name': 'Drama'}]})
+
+        data = self.get(reverse('actor-detail', kwargs={'pk': self.actor.pk}), {'fields': 'name,movies.title'}, 2)
+        self.assertEqual(data, {'name': 'Test Actor', 'movies': [{'title': 'Test Movie'}]})
+
+    def test_exclude(self):
+        """Test ?exclude= drops fields and the annotations they need"""
+        data = self.get(self.detail_url, {'exclude': 'reviews,director,actors.movies_count,genres.movies_count'}, 3)
+        self.assertNotIn('reviews', data)
+        self.assertNotIn('movies_count', data['actors'][0])
+        self.assertEqual(data['review_count'], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(reverse('actor-list'), {'exclude': 'movies_count'}, 2)
+        self.assertNotIn('movies_count', data['results'][0])
+        self.assertNotIn('COUNT(', queries.captured_queries[-1]['sql'].upper())
+
+    def test_include_optional_fields(self):
+        """Test optional list fields are only rendered when included"""
+        data = self.get(reverse('movie-list'), {}, 3)
+        self.assertNotIn('actors', data['results'][0])
+
+        data = self.get(reverse('movie-list'), {'include': 'actors,plot'}, 4)
+        self.assertEqual(data['results'][0]['actors'], ['Test Actor'])
+        self.assertEqual(data['results'][0]['plot'], 'Plot')
+
+        data = self.get(reverse('movie-list'), {'fields': 'title', 'include': 'duration'}, 2)
+        self.assertEqual(data['results'], [{'title': 'Test Movie', 'duration': None}])
+
+    def test_top_rated_fields(self):
+        """Test leaderboard responses honor fieldsets too"""
+        data = self.get(reverse('movie-top-rated'), {'fields': 'title,score'}, 1)
+        self.assertEqual(list(data[0]), ['title', 'score'])
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown names and subfields of plain fields return 400"""
+        for params in ({'fields': 'title,budget'}, {'exclude': 'actors.budget'}, {'fields': 'title.length'}):
+            response = self.client.get(self.detail_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.json())
+
+    def test_writes_ignore_fieldsets(self):
+        """Test write requests return the full representation"""
+        url = reverse('movie-detail', kwargs={'pk': self.movie.pk}) + '?fields=title'
+        response = self.client.patch(url, {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Renamed')
+        self.assertIn('reviews', response.data)
+
+
+class MovieReviewsTestCase(APITestCase):
+    """Test cases for the /api/movies/{id}/reviews/ sub-resource and the detail preview"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.movie = Movie.objects.create(title="Blockbuster", release_year=2020, director=self.director)
+        self.other = Movie.objects.create(title="Other", release_year=2020, director=self.director)
+        for i in range(12):
+            Review.objects.create(movie=self.movie, reviewer_name=f"Reviewer {i}", rating=1 + i % 10,
+                                  comment="Comment", is_featured=i % 4 == 0)
+        Review.objects.create(movie=self.other, reviewer_name="Elsewhere", rating=5, comment="Comment")
+        self.url = reverse('movie-reviews', kwargs={'movie_pk': self.movie.pk})
+
+    def collect(self, params):
+        """Follow the next links and return every review name"""
+        names, url = [], self.url
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            names += [review['reviewer_name'] for review in response.data['results']]
+            url, params = response.data['next'], None
+        return names
+
+    def test_keyset_pages(self):
+        """Test the route pages through one movie's reviews, newest first, without counting"""
+        names = self.collect({'page_size': 5})
+        self.assertEqual(names, [f"Reviewer {i}" for i in reversed(range(12))])
+
+    def test_filters_and_ordering(self):
+        """Test ReviewFilter filters and rating ordering on the nested route"""
+        self.assertEqual(self.collect({'is_featured': 'true'}), ['Reviewer 8', 'Reviewer 4', 'Reviewer 0'])
+        self.assertEqual(self.collect({'rating_gte': 9, 'ordering': 'rating', 'page_size': 1}),
+                         ['Reviewer 8', 'Reviewer 9'])
+
+    def test_unknown_movie(self):
+        """Test reviews of a missing movie return 404"""
+        response = self.client.get(reverse('movie-reviews', kwargs={'movie_pk': 99999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_preview(self):
+        """Test movie details embed only the newest reviews plus aggregates and a link"""
+        # The movie, its relations, the review preview and the data version lookup
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('movie-detail', kwargs={'pk': self.movie.pk}))
+        data = response.json()
+        self.assertEqual([review['reviewer_name'] for review in data['reviews']],
+                         [f"Reviewer {i}" for i in reversed(range(12 - Movie.REVIEW_PREVIEW_SIZE, 12))])
+        self.assertEqual(data['review_count'], 12)
+        self.assertTrue(data['reviews_url'].endswith(self.url))
+
+    def test_preview_uses_movie_index(self):
+        """Test the preview and the first page are read from the (movie, created_at) index"""
+        if connection.vendor != 'postgresql':
+            self.skipTest('EXPLAIN output is PostgreSQL specific')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            # Table statistics left by other tests must not make sorting the movie_id index scan look cheaper
+            cursor.execute('SET LOCAL enable_sort = off')
+            sql, params = self.movie.review_preview.query.sql_with_params()
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('review_movie_created_idx', plan)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class BatchRetrieveTestCase(APITestCase):
+    """Test cases for the ?ids= batch endpoints"""
+
+    def setUp(self):
+        self.genre = Genre.objects.create(name="Drama")
+        self.directors = [Director.objects.create(name=f"Director {i}") for i in range(3)]
+        self.actors = [Actor.objects.create(name=f"Actor {i}") for i in range(3)]
+        self.movies = []
+        for i in range(6):
+            movie = Movie.objects.create(title=f"Movie {i}", release_year=2000 + i, director=self.directors[i % 3])
+            movie.genres.add(self.genre)
+            movie.actors.set(self.actors[:i % 3 + 1])
+            Review.objects.create(movie=movie, reviewer_name="Critic", rating=7, comment="Good")
+            self.movies.append(movie)
+
+    def batch(self, url_name, ids, **params):
+        response = self.client.get(reverse(url_name), {'ids': ','.join(str(pk) for pk in ids), **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_order_and_missing(self):
+        """Test results follow the requested order and unknown ids are reported"""
+        ids = [self.movies[3].pk, 99999, self.movies[0].pk, self.movies[3].pk]
+        data = self.batch('movie-batch', ids)
+        self.assertEqual([movie['id'] for movie in data['results']], [self.movies[3].pk, self.movies[0].pk])
+        self.assertEqual(data['missing'], [99999])
+        self.assertEqual(data['results'][0]['reviews'][0]['reviewer_name'], 'Critic')
+        self.assertEqual(data['results'][0]['director']['movies_count'], 2)
+
+    def test_constant_queries(self):
+        """Test the query count does not grow with the number of ids"""
+        for url_name, objects in (('movie-batch', self.movies), ('actor-batch', self.actors),
+                                  ('director-batch', self.directors)):
+            with self.subTest(url_name=url_name):
+                with CaptureQueriesContext(connection) as one:
+                    self.batch(url_name, [objects[0].pk])
+                with CaptureQueriesContext(connection) as many:
+                    data = self.batch(url_name, [obj.pk for obj in objects])
+                self.assertEqual(len(data['results']), len(objects))
+                self.assertEqual(len(many), len(one))
+
+    def test_detail_representation(self):
+        """Test actors and directors are rendered like their detail views, honoring fieldsets"""
+        data = self.batch('actor-batch', [self.actors[2].pk], fields='name,movies.title')
+        actor = data['results'][0]
+        self.assertEqual(set(actor), {'name', 'movies'})
+        self.assertCountEqual(actor['movies'], [{'title': 'Movie 2'}, {'title': 'Movie 5'}])
+
+    @override_settings(BATCH_RETRIEVE={'MAX_IDS': 3})
+    def test_invalid_requests(self):
+        """Test missing, malformed and oversized id lists are rejected"""
+        for ids in ('', '1,two', '1,2,3,4'):
+            response = self.client.get(reverse('director-batch'), {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.json())
+
+
+class BulkWriteTestCase(APITestCase):
+    """Test cases for the bulk movie and review write endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.director = Director.objects.create(name="Test Director")
+        self.actors = [Actor.objects.create(name=f"Actor {i}") for i in range(3)]
+        self.drama = Genre.objects.create(name="Drama")
+        self.comedy = Genre.objects.create(name="Comedy")
+        self.existing = Movie.objects.create(title="Existing", release_year=2000, director=self.director,
+                                             plot="Old plot", duration=100)
+        self.existing.genres.add(self.drama)
+        self.existing.actors.add(self.actors[0])
+
+    def movie_item(self, title, **fields):
+        return {'title': title, 'release_year': 2010, 'director_id': self.director.pk,
+                'genre_ids': [self.drama.pk], 'actor_ids': [self.actors[1].pk], **fields}
+
+    def bulk(self, url_name, items, method='post'):
+        return getattr(self.client, method)(reverse(url_name), items, format='json')
+
+    def test_create_movies(self):
+        """Test POST creates every movie with its links, reporting ids in request order"""
+        response = self.bulk('movie-bulk', [self.movie_item('First'), self.movie_item('Second', actor_ids=[])])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'created'])
+        first, second = (Movie.objects.get(pk=result['id']) for result in results)
+        self.assertEqual(first.title, 'First')
+        self.assertIsNotNone(first.created_at)
+        self.assertEqual(list(first.actors.values_list('pk', flat=True)), [self.actors[1].pk])
+        self.assertEqual(list(second.genres.values_list('pk', flat=True)), [self.drama.pk])
+        self.assertFalse(second.actors.exists())
+
+    def test_constant_queries(self):
+        """Test the query count does not grow with the number of items"""
+        def count(items):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.bulk('movie-bulk', items).status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(count([self.movie_item(f'Small {i}') for i in range(2)]),
+                         count([self.movie_item(f'Large {i}') for i in range(20)]))
+
+    def test_invalid_items_write_nothing(self):
+        """Test any invalid item rejects the batch with per-item errors"""
+        items = [
+            self.movie_item('Valid'),
+            self.movie_item('Unknown director', director_id=99999),
+            self.movie_item('Bad year', release_year='soon', actor_ids=[99998]),
+            self.movie_item('Existing', release_year=2000),
+            self.movie_item('Valid'),
+        ]
+        response = self.bulk('movie-bulk', items)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = response.json()
+        self.assertEqual(data['error'], '4 of 5 items are invalid; nothing was written')
+        errors = data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('director_id', errors[1])
+        self.assertEqual(set(errors[2]), {'release_year'})
+        self.assertIn('non_field_errors', errors[3])
+        self.assertIn('item 0', errors[4]['non_field_errors'][0])
+        self.assertEqual(Movie.objects.count(), 1)
+
+    def test_upsert_movies(self):
+        """Test PUT updates movies matched by natural key, keeping omitted fields, and creates the rest"""
+        items = [
+            {'title': 'Existing', 'release_year': 2000, 'director_id': self.director.pk,
+             'plot': 'New plot', 'genre_ids': [self.comedy.pk]},
+            self.movie_item('New'),
+        ]
+        response = self.bulk('movie-bulk', items, method='put')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(results[0], {'id': self.existing.pk, 'status': 'updated'})
+        self.assertEqual(results[1]['status'], 'created')
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.plot, 'New plot')
+        self.assertEqual(self.existing.duration, 100)
+        self.assertEqual(list(self.existing.genres.values_list('pk', flat=True)), [self.comedy.pk])
+        # actor_ids was omitted, so the cast is unchanged
+        self.assertEqual(list(self.existing.actors.values_list('pk', flat=True)), [self.actors[0].pk])
+
+    def test_concurrent_insert_conflicts(self):
+        """Test items whose natural key another request stored after matching are reported with a 409"""
+        lookup = BulkWriter.lookup
+        calls = []
+
+        def racing_lookup(writer, keys):
+            calls.append(keys)
+            # The match runs before the concurrent insert of "Existing" is visible
+            return {} if len(calls) == 1 else lookup(writer, keys)
+
+        items = [self.movie_item('New'), self.movie_item('Existing', release_year=2000)]
+        for method in ('post', 'put'):
+            calls.clear()
+            with patch.object(BulkWriter, 'lookup', racing_lookup):
+                response = self.bulk('movie-bulk', items, method=method)
+            self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+            data = response.json()
+            self.assertEqual(data['error'], '1 of 2 items conflict with concurrent writes; nothing was written')
+            self.assertEqual(data['errors'][0], {})
+            self.assertIn('non_field_errors', data['errors'][1])
+        self.assertFalse(Movie.objects.filter(title='New').exists())
+
+    def test_reviews_update_aggregates_once(self):
+        """Test bulk reviews refresh the aggregates and leaderboards of their movies"""
+        other = Movie.objects.create(title="Other", release_year=2001, director=self.director)
+        items = [
+            {'movie_id': self.existing.pk, 'reviewer_name': 'A', 'rating': 8, 'comment': 'Good'},
+            {'movie_id': self.existing.pk, 'reviewer_name': 'B', 'rating': 6, 'comment': 'Fine'},
+            {'movie_id': other.pk, 'reviewer_name': 'A', 'rating': 3, 'comment': 'Poor'},
+        ]
+        with patch('movies.bulk.leaderboard.refresh_movies', wraps=leaderboard_refresh_movies) as refresh:
+            response = self.bulk('review-bulk', items)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        refresh.assert_called_once()
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.review_count, self.existing.avg_review_rating), (2, 7.0))
+        self.assertTrue(LeaderboardEntry.objects.filter(movie=other).exists())
+
+        items[1]['rating'] = 10
+        response = self.bulk('review-bulk', items[1:2], method='put')
+        self.assertEqual(response.json()['results'][0]['status'], 'updated')
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.review_count, self.existing.avg_review_rating), (2, 9.0))
+
+        response = self.bulk('review-bulk', items[:1])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalidates_cache_and_autocomplete(self):
+        """Test cached responses and the autocomplete index see the written movies"""
+        autocomplete_index.clear()
+        self.addCleanup(autocomplete_index.clear)
+        url = reverse('movie-list')
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+        self.client.get(reverse('autocomplete'), {'q': 'x'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bulk('movie-bulk', [self.movie_item('Xanadu')])
+        self.assertEqual(len(self.client.get(url).json()['results']), 2)
+        response = self.client.get(reverse('autocomplete'), {'q': 'xan'})
+        self.assertEqual([result['label'] for result in response.json()['results']], ['Xanadu'])
+
+    @override_settings(BULK_WRITE={'MAX_ITEMS': 2})
+    def test_invalid_requests(self):
+        """Test non-list, empty and oversized payloads are rejected"""
+        for payload in ({'title': 'Not a list'}, [], [self.movie_item(f'Movie {i}') for i in range(3)]):
+            response = self.bulk('movie-bulk', payload)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.json())
+
+
+class FastJSONTestCase(APITestCase):
+    """Test cases for the orjson-backed renderer and parser"""
+
+    payload = {
+        'title': 'Amélie\u2028line',
+        'rating': Decimal('8.5'),
+        'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'release_date': date(2001, 4, 25),
+        'label': gettext_lazy('Lazy'),
+        'nested': [{'id': 1, 'genres': ['Drama'], 'score': 7.25, 'missing': None, 'ok': True}],
+    }
+
+    def test_matches_drf_output(self):
+        """Test the renderer produces DRF's bytes, with and without orjson"""
+        expected = JSONRenderer().render(self.payload)
+        self.assertEqual(FastJSONRenderer().render(self.payload), expected)
+        with patch('movies.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.payload), expected)
+
+        indented = 'application/json; indent=2'
+        self.assertEqual(FastJSONRenderer().render(self.payload, indented),
+                         JSONRenderer().render(self.payload, indented))
+
+    def test_falls_back_for_unsupported_data(self):
+        """Test data orjson rejects is rendered by the stdlib encoder"""
+        for data in ({1: 'integer key'}, {'big': 2 ** 70}):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser(self):
+        """Test request bodies are parsed, and malformed ones rejected like DRF does"""
+        parsed = FastJSONParser().parse(BytesIO('{"title": "Amélie", "ids": [1, 2]}'.encode()))
+        self.assertEqual(parsed, {'title': 'Amélie', 'ids': [1, 2]})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"title": '))
+
+        response = self.client.post(reverse('genre-list'), '{"name": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+    def test_api_uses_fast_renderer(self):
+        """Test API responses are rendered with the fast renderer by default"""
+        response = self.client.get(reverse('genre-list'))
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class RowSerializerTestCase(APITestCase):
+    """Test cases for the .values() fast path of list endpoints"""
+
+    def setUp(self):
+        self.drama = Genre.objects.create(name="Drama", description="Serious")
+        self.comedy = Genre.objects.create(name="Comedy")
+        self.director = Director.objects.create(name="Jean Dupont", birth_date=date(1960, 3, 1), nationality="French")
+        self.actors = [Actor.objects.create(name=name, image_url=f"https://example.com/{i}.jpg")
+                       for i, name in enumerate(["Zoe Quinn", "Anna Berg", "Anna Berg"])]
+        for i in range(5):
+            movie = Movie.objects.create(
+                title=f"Film {i}", release_year=1990 + i, director=self.director, duration=90 + i,
+                rating=Decimal('7.5') if i % 2 else None, plot="Plot\u2028with separator",
+            )
+            movie.genres.set([self.drama, self.comedy][:i % 2 + 1])
+            movie.actors.set(self.actors[:i % 3 + 1])
+            if i:
+                Review.objects.create(movie=movie, reviewer_name="Critic", rating=i + 3, comment="Ok")
+
+    def assert_same_as_serializer(self, url, params=None):
+        """Compare the response bytes with the ModelSerializer path, following one next link"""
+        fast = self.client.get(url, params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        with patch.object(MovieViewSet, 'row_serializer_class', None), \
+                patch.object(ActorViewSet, 'row_serializer_class', None), \
+                patch.object(DirectorViewSet, 'row_serializer_class', None), \
+                patch.object(GenreViewSet, 'row_serializer_class', None):
+            slow = self.client.get(url, params)
+            next_slow = self.client.get(slow.json()['next']).content if slow.json().get('next') else None
+        self.assertEqual(fast.content, slow.content)
+        if next_slow is not None:
+            self.assertEqual(self.client.get(fast.json()['next']).content, next_slow)
+
+    def test_identical_output(self):
+        """Test list responses match the serializers byte for byte"""
+        cases = [
+            ('movie-list', {}),
+            ('movie-list', {'include': 'actors,plot,duration', 'page_size': 2}),
+            ('movie-list', {'fields': 'title,genres', 'cursor': '', 'ordering': 'rating', 'page_size': 2}),
+            ('movie-list', {'genre': 'drama', 'ordering': '-title'}),
+            ('movie-by-genre', {'name': 'Comedy'}),
+            ('movie-by-director', {'name': 'Dupont'}),
+            ('actor-list', {'cursor': '', 'page_size': 2}),
+            ('actor-list', {'exclude': 'movies_count'}),
+            ('director-list', {}),
+            ('genre-list', {}),
+        ]
+        for url_name, params in cases:
+            with self.subTest(url_name=url_name, params=params):
+                self.assert_same_as_serializer(reverse(url_name), params)
+
+    def test_lists_skip_model_serializers(self):
+        """Test list endpoints render without ModelSerializer while detail views still use it"""
+        with patch.object(MovieListSerializer, 'to_representation', side_effect=AssertionError):
+            for url_name in ('movie-list', 'actor-list', 'director-list', 'genre-list'):
+                self.assertEqual(self.client.get(reverse(url_name)).status_code, status.HTTP_200_OK)
+        with patch.object(ActorSerializer, 'to_representation', side_effect=AssertionError):
+            self.assertEqual(self.client.get(reverse('actor-list')).status_code, status.HTTP_200_OK)
+            with self.assertRaises(AssertionError):
+                self.client.get(reverse('actor-detail', kwargs={'pk': self.actors[0].pk}))
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False}, LEADERBOARD={'MIN_VOTES': 1, 'PRIOR_VOTES': 2, 'PRIOR_MEAN': 5})
+class AsyncViewsTestCase(APITestCase):
+    """Test cases for the async read routes under /api/async/"""
+
+    def setUp(self):
+        self.nolan = Director.objects.create(name="Nolan", nationality="British")
+        self.caine = Actor.objects.create(name="Michael Caine")
+        self.drama = Genre.objects.create(name="Drama")
+        self.scifi = Genre.objects.create(name="Sci-Fi")
+        for title, year, rating, genres, ratings in (
+            ("Memento", 2000, Decimal('8.4'), [self.drama], [9, 8]),
+            ("Interstellar", 2014, Decimal('8.7'), [self.drama, self.scifi], [10]),
+            ("Tenet", 2020, None, [self.scifi], []),
+        ):
+            movie = Movie.objects.create(title=title, release_year=year, rating=rating, director=self.nolan)
+            movie.genres.set(genres)
+            movie.actors.add(self.caine)
+            with self.captureOnCommitCallbacks(execute=True):
+                for i, value in enumerate(ratings):
+                    Review.objects.create(movie=movie, reviewer_name=f"Reviewer {i}", rating=value, comment="Comment")
+        self.movie = Movie.objects.get(title="Interstellar")
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        expected = self.client.get(sync_url, params)
+        response = self.client.get(async_url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        data, expected = response.json(), expected.json()
+        if isinstance(data, dict) and 'results' in data:
+            # Pagination links point back at the route that served the page
+            for link in ('next', 'previous'):
+                expected_link, async_link = expected.pop(link), data.pop(link)
+                self.assertEqual(async_link is None, expected_link is None)
+                if async_link is not None:
+                    self.assertEqual(urlparse(async_link).path, async_url)
+                    self.assertEqual(parse_qs(urlparse(async_link).query), parse_qs(urlparse(expected_link).query))
+        self.assertEqual(data, expected)
+        return data
+
+    def test_lists_match_sync(self):
+        """Test the movie and genre lists render like the DRF views, filters and fieldsets included"""
+        for params in ({}, {'genre_id': self.drama.pk, 'ordering': 'title'}, {'rating_gte': 8, 'include': 'actors,plot'},
+                       {'page': 2, 'page_size': 1}, {'page': 'last', 'page_size': 2}, {'fields': 'id,title'}):
+            with self.subTest(params=params):
+                self.assertSameResponse(reverse('movie-list'), reverse('async-movie-list'), params)
+        data = self.assertSameResponse(reverse('genre-list'), reverse('async-genre-list'))
+        self.assertEqual([genre['movies_count'] for genre in data['results']], [2, 2])
+
+    def test_details_match_sync(self):
+        """Test movie, actor and director details render like the DRF views"""
+        for params in ({}, {'exclude': 'reviews,director.movies_count'}, {'fields': 'title,actors.name'}):
+            with self.subTest(params=params):
+                self.assertSameResponse(reverse('movie-detail', args=[self.movie.pk]),
+                                        reverse('async-movie-detail', args=[self.movie.pk]), params)
+        self.assertSameResponse(reverse('actor-detail', args=[self.caine.pk]),
+                                reverse('async-actor-detail', args=[self.caine.pk]))
+        self.assertSameResponse(reverse('director-detail', args=[self.nolan.pk]),
+                                reverse('async-director-detail', args=[self.nolan.pk]), {'fields': 'name,movies.title'})
+
+    def test_top_rated_matches_sync(self):
+        """Test the leaderboard renders like the DRF view, scores included"""
+        data = self.assertSameResponse(reverse('movie-top-rated'), reverse('async-movie-top-rated'))
+        self.assertEqual([movie['title'] for movie in data], ['Memento', 'Interstellar'])
+        self.assertSameResponse(reverse('movie-top-rated'), reverse('async-movie-top-rated'),
+                                {'genre_id': self.scifi.pk, 'fields': 'title,score'})
+
+    def test_errors_match_sync(self):
+        """Test missing objects, invalid filters, pages and parameters give the DRF views' errors"""
+        self.assertSameResponse(reverse('movie-detail', args=[0]), reverse('async-movie-detail', args=[0]))
+        self.assertSameResponse(reverse('actor-detail', args=[0]), reverse('async-actor-detail', args=[0]))
+        self.assertSameResponse(reverse('movie-list'), reverse('async-movie-list'), {'genre_id': 'drama'})
+        self.assertSameResponse(reverse('movie-list'), reverse('async-movie-list'), {'page': 9})
+        self.assertSameResponse(reverse('movie-list'), reverse('async-movie-list'), {'fields': 'nope'})
+        self.assertSameResponse(reverse('movie-top-rated'), reverse('async-movie-top-rated'), {'limit': 'x'})
+        response = self.client.get(reverse('async-movie-list'), {'cursor': ''})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+
+    def test_query_counts(self):
+        """Test every relation is read with one query"""
+        # Movie, director, actors, genres and review preview
+        with self.assertNumQueries(5):
+            self.client.get(reverse('async-movie-detail', args=[self.movie.pk]))
+        # Data versions keying the cached count, count, page and genre names
+        with self.assertNumQueries(4):
+            self.client.get(reverse('async-movie-list'))
+
+    async def test_served_asynchronously(self):
+        """Test the routes run as coroutines under the ASGI handler"""
+        response = await self.async_client.get(reverse('async-movie-detail', args=[self.movie.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([genre['name'] for genre in response.json()['genres']], ['Drama', 'Sci-Fi'])
+
+    @override_settings(DEBUG=True, QUERY_BUDGET={'ENABLED': True, 'HEADER': True})
+    async def test_query_budget_stays_async(self):
+        """Test the query budget middleware counts async queries without adapting the view to sync"""
+        # Django logs every middleware it has to adapt when DEBUG is on
+        with self.assertNoLogs('django.request', level='DEBUG'):
+            response = await self.async_client.get(reverse('async-movie-detail', args=[self.movie.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Query-Count'], '5')
+
+
+class BenchmarkAPITestCase(APITestCase):
+    """Test cases for the benchmark_api management command"""
+
+    def test_benchmark_writes_json(self):
+        """Test every case succeeds and is reported with latency, query, row and memory figures"""
+        with tempfile.NamedTemporaryFile(suffix='.json') as f:
+            call_command(
+                'benchmark_api', '--movies', '30', '--reviews-per-movie', '2', '--repeat', '2',
+                '--warmup', '0', '--json', f.name, stdout=StringIO(),
+            )
+            report = json.load(f)
+
+        self.assertEqual(report['catalog']['movie'], 30)
+        paths = {urlparse(row['url']).path for row in report['results']}
+        self.assertIn(reverse('search'), paths)
+        self.assertIn(reverse('movie-reviews', args=[Movie.objects.order_by('-review_count', 'pk')[0].pk]), paths)
+        for row in report['results']:
+            with self.subTest(case=row['case']):
+                self.assertLess(row['status'], 400)
+                self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+                self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+                self.assertGreater(row['peak_kb'], 0)
+        detail = next(row for row in report['results'] if row['case'] == 'movie detail')
+        self.assertGreater(detail['queries'], 0)
+        self.assertGreater(detail['rows'], 0)
+
+    def test_writes_are_rolled_back(self):
+        """Test write cases leave the catalog as generated"""
+        call_command('benchmark_api', '--movies', '20', '--repeat', '1', '--warmup', '0', '--only', 'create',
+                     stdout=StringIO())
+        self.assertEqual(Movie.objects.count(), 20)
+        self.assertFalse(Review.objects.filter(reviewer_name__startswith='Benchmark').exists())
+
+
+class BenchmarkASGITestCase(TransactionTestCase):
+    """Test cases for the benchmark_asgi management command"""
+
+    def test_benchmark_writes_json(self):
+        """Test every case succeeds in every mode"""
+        with tempfile.NamedTemporaryFile(suffix='.json') as f:
+            call_command('benchmark_asgi', '--movies', '20', '--requests', '4', '--concurrency', '1,2',
+                         '--json', f.name, stdout=StringIO())
+            report = json.load(f)
+
+        self.assertEqual(report['catalog']['movie'], 20)
+        self.assertEqual({row['mode'] for row in report['results']}, {'wsgi', 'asgi-sync', 'asgi'})
+        self.assertEqual({row['concurrency'] for row in report['results']}, {1, 2})
+        for row in report['results']:
+            with self.subTest(case=row['case'], mode=row['mode']):
+                self.assertLess(row['status'], 400)
+                self.assertLessEqual(row['p50_ms'], row['p95_ms'])
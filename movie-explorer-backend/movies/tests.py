@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -47,6 +48,7 @@ class APITestCase(APITestCase):
     """Test cases for API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.genre = Genre.objects.create(name="Sci-Fi")
         self.director = Director.objects.create(name="Denis Villeneuve")
         self.actor = Actor.objects.create(name="Ryan Gosling")
@@ -1,6 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MovieViewSet, ActorViewSet, DirectorViewSet, GenreViewSet, ReviewViewSet
+from .views import (
+    MovieViewSet, ActorViewSet, DirectorViewSet, GenreViewSet, ReviewViewSet, MovieReviewViewSet,
+    SearchView, AutocompleteView, ReviewerRecommendationsView,
+)
+from .async_views import (
+    AsyncMovieListView, AsyncMovieDetailView, AsyncTopRatedView, AsyncActorDetailView, AsyncDirectorDetailView,
+    AsyncGenreListView,
+)
 
 # Create router and register viewsets
 router = DefaultRouter()
@@ -11,5 +18,17 @@ router.register(r'genres', GenreViewSet)
 router.register(r'reviews', ReviewViewSet)
 
 urlpatterns = [
+    path('api/search/', SearchView.as_view(), name='search'),
+    path('api/autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('api/reviewers/<str:reviewer_name>/recommendations/', ReviewerRecommendationsView.as_view(),
+         name='reviewer-recommendations'),
+    path('api/movies/<int:movie_pk>/reviews/', MovieReviewViewSet.as_view({'get': 'list'}), name='movie-reviews'),
+    # Async versions of the hot read endpoints, for ASGI servers (see movies/async_views.py)
+    path('api/async/movies/', AsyncMovieListView.as_view(), name='async-movie-list'),
+    path('api/async/movies/top_rated/', AsyncTopRatedView.as_view(), name='async-movie-top-rated'),
+    path('api/async/movies/<int:pk>/', AsyncMovieDetailView.as_view(), name='async-movie-detail'),
+    path('api/async/actors/<int:pk>/', AsyncActorDetailView.as_view(), name='async-actor-detail'),
+    path('api/async/directors/<int:pk>/', AsyncDirectorDetailView.as_view(), name='async-director-detail'),
+    path('api/async/genres/', AsyncGenreListView.as_view(), name='async-genre-list'),
     path('api/', include(router.urls)),
 ]
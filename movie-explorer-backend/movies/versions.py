@@ -0,0 +1,91 @@
+"""
+Per-model data versions used to key and invalidate cached API data.
+
+Every write to a catalog model moves that model's version to the current time
+in nanoseconds, or one past the old version should the clock have gone back,
+so anything cached under the old version becomes unreachable. Versions live in
+the DataVersion table, so every process and management command sees a bump
+whatever cache backend holds the cached data. A bump is a single-statement
+UPDATE run once the write commits: version rows are only locked for that
+statement rather than for the rest of every writing transaction, and data
+read before the commit can only have been cached under an older version.
+Reading them costs one primary key lookup per request.
+"""
+import time
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Value
+from django.db.models.functions import Greatest
+
+from .models import DataVersion
+
+
+def get_versions(models):
+    """Current version of each model, keyed by model label"""
+    labels = {model._meta.label_lower for model in models}
+    versions = dict(DataVersion.objects.filter(model__in=labels).values_list('model', 'version'))
+    missing = labels - versions.keys()
+    if missing:
+        now = time.time_ns()
+        DataVersion.objects.bulk_create(
+            [DataVersion(model=label, version=now) for label in sorted(missing)], ignore_conflicts=True
+        )
+        versions.update(DataVersion.objects.filter(model__in=missing).values_list('model', 'version'))
+    return versions
+
+
+def get_request_versions(request, models):
+    """
+    Data versions of the given models as get_versions returns them, read at
+    most once per request and model
+    """
+    request = getattr(request, '_request', request)
+    known = request.__dict__.setdefault('_data_versions', {})
+    missing = [model for model in models if model._meta.label_lower not in known]
+    if missing:
+        known.update(get_versions(missing))
+    return {model._meta.label_lower: known[model._meta.label_lower] for model in models}
+
+
+def bump_versions(*models):
+    """
+    Invalidate data cached for the given models once the current transaction
+    commits, or right away outside a transaction. Nothing is bumped if it
+    rolls back.
+    """
+    labels = sorted({model._meta.label_lower for model in models})
+    if labels:
+        transaction.on_commit(lambda: _bump(labels))
+
+
+def _bump(labels):
+    now = time.time_ns()
+    # Sorted labels, so concurrent bumps lock the version rows in the same order
+    updated = DataVersion.objects.filter(model__in=labels).update(
+        version=Greatest(F('version') + 1, Value(now), output_field=BigIntegerField())
+    )
+    if updated < len(labels):
+        # Rows get_versions() has not created yet
+        DataVersion.objects.bulk_create(
+            [DataVersion(model=label, version=now) for label in labels], ignore_conflicts=True
+        )
+
+
+def get_query_models(queryset):
+    """
+    Models whose tables the queryset reads, mapping auto-created M2M through
+    tables to the model declaring the relation
+    """
+    tables = {}
+    for model in apps.get_app_config('movies').get_models(include_auto_created=True):
+        if model._meta.auto_created:
+            tables[model._meta.db_table] = model._meta.auto_created
+        else:
+            tables[model._meta.db_table] = model
+
+    models = {queryset.model}
+    for join in queryset.query.alias_map.values():
+        if join.table_name in tables:
+            models.add(tables[join.table_name])
+    return sorted(models, key=lambda model: model._meta.label_lower)
@@ -1,16 +1,93 @@
-from rest_framework import viewsets, status
+from rest_framework import generics, mixins, serializers, viewsets, status
+from rest_framework.exceptions import NotFound
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_spectacular.utils import extend_schema, extend_schema_view
-from .models import Movie, Actor, Director, Genre, Review
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view, inline_serializer
+from .models import Movie, Actor, Director, Genre, Review, LeaderboardEntry, RatingNeighbor
 from .serializers import (
     MovieListSerializer, MovieDetailSerializer,
     ActorSerializer, ActorDetailSerializer,
     DirectorSerializer, DirectorDetailSerializer,
-    GenreSerializer, ReviewSerializer
+    GenreSerializer, ReviewSerializer, SearchResultSerializer, AutocompleteResultSerializer, MovieFacetsSerializer,
+    TopRatedMovieSerializer, SimilarMovieSerializer, RecommendedMovieSerializer,
+    MovieBulkItemSerializer, ReviewBulkItemSerializer
 )
 from .filters import MovieFilter, ActorFilter, DirectorFilter, GenreFilter, ReviewFilter
+from .filter_index import IndexFilterBackend
+from .caching import CachedResponseMixin, ConditionalResponseMixin
+from .pagination import KeysetOnlyPagination
+from .export import ExportMixin
+from .fieldsets import SparseFieldsetViewMixin
+from .batch import BatchRetrieveMixin
+from .bulk import BulkWriteMixin, MovieBulkWriter, ReviewBulkWriter
+from .rowserializers import (
+    RowSerializerViewMixin, MovieListRowSerializer, ActorRowSerializer, DirectorRowSerializer, GenreRowSerializer
+)
+from .search import SEARCH_TYPES, search
+from . import autocomplete, facets, leaderboard, recommendations, similarity
+
+
+def movie_list_queryset(fields):
+    """Movies loading only the relations MovieListSerializer renders for `fields`"""
+    queryset = Movie.objects.all()
+    if 'director_name' in fields:
+        queryset = queryset.select_related('director')
+    for relation in ('genres', 'actors'):
+        if relation in fields:
+            queryset = queryset.prefetch_related(relation)
+    return queryset
+
+
+def movie_detail_queryset(fields, many=False):
+    """
+    Movies loading only the relations and counts MovieDetailSerializer renders
+    for `fields`. Single movies read their review preview with a LIMIT query;
+    pass many=True to prefetch the previews of all movies in one query instead.
+    """
+    queryset = Movie.objects.all()
+    if 'director' in fields:
+        if 'movies_count' in fields['director'].fields:
+            # A separate query so the director's movies_count can be annotated rather than counted per movie
+            queryset = queryset.prefetch_related(Prefetch('director', queryset=Director.objects.with_movies_count()))
+        else:
+            queryset = queryset.select_related('director')
+    for relation, model in (('actors', Actor), ('genres', Genre)):
+        if relation in fields:
+            related = model.objects.all()
+            if 'movies_count' in fields[relation].child.fields:
+                related = related.with_movies_count(subquery=True)
+            queryset = queryset.prefetch_related(Prefetch(relation, queryset=related))
+    if many and 'reviews' in fields:
+        queryset = queryset.with_review_preview()
+    return queryset
+
+
+def top_rated_board(query_params):
+    """
+    The (scope, scope key, limit) of the leaderboard the top_rated query
+    parameters ask for; raises ValueError with the message to return for
+    invalid ones
+    """
+    params = {}
+    for name in ('genre_id', 'decade', 'limit'):
+        if query_params.get(name):
+            try:
+                params[name] = int(query_params[name])
+            except ValueError:
+                raise ValueError(f'{name} must be an integer')
+    if 'genre_id' in params and 'decade' in params:
+        raise ValueError('Use either the genre_id or the decade parameter')
+
+    if 'genre_id' in params:
+        scope, scope_key = LeaderboardEntry.SCOPE_GENRE, params['genre_id']
+    elif 'decade' in params:
+        scope, scope_key = LeaderboardEntry.SCOPE_DECADE, leaderboard.decade_of(params['decade'])
+    else:
+        scope, scope_key = LeaderboardEntry.SCOPE_ALL, 0
+    return scope, scope_key, min(max(params.get('limit', 10), 1), 100)
 
 
 @extend_schema_view(
@@ -20,8 +97,9 @@ from .filters import MovieFilter, ActorFilter, DirectorFilter, GenreFilter, Revi
     update=extend_schema(description="Update a movie"),
     partial_update=extend_schema(description="Partially update a movie"),
     destroy=extend_schema(description="Delete a movie"),
+    bulk=extend_schema(request=MovieBulkItemSerializer(many=True)),
 )
-class MovieViewSet(viewsets.ModelViewSet):
+class MovieViewSet(ExportMixin, BatchRetrieveMixin, BulkWriteMixin, RowSerializerViewMixin, SparseFieldsetViewMixin, ConditionalResponseMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Movie model with comprehensive filtering capabilities
     
@@ -33,15 +111,57 @@ class MovieViewSet(viewsets.ModelViewSet):
     - genre (name contains, id)
     - rating (gte, lte)
     """
-    queryset = Movie.objects.select_related('director').prefetch_related('actors', 'genres', 'reviews')
-    filter_backends = [DjangoFilterBackend]
+    queryset = Movie.objects.all()
+    filter_backends = [IndexFilterBackend]
     filterset_class = MovieFilter
+    keyset_ordering_fields = ('release_year', 'title', 'rating', 'created_at')
+    keyset_default_ordering = '-release_year'
+    cache_models = (Movie, Review, Actor, Director, Genre)
+
+    # Actions rendered with MovieListSerializer, which reads the stored review aggregates
+    list_actions = ('list', 'by_genre', 'by_director')
+    export_fields = {
+        'id': 'id', 'title': 'title', 'release_year': 'release_year', 'director': 'director__name',
+        'duration': 'duration', 'rating': 'rating', 'plot': 'plot', 'review_count': 'review_count',
+        'avg_review_rating': 'avg_review_rating', 'poster_url': 'poster_url', 'backdrop_url': 'backdrop_url',
+    }
+    export_relations = {'genres': 'genres__name', 'actors': 'actors__name'}
+    bulk_writer_class = MovieBulkWriter
+    row_serializer_class = MovieListRowSerializer
+    row_actions = list_actions
+
+    def get_queryset(self):
+        if self.action in ('update', 'partial_update', 'destroy'):
+            # Writes only need the row; responses are rendered from a reload (see perform_update)
+            return Movie.objects.all()
+        if self.uses_rows():
+            return self.get_row_queryset(Movie.objects.all())
+        fields = self.get_rendered_fields()
+        if self.action in self.list_actions:
+            return movie_list_queryset(fields)
+        return movie_detail_queryset(fields, many=self.action == 'batch')
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in self.list_actions:
             return MovieListSerializer
+        if self.action == 'top_rated':
+            return TopRatedMovieSerializer
+        if self.action == 'similar':
+            return SimilarMovieSerializer
         return MovieDetailSerializer
 
+    def get_export_queryset(self):
+        return Movie.objects.order_by('pk')
+
+    def perform_create(self, serializer):
+        serializer.save()
+        # Reload through the prefetching queryset so the response does not query per relation
+        serializer.instance = movie_detail_queryset(self.get_rendered_fields()).get(pk=serializer.instance.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        serializer.instance = movie_detail_queryset(self.get_rendered_fields()).get(pk=serializer.instance.pk)
+
     @extend_schema(description="Get movies by specific genre")
     @action(detail=False, methods=['get'])
     def by_genre(self, request):
@@ -53,13 +173,13 @@ class MovieViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        movies = self.get_queryset().filter(genres__name__icontains=genre_name)
+        movies = self.get_queryset().filter(genres__name__trgm_icontains=genre_name)
         page = self.paginate_queryset(movies)
         if page is not None:
-            serializer = MovieListSerializer(page, many=True)
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = MovieListSerializer(movies, many=True)
+        serializer = self.get_serializer(movies, many=True)
         return Response(serializer.data)
 
     @extend_schema(description="Get movies by specific director")
@@ -73,21 +193,86 @@ class MovieViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        movies = self.get_queryset().filter(director__name__icontains=director_name)
+        movies = self.get_queryset().filter(director__name__trgm_icontains=director_name)
         page = self.paginate_queryset(movies)
         if page is not None:
-            serializer = MovieListSerializer(page, many=True)
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = MovieListSerializer(movies, many=True)
+        serializer = self.get_serializer(movies, many=True)
         return Response(serializer.data)
 
-    @extend_schema(description="Get top rated movies")
+    @extend_schema(
+        description="Get top rated movies, ranked by a Bayesian average of their reviews",
+        parameters=[
+            OpenApiParameter('genre_id', int, description='Rank within one genre'),
+            OpenApiParameter('decade', int, description='Rank within one decade (first year, e.g. 1990)'),
+            OpenApiParameter('limit', int, description='Number of movies (default 10, max 100)'),
+        ],
+        responses=TopRatedMovieSerializer(many=True),
+    )
     @action(detail=False, methods=['get'])
     def top_rated(self, request):
-        """Get movies ordered by average rating"""
-        movies = self.get_queryset().filter(reviews__isnull=False).distinct().order_by('-rating')[:10]
-        serializer = MovieListSerializer(movies, many=True)
+        """Get the best movies of the overall, genre or decade leaderboard"""
+        try:
+            scope, scope_key, limit = top_rated_board(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        fields = self.get_rendered_fields()
+        movies = leaderboard.top_movies(
+            scope, scope_key, limit,
+            select_related=['director'] if 'director_name' in fields else [],
+            prefetch_related=[relation for relation in ('genres', 'actors') if relation in fields],
+        )
+        serializer = self.get_serializer(movies, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        description=(
+            "Count the movies each genre, decade, rating threshold and director would match under the "
+            "movie filters given, each facet ignoring its own filters"
+        ),
+        responses=MovieFacetsSerializer,
+        filters=True,
+    )
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Get the facet counts of the movies matching the filters"""
+        return Response(facets.facet_counts(request.query_params))
+
+    @extend_schema(
+        description="Get the movies most similar to this one by shared actors, genres, director and decade",
+        parameters=[
+            OpenApiParameter('limit', int, description='Number of movies (default 10, max SIMILAR_MOVIES TOP_K)'),
+        ],
+        responses=SimilarMovieSerializer(many=True),
+    )
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Get the precomputed nearest neighbours of a movie"""
+        try:
+            movie_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        limit = request.query_params.get('limit') or 10
+        try:
+            limit = int(limit)
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), similarity.get_similar_movies_settings()['TOP_K'])
+
+        fields = self.get_rendered_fields()
+        movies = similarity.similar_movies(
+            movie_id, limit,
+            select_related=['director'] if 'director_name' in fields else [],
+            prefetch_related=[relation for relation in ('genres', 'actors') if relation in fields],
+        )
+        if not movies and not Movie.objects.filter(pk=movie_id).exists():
+            raise NotFound()
+        serializer = self.get_serializer(movies, many=True)
         return Response(serializer.data)
 
 
@@ -99,7 +284,7 @@ class MovieViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(description="Partially update an actor"),
     destroy=extend_schema(description="Delete an actor"),
 )
-class ActorViewSet(viewsets.ModelViewSet):
+class ActorViewSet(ExportMixin, BatchRetrieveMixin, RowSerializerViewMixin, SparseFieldsetViewMixin, ConditionalResponseMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Actor model with filtering by movies and genres
     
@@ -109,12 +294,33 @@ class ActorViewSet(viewsets.ModelViewSet):
     - movie (title contains, id)
     - genre (name contains, id)
     """
-    queryset = Actor.objects.prefetch_related('movies')
+    queryset = Actor.objects.order_by('name')
     filter_backends = [DjangoFilterBackend]
     filterset_class = ActorFilter
+    keyset_ordering_fields = ('name',)
+    keyset_default_ordering = 'name'
+    # The detail view nests movies with their director, genres and average rating
+    cache_models = (Actor, Movie, Director, Genre, Review)
+    export_fields = {field: field for field in ('id', 'name', 'birth_date', 'nationality', 'biography', 'image_url')}
+    export_relations = {'movie_ids': 'movies__id'}
+    row_serializer_class = ActorRowSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_rendered_fields()
+        if 'movies_count' in fields:
+            queryset = queryset.with_movies_count()
+        if 'movies' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('movies', queryset=movie_list_queryset(fields['movies'].child.fields))
+            )
+        return self.get_row_queryset(queryset)
+
+    def get_export_queryset(self):
+        return Actor.objects.order_by('pk')
 
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'batch'):
             return ActorDetailSerializer
         return ActorSerializer
 
@@ -127,7 +333,7 @@ class ActorViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(description="Partially update a director"),
     destroy=extend_schema(description="Delete a director"),
 )
-class DirectorViewSet(viewsets.ModelViewSet):
+class DirectorViewSet(ExportMixin, BatchRetrieveMixin, RowSerializerViewMixin, SparseFieldsetViewMixin, ConditionalResponseMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Director model with filtering by movies
     
@@ -136,12 +342,33 @@ class DirectorViewSet(viewsets.ModelViewSet):
     - nationality (contains)
     - movie (title contains, id)
     """
-    queryset = Director.objects.prefetch_related('movies')
+    queryset = Director.objects.order_by('name')
     filter_backends = [DjangoFilterBackend]
     filterset_class = DirectorFilter
+    keyset_ordering_fields = ('name',)
+    keyset_default_ordering = 'name'
+    # The detail view nests movies with their genres and average rating
+    cache_models = (Director, Movie, Genre, Review)
+    export_fields = {field: field for field in ('id', 'name', 'birth_date', 'nationality', 'biography', 'image_url')}
+    export_relations = {'movie_ids': 'movies__id'}
+    row_serializer_class = DirectorRowSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_rendered_fields()
+        if 'movies_count' in fields:
+            queryset = queryset.with_movies_count()
+        if 'movies' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('movies', queryset=movie_list_queryset(fields['movies'].child.fields))
+            )
+        return self.get_row_queryset(queryset)
+
+    def get_export_queryset(self):
+        return Director.objects.order_by('pk')
 
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'batch'):
             return DirectorDetailSerializer
         return DirectorSerializer
 
@@ -154,17 +381,22 @@ class DirectorViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(description="Partially update a genre"),
     destroy=extend_schema(description="Delete a genre"),
 )
-class GenreViewSet(viewsets.ModelViewSet):
+class GenreViewSet(RowSerializerViewMixin, ConditionalResponseMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Genre model
     
     Supports filtering by:
     - name (contains)
     """
-    queryset = Genre.objects.prefetch_related('movies')
+    queryset = Genre.objects.with_movies_count().order_by('name')
     serializer_class = GenreSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = GenreFilter
+    cache_models = (Genre, Movie)
+    row_serializer_class = GenreRowSerializer
+
+    def get_queryset(self):
+        return self.get_row_queryset(super().get_queryset())
 
 
 @extend_schema_view(
@@ -174,8 +406,9 @@ class GenreViewSet(viewsets.ModelViewSet):
     update=extend_schema(description="Update a review"),
     partial_update=extend_schema(description="Partially update a review"),
     destroy=extend_schema(description="Delete a review"),
+    bulk=extend_schema(request=ReviewBulkItemSerializer(many=True)),
 )
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ExportMixin, BulkWriteMixin, ConditionalResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for Review model with filtering capabilities
     
@@ -189,6 +422,18 @@ class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ReviewFilter
+    keyset_ordering_fields = ('created_at', 'rating')
+    keyset_default_ordering = '-created_at'
+    # Reviews can be filtered by movie title
+    cache_models = (Review, Movie)
+    export_fields = {
+        'id': 'id', 'movie_id': 'movie_id', 'movie': 'movie__title', 'reviewer_name': 'reviewer_name',
+        'rating': 'rating', 'comment': 'comment', 'is_featured': 'is_featured', 'created_at': 'created_at',
+    }
+    bulk_writer_class = ReviewBulkWriter
+
+    def get_export_queryset(self):
+        return Review.objects.order_by('pk')
 
     @extend_schema(description="Get featured reviews")
     @action(detail=False, methods=['get'])
@@ -202,3 +447,154 @@ class ReviewViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(reviews, many=True)
         return Response(serializer.data)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        description="Get the reviews of one movie, newest first, keyset paginated, with review filtering options",
+        parameters=[OpenApiParameter('ordering', str, enum=['created_at', '-created_at', 'rating', '-rating'])],
+    ),
+)
+class MovieReviewViewSet(ConditionalResponseMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Reviews of one movie at /api/movies/{id}/reviews/, paged with keyset
+    cursors so a movie with any number of reviews is served one indexed
+    range scan at a time
+
+    Supports the ReviewFilter filters and ordering by created_at or rating.
+    """
+    queryset = Review.objects.all()
+    serializer_class = ReviewSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ReviewFilter
+    pagination_class = KeysetOnlyPagination
+    keyset_ordering_fields = ('created_at', 'rating')
+    keyset_default_ordering = '-created_at'
+    cache_models = (Review, Movie)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(movie_id=self.kwargs.get('movie_pk'))
+
+    def list(self, request, *args, **kwargs):
+        if not Movie.objects.filter(pk=self.kwargs['movie_pk']).exists():
+            raise NotFound()
+        return super().list(request, *args, **kwargs)
+
+
+class ReviewerRecommendationsView(SparseFieldsetViewMixin, ConditionalResponseMixin, CachedResponseMixin,
+                                  generics.GenericAPIView):
+    """
+    Movies a reviewer has not reviewed, ranked by the rating predicted from
+    their reviews and the precomputed rating neighbours of those movies
+    """
+    serializer_class = RecommendedMovieSerializer
+    cache_models = (Review, Movie, RatingNeighbor)
+    default_limit = 10
+    max_limit = 50
+
+    @extend_schema(
+        description="Recommend movies to a reviewer from the ratings of reviewers who rated alike",
+        parameters=[
+            OpenApiParameter('limit', int, description='Number of movies (default 10, max 50)'),
+        ],
+        responses=RecommendedMovieSerializer(many=True),
+    )
+    def get(self, request, reviewer_name):
+        limit = request.query_params.get('limit') or self.default_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(max(limit, 1), self.max_limit)
+
+        fields = self.get_rendered_fields()
+        movies = recommendations.recommend(
+            reviewer_name, limit,
+            select_related=['director'] if 'director_name' in fields else [],
+            prefetch_related=[relation for relation in ('genres', 'actors') if relation in fields],
+        )
+        if movies is None:
+            raise NotFound()
+        serializer = self.get_serializer(movies, many=True)
+        return Response(serializer.data)
+
+
+class SearchView(APIView):
+    """
+    Full-text search across movie titles and plots, actor and director names
+    and biographies, and review comments, ranked in a single query
+    """
+    default_limit = 20
+    max_limit = 50
+
+    @extend_schema(
+        description="Search movies, actors, directors and reviews",
+        parameters=[
+            OpenApiParameter('q', str, required=True, description='Search text (web search syntax)'),
+            OpenApiParameter('types', str, description='Comma-separated subset of: ' + ', '.join(SEARCH_TYPES)),
+            OpenApiParameter('limit', int, description='Maximum results (default 20, max 50)'),
+        ],
+        responses=inline_serializer('SearchResponse', {
+            'query': serializers.CharField(),
+            'results': SearchResultSerializer(many=True),
+        }),
+    )
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Search query parameter q is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        types = request.query_params.get('types')
+        types = [t.strip() for t in types.split(',')] if types else None
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+
+        return Response({'query': query, 'results': search(query, types=types, limit=max(limit, 1))})
+
+
+class AutocompleteView(APIView):
+    """
+    Name suggestions for a typed prefix, served from the in-process prefix
+    index without querying the database
+    """
+    default_limit = 10
+    max_limit = 25
+
+    @extend_schema(
+        description="Suggest movie titles and actor, director and genre names starting with a prefix",
+        parameters=[
+            OpenApiParameter('q', str, required=True, description='Typed prefix; matches the start of any word'),
+            OpenApiParameter('types', str,
+                             description='Comma-separated subset of: ' + ', '.join(autocomplete.AUTOCOMPLETE_TYPES)),
+            OpenApiParameter('limit', int, description='Maximum suggestions (default 10, max 25)'),
+        ],
+        responses=inline_serializer('AutocompleteResponse', {
+            'query': serializers.CharField(),
+            'results': AutocompleteResultSerializer(many=True),
+        }),
+    )
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Autocomplete query parameter q is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        types = request.query_params.get('types')
+        types = [t.strip() for t in types.split(',')] if types else None
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+
+        results = autocomplete.index.lookup(query, types=types, limit=max(limit, 1))
+        return Response({'query': query, 'results': results})
@@ -8,9 +8,29 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import threading
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movies_explorer.settings')
 
 application = get_asgi_application()
+
+# Build the in-process autocomplete and filter indexes before the first request
+from django.db import connections  # noqa: E402
+from movies.autocomplete import index as autocomplete_index  # noqa: E402
+from movies.filter_index import index as filter_index  # noqa: E402
+
+
+def warm_indexes():
+    try:
+        autocomplete_index.warm()
+        filter_index.warm()
+    finally:
+        connections.close_all()
+
+
+# ASGI servers import the application inside their event loop, where the ORM refuses to run queries
+warmer = threading.Thread(target=warm_indexes)
+warmer.start()
+warmer.join()
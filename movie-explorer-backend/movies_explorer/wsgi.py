@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movies_explorer.settings')
 
 application = get_wsgi_application()
+
+# Build the in-process autocomplete and filter indexes before the first request
+from movies.autocomplete import index as autocomplete_index  # noqa: E402
+from movies.filter_index import index as filter_index  # noqa: E402
+
+autocomplete_index.warm()
+filter_index.warm()